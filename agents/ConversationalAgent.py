@@ -1,9 +1,22 @@
 # agents/ConversationalAgent.py (FINAL, PATH-AWARE VERSION)
 
+import json
 import os
-import pandas as pd
-import google.generativeai as genai
-import plotly.express as px
+import time
+
+from agents.chart_intent import chart_code_key, chart_spec_key, parse_chart_intent, record_chart_path
+from agents.chart_sandbox import ChartExecutionError, get_chart_sandbox
+from agents.context_window import ConversationContext
+from agents.dataset_store import get_dataset
+from agents.figure_cache import figure_id
+from agents.figure_compaction import figure_json, full_resolution_cache
+from agents.query_engine import (AGGREGATIONS, CHART_TYPES, FILTER_OPS, RESAMPLE_FREQS, QuerySpecError,
+                                 get_query_engine, normalize_spec)
+from agents.gemini_client import generate, generate_stream
+from agents.response_cache import CALL_SITE_TTLS, dataset_version, response_cache
+from agents.telemetry import get_logger, span
+
+log = get_logger(__name__)
 
 # --- NEW: Robust Path Calculation ---
 _PROJ_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -17,81 +30,200 @@ class ConversationalAgent:
         """
         self.lens = lens
         self.data_path = data_path
-        self.df = None
-        # Check if the calculated absolute path exists
-        if os.path.exists(self.data_path):
-            self.df = pd.read_csv(self.data_path)
-            print(f"🤖 ConversationalAgent initialized with '{self.lens}' lens and data loaded successfully.")
+        self.context = ConversationContext()
+        # A read-only view of the process-wide frame; every session shares the same pages.
+        self.df = get_dataset(self.data_path)
+        if self.df is not None:
+            get_chart_sandbox(self.data_path)  # pre-warm the chart workers with this dataset mapped
+            log.info(f"🤖 ConversationalAgent initialized with '{self.lens}' lens and data loaded successfully.")
         else:
-            print(f"🚨 ConversationalAgent initialized, but data file not found at: {self.data_path}")
+            log.error(f"🚨 ConversationalAgent initialized, but data file not found at: {self.data_path}")
     
     # --- The rest of the file is identical to what you sent, which is great! ---
     # It already has the context memory and the robust graph prompt.
 
-    def chat(self, user_message: str, history: list) -> dict:
-        if any(keyword in user_message.lower() for keyword in ['plot', 'graph', 'chart', 'visualize']):
-            print("📈 Detected plotting request. Routing to graph generator.")
+    def chat(self, user_message: str, history: list, stream: bool = False) -> dict:
+        """
+        Routes a message to the chart generator or the current lens.
+        With stream=True, text answers come back as {"type": "stream", "content": <generator of text chunks>}
+        so the UI can render tokens as they arrive. Charts and errors are never streamed.
+        """
+        if any(keyword in user_message.lower() for keyword in ['plot', 'graph', 'chart', 'visualize', 'histogram']):
+            log.debug("📈 Detected plotting request. Routing to graph generator.")
             return self._generate_plotly_chart(user_message)
         if self.lens == 'creative':
-            return self._get_creative_response(user_message, history)
+            return self._get_creative_response(user_message, history, stream=stream)
         else:
-            return self._get_scientific_response(user_message, history)
+            return self._get_scientific_response(user_message, history, stream=stream)
+
+    def _respond(self, site: str, prompt: str, stream: bool) -> dict:
+        if stream:
+            return {"type": "stream", "content": generate_stream(site, 'gemini-1.5-flash', prompt)}
+        return {"type": "text", "content": generate(site, 'gemini-1.5-flash', prompt)}
 
     def _format_history_for_prompt(self, history: list) -> str:
-        if not history: return "This is the beginning of the conversation."
-        formatted_history = ""
-        for msg in history:
-            role = "User" if msg["role"] == "user" else "AI"
-            content = msg.get("content", "")
-            if not content.startswith('{"type": "plotly"'):
-                formatted_history += f"{role}: {content}\n"
-        return formatted_history
-
-    def _get_scientific_response(self, user_message: str, history: list) -> dict:
-        print("🔬 Generating scientific response with context...")
+        # Recent messages verbatim plus a rolling summary, under a token budget (see context_window.py).
+        with span("context_formatting", messages=len(history)) as s:
+            formatted = self.context.format(history)
+            s["chars"] = len(formatted)
+        return formatted
+
+    def _get_scientific_response(self, user_message: str, history: list, stream: bool = False) -> dict:
+        log.debug("🔬 Generating scientific response with context...")
         conversation_history = self._format_history_for_prompt(history)
         prompt = f"""You are a brilliant, context-aware AI assistant.
         CONVERSATION HISTORY:\n---\n{conversation_history}\n---\n
         Based on the complete history, provide a clear, factual, and analytical response to the LATEST user message.
         User: {user_message}\nAI:"""
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(prompt)
-        return {"type": "text", "content": response.text.strip()}
+        return self._respond("scientific", prompt, stream)
 
-    def _get_creative_response(self, user_message: str, history: list) -> dict:
-        print("🎨 Generating creative response with context...")
+    def _get_creative_response(self, user_message: str, history: list, stream: bool = False) -> dict:
+        log.debug("🎨 Generating creative response with context...")
         conversation_history = self._format_history_for_prompt(history)
         prompt = f"""You are a clever, context-aware AI muse.
         CONVERSATION HISTORY:\n---\n{conversation_history}\n---\n
         Based on the complete history, provide an artistic, poetic, or metaphorical response to the LATEST user message.
         User: {user_message}\nAI:"""
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(prompt)
-        return {"type": "text", "content": response.text.strip()}
+        return self._respond("creative", prompt, stream)
 
-    def _generate_plotly_chart(self, user_message: str) -> dict:
-        print("📊 Generating Plotly chart code...")
+    def full_resolution_chart(self, user_message: str) -> dict:
+        """
+        Re-queries a chart without downsampling, for zooming in. The request's code is already
+        in the code cache, and the resulting figure is cached process-wide until the data file changes.
+        """
+        key = f"{chart_code_key(user_message, self.df)}:{dataset_version(self.data_path)}:full"
+        content = full_resolution_cache.get(key, site="full_resolution")
+        if content is None:
+            response = self._generate_plotly_chart(user_message, compact=False)
+            if response["type"] != "plotly":
+                return response
+            content = response["content"]
+            full_resolution_cache.put(key, content, CALL_SITE_TTLS["chart_code"])
+        return {"type": "plotly", "content": content}
+
+    def _chart_response(self, user_message: str, content: str, downsampled: bool) -> dict:
+        return {
+            "type": "plotly",
+            "content": content,
+            "figure_id": figure_id(content),
+            "query": user_message,
+            # Only offer a full-resolution view when decimation actually dropped points.
+            "downsampled": downsampled,
+        }
+
+    def _generate_plotly_chart(self, user_message: str, compact: bool = True) -> dict:
         if self.df is None: return {"type": "error", "content": "Data file not found. I cannot generate a graph without data."}
+        started = time.perf_counter()
+
+        # --- 1. Deterministic parser, 2. spec cache, 3. the LLM writes a query spec ---
+        spec = parse_chart_intent(user_message, self.df.columns)
+        path = "parser"
+        if spec is None:
+            spec, path = self._chart_spec(user_message)
+        if spec is not None:
+            try:
+                # Declarative specs run in the vectorized query engine, with results cached per spec.
+                with span("code_exec", runner="query_engine", path=path):
+                    fig = get_query_engine(self.data_path).figure(spec)
+                with span("figure_serialization", compact=compact):
+                    content, downsampled = figure_json(fig, compact)
+                record_chart_path(path, (time.perf_counter() - started) * 1000)
+                return self._chart_response(user_message, content, downsampled)
+            except Exception as e:
+                log.warning(f"⚠️ Query spec {spec} failed ({e}). Falling back to generated code.")
+
+        # --- 4. Code cache keyed by normalized request + schema, then 5. LLM-written code ---
+        code_key = chart_code_key(user_message, self.df)
+        generated_code = response_cache.get(code_key, site="chart_request")
+        path = "code_cache"
+        if generated_code is None:
+            generated_code = self._generate_chart_code(user_message)
+            path = "llm"
+        log.debug("Generated Code:\n---\n%s\n---", generated_code)
+        try:
+            # Generated code runs in an isolated, time- and memory-limited worker, never in this process.
+            # The worker serializes the figure too, so this span covers execution and serialization.
+            with span("code_exec", runner="sandbox", path=path):
+                content, downsampled = get_chart_sandbox(self.data_path).execute(
+                    generated_code, self.data_path, compact=compact
+                )
+        except ChartExecutionError as e:
+            log.error(f"🚨 Error executing generated code: {e}")
+            return {"type": "error", "content": f"I ran into an error: {e}"}
+        if path == "llm":
+            # Only code that actually produced a figure is worth reusing.
+            response_cache.put(code_key, generated_code, CALL_SITE_TTLS["chart_code"])
+        record_chart_path(path, (time.perf_counter() - started) * 1000)
+        return self._chart_response(user_message, content, downsampled)
+
+    def _chart_spec(self, user_message: str):
+        """
+        Returns (spec, path) for a request the parser did not understand: from the spec cache,
+        else from the LLM. spec is None when the request cannot be expressed as a query spec.
+        """
+        spec_key = chart_spec_key(user_message, self.df)
+        cached = response_cache.get(spec_key, site="chart_request")
+        if cached is not None:
+            return (json.loads(cached) if cached != "unsupported" else None), "spec_cache"
+
+        try:
+            spec = self._generate_chart_spec(user_message)
+        except Exception as e:
+            log.warning(f"⚠️ Could not get a query spec ({e}). Falling back to generated code.")
+            return None, "llm_spec"
+        # Unsupported requests are remembered too, so they go straight to the code path next time.
+        response_cache.put(spec_key, json.dumps(spec) if spec is not None else "unsupported",
+                           CALL_SITE_TTLS["chart_spec"])
+        return spec, "llm_spec"
+
+    def _generate_chart_spec(self, user_message: str):
+        log.debug("📊 Generating chart query spec...")
+        columns = [c for c in self.df.columns if c != "Date"]
+        prompt = f"""You translate chart requests about a daily stock-price dataset into a JSON query spec. You never write code.
+        Value columns: {columns}. 'Date' runs from {self.df['Date'].min():%Y-%m-%d} to {self.df['Date'].max():%Y-%m-%d}.
+        The user's request is: '{user_message}'
+        Reply with ONE JSON object using only these keys:
+        "chart": one of {list(CHART_TYPES)}
+        "y": list of value columns to plot
+        "date_range": {{"start": "YYYY-MM-DD" or null, "end": "YYYY-MM-DD" or null}}
+        "filters": list of {{"column": <value column>, "op": one of {list(FILTER_OPS)}, "value": <number or list>}}
+        "resample": null or one of {list(RESAMPLE_FREQS)} (day, week, month, quarter, year)
+        "aggregation": one of {list(AGGREGATIONS)} (used with resample)
+        "transform": null or "pct_change" (daily percent change, e.g. for returns)
+        "title": a short chart title
+        If the request cannot be expressed with these keys, reply {{"unsupported": true}}.
+        Example Request: "Plot the average closing price per month in 2023."
+        Example Output: {{"chart": "line", "y": ["Close"], "date_range": {{"start": "2023-01-01", "end": "2023-12-31"}}, "filters": [], "resample": "M", "aggregation": "mean", "transform": null, "title": "WMT Average Monthly Close in 2023"}}"""
+        text = generate(
+            "chart_spec", 'gemini-1.5-flash', prompt, generation_config={"response_mime_type": "application/json"},
+            dataset_version=dataset_version(self.data_path),
+        )
+        text = text.strip().removeprefix("```json").removeprefix("```").removesuffix("```").strip()
+        try:
+            spec = json.loads(text)
+        except json.JSONDecodeError:
+            log.warning(f"⚠️ The query spec was not valid JSON: {text[:200]}")
+            return None
+        if not isinstance(spec, dict) or spec.get("unsupported"):
+            return None
+        try:
+            return normalize_spec(spec, self.df.columns)
+        except QuerySpecError as e:
+            log.warning(f"⚠️ Rejected query spec ({e}): {spec}")
+            return None
+
+    def _generate_chart_code(self, user_message: str) -> str:
+        log.debug("📊 Generating Plotly chart code...")
         prompt = f"""You are a Python data visualization expert specializing in Plotly Express. Your ONLY task is to write a single line of Python code that generates a Plotly figure object and assigns it to a variable named 'fig'. You will be working with a pre-existing pandas DataFrame named `df`. DO NOT create your own DataFrame. The `df` is already loaded.
         The `df` DataFrame has the following columns: {list(self.df.columns)}.
         The user's request is: '{user_message}'
         RULES:
         1. Assume `import plotly.express as px` and `import pandas as pd` are already done.
         2. Your output MUST be a single line of code starting with `fig = px...`.
-        3. If the 'Date' column is used, it is a string. Convert it to datetime within your single line of code using `pd.to_datetime(df['Date'])`.
+        3. The 'Date' column is already parsed as datetime. Use it directly; do NOT call `pd.to_datetime` on it.
         4. DO NOT output the word "python", markdown backticks ```, or any explanations.
         Example Request: "Plot the closing price over time."
-        Example Output: fig = px.line(df, x=pd.to_datetime(df['Date']), y='Close', title='WMT Closing Price Over Time')"""
-        model = genai.GenerativeModel('gemini-1.5-pro')
-        code_response = model.generate_content(prompt)
-        generated_code = code_response.text.strip()
-        print(f"Generated Code:\n---\n{generated_code}\n---")
-        try:
-            local_scope = {'df': self.df, 'px': px, 'pd': pd}
-            exec(generated_code, globals(), local_scope)
-            fig = local_scope.get('fig')
-            if fig: return {"type": "plotly", "content": fig.to_json()}
-            else: return {"type": "error", "content": "Could not generate a chart. Please rephrase."}
-        except Exception as e:
-            print(f"🚨 Error executing generated code: {e}")
-            return {"type": "error", "content": f"I ran into an error: {e}"}
\ No newline at end of file
+        Example Output: fig = px.line(df, x='Date', y='Close', title='WMT Closing Price Over Time')"""
+        return generate(
+            "chart_code", 'gemini-1.5-pro', prompt, dataset_version=dataset_version(self.data_path)
+        )
\ No newline at end of file
@@ -1,8 +1,12 @@
 # agents/DaydreamAgent.py (FINAL, PATH-AWARE VERSION)
 
 import os
-import pandas as pd
-import google.generativeai as genai
+
+from agents.gemini_client import configure, generate
+from agents.response_cache import dataset_version
+from agents.telemetry import get_logger
+
+log = get_logger(__name__)
 
 # --- NEW: Robust Path Calculation ---
 # This builds an absolute path to the data directory.
@@ -14,42 +18,58 @@ _DEFAULT_DATA_PATH = os.path.join(_PROJ_ROOT, 'data', 'wmt_stock_data.csv')
 # --- Configuration block REMOVED ---
 # This is now handled centrally in main.py.
 
+# Shown when no spark can be generated (and by the welcome screen while the spark pool fills).
+FALLBACK_SPARK = "Welcome back! It's great to see you. What new ideas can we explore today?"
+NO_DATA_SPARK = "Welcome back! I was just thinking about the nature of market trends. What's on your mind?"
+
+
 # --- The Core Logic, Tailored for WMT Stock Data ---
+def generate_spark(data_path: str, insight: dict) -> str:
+    """Turns one insight from the dataset's insight index into a spark message. API errors are raised."""
+    prompt = f"""You are Wise, a Curious AI Partner. You have analyzed a user's data file on Walmart (WMT) stock. You found that {insight['text']}.
+        Generate a short, thought-provoking "welcome back" message that highlights this finding and asks a question to spark curiosity.
+        """
+    return generate("daydream_spark", 'gemini-1.5-flash', prompt, dataset_version=dataset_version(data_path))
+
+
 def get_daydream_spark(data_path: str = _DEFAULT_DATA_PATH) -> str:
     """
     Generates a proactive "spark" by analyzing Walmart stock data.
-    Finds the day with the highest trading volume and creates an insight.
+    Samples one precomputed insight (volume peaks, big moves, volatility spikes,
+    drawdowns, streaks) from the dataset's insight index and creates a message around it.
     """
     # Using the name 'DaydreamAgent' in prints for consistency with the filename.
-    print("✨ DaydreamAgent: Waking up to generate a spark from stock data...")
+    log.debug("✨ DaydreamAgent: Waking up to generate a spark from stock data...")
     
     try:
-        if not os.path.exists(data_path):
-            print(f"🚨 DaydreamAgent: Data file not found at {data_path}. Using a fallback.")
-            return "Welcome back! I was just thinking about the nature of market trends. What's on your mind?"
-
-        df = pd.read_csv(data_path)
-        max_volume_day = df.loc[df['Volume'].idxmax()]
-        
-        date = max_volume_day['Date']
-        close_price = max_volume_day['Close']
-        volume = max_volume_day['Volume']
-        
-        print(f"🧠 DaydreamAgent: Found peak volume day -> Date: {date}, Volume: {volume}")
-
-        prompt = f"""You are Wise, a Curious AI Partner. You have analyzed a user's data file on Walmart (WMT) stock. You found that on {date}, trading volume hit a massive peak of over {volume:,} shares, closing at ${close_price:.2f}.
-        Generate a short, thought-provoking "welcome back" message that highlights this finding and asks a question to spark curiosity.
-        """
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(prompt)
-        
-        spark_message = response.text.strip()
-        print(f"✅ DaydreamAgent: Generated new data-driven spark -> '{spark_message[:80]}...'")
+        from agents.insight_index import sample_insight  # pulls in pandas; deferred until a spark is needed
+
+        insight = sample_insight(data_path)
+        if insight is None:
+            log.error(f"🚨 DaydreamAgent: Data file not found at {data_path}. Using a fallback.")
+            return NO_DATA_SPARK
+
+        log.debug("🧠 DaydreamAgent: Picked a %s insight -> %s", insight['kind'], insight['text'])
+
+        spark_message = generate_spark(data_path, insight)
+        log.debug("✅ DaydreamAgent: Generated new data-driven spark -> '%s...'", spark_message[:80])
         return spark_message
 
     except Exception as e:
-        print(f"🚨 DaydreamAgent: An error occurred - {e}")
-        return "Welcome back! It's great to see you. What new ideas can we explore today?"
+        log.error(f"🚨 DaydreamAgent: An error occurred - {e}")
+        return FALLBACK_SPARK
+
+
+# --- On-demand sparks, grounded in the ongoing conversation ---
+def get_contextual_spark(vibe: str, history: list):
+    log.debug("✨ Generating a new contextual spark with vibe: %s...", vibe)
+    conversation_context = "\n".join([f"{msg['content']}" for msg in history[-4:] if msg['role'] == 'user'])
+    if vibe == "scientific": vibe_instruction = "Your response must be analytical, data-focused, or scientific. Ask a clarifying question or propose a logical next step."
+    else: vibe_instruction = "Your response must be imaginative, metaphorical, or creative. Ask a 'what if' question or propose a lateral thinking idea."
+    prompt = f"""You are an AI assistant. A user is in the middle of a conversation. Your task is to generate a single, thought-provoking question or 'what if' statement that is relevant to the ongoing conversation, in a specific tone.
+    CURRENT CONVERSATION CONTEXT:\n---\n{conversation_context}\n---\n
+    INSTRUCTIONS:\n- {vibe_instruction}\n- Your response must be related to the conversation context.\n- Do NOT act like you are interrupting. Just provide the question/statement directly.\n- Be concise."""
+    return generate("contextual_spark", 'gemini-1.5-flash', prompt)
 
 
 # --- A simple test block ---
@@ -61,7 +81,7 @@ if __name__ == "__main__":
     load_dotenv()
     GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
     if GOOGLE_API_KEY:
-        genai.configure(api_key=GOOGLE_API_KEY)
+        configure(GOOGLE_API_KEY)
         print("\n--- Testing DaydreamAgent with WMT Data---")
         spark = get_daydream_spark()
         print(f"\nGenerated Spark:\n---\n{spark}\n---")
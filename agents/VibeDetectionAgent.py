@@ -1,19 +1,44 @@
 # agents/VibeDetectionAgent.py (UPGRADED AND FINAL VERSION)
 
-import google.generativeai as genai
-from google.generativeai import types
+import os
+
+from agents.gemini_client import configure, generate
+from agents.telemetry import get_logger, span
+from agents.vibe_classifier import DEFAULT_THRESHOLD, classify_vibe
+
+log = get_logger(__name__)
+
+# Below this local-classifier confidence we ask Gemini instead.
+VIBE_CONFIDENCE_THRESHOLD = float(os.getenv("WISE_VIBE_THRESHOLD", DEFAULT_THRESHOLD))
 
 # --- Configuration block REMOVED ---
 # This is now handled centrally in main.py to avoid conflicts.
 
-def detect_vibe(user_message: str) -> str:
+def detect_vibe(user_message: str, threshold: float = None) -> str:
     """
     Analyzes a user's message and classifies its INTENT as 'scientific' or 'creative'.
+    The local classifier answers when it is confident; only unclear messages reach Gemini.
     """
     if not user_message:
         return "none"
 
-    print(f"🧠 VibeDetector: Analyzing message -> '{user_message[:50]}...'")
+    threshold = VIBE_CONFIDENCE_THRESHOLD if threshold is None else threshold
+    with span("vibe_detection") as s:
+        vibe, confidence = classify_vibe(user_message)
+        s["confidence"] = round(confidence, 2)
+        if confidence >= threshold:
+            log.debug("✅ VibeDetector: Local classifier -> %s (%.2f)", vibe, confidence)
+            s["method"] = "local"
+            return vibe
+        s["method"] = "llm"
+        return detect_vibe_llm(user_message)
+
+
+def detect_vibe_llm(user_message: str) -> str:
+    """
+    Classifies a message with gemini-1.5-flash. Used for messages the local classifier is unsure about.
+    """
+    log.debug("🧠 VibeDetector: Analyzing message -> '%s...'", user_message[:50])
 
     # --- UPDATED, MORE NUANCED PROMPT ---
     prompt = f"""You are a Vibe Detection AI. Your task is to classify the user's INTENT based on their message. The output must be one of three words: 'scientific', 'creative', or 'none'.
@@ -34,24 +59,24 @@ User Message: "{user_message}"
 Classification:"""
     
     try:
-        # Note: The 'genai' library is configured in main.py, so this call will work.
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(
+        # Note: The API key is configured once in main.py (agents/gemini_client.py owns the client).
+        vibe = generate(
+            "vibe",
+            'gemini-1.5-flash',
             prompt,
-            generation_config=types.GenerationConfig(temperature=0.0, max_output_tokens=10)
-        )
-        vibe = response.text.strip().lower()
-        print(f"✅ VibeDetector: Detected vibe -> {vibe}")
+            generation_config={"temperature": 0.0, "max_output_tokens": 10}
+        ).lower()
+        log.debug("✅ VibeDetector: Detected vibe -> %s", vibe)
 
         if vibe in ['scientific', 'creative', 'none']:
             return vibe
         else:
             # Safer to default to 'none' to avoid unwanted mode switches
-            print(f"⚠️ VibeDetector: Model returned unexpected value '{vibe}'. Defaulting to 'none'.")
+            log.warning(f"⚠️ VibeDetector: Model returned unexpected value '{vibe}'. Defaulting to 'none'.")
             return "none"
 
     except Exception as e:
-        print(f"🚨 VibeDetector: Error calling Gemini API - {e}")
+        log.error(f"🚨 VibeDetector: Error calling Gemini API - {e}")
         return "none" # Safer to default to 'none' on error
 
 # --- A simple test block so you can run this file directly to test it ---
@@ -62,7 +87,7 @@ if __name__ == "__main__":
     load_dotenv()
     GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
     if GOOGLE_API_KEY:
-        genai.configure(api_key=GOOGLE_API_KEY)
+        configure(GOOGLE_API_KEY)
         print("\n--- Testing VibeDetector ---")
         test_message_1 = "Can you explain how gradient descent works?"
         test_message_2 = "What if the stars were just neutrons in the brain of the universe?"
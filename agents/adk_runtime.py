@@ -0,0 +1,312 @@
+# agents/adk_runtime.py
+#
+# One long-lived runtime for the ADK (PROD) agents. It owns a single event
+# loop running in a daemon thread, one session service, and one Runner per
+# agent, all created once and reused. Previously every call built a fresh
+# InMemorySessionService, session and Runner and spun up its own loop with
+# asyncio.run. Sync callers submit coroutines to the shared loop and wait for
+# the result; async callers await them directly. Concurrent calls interleave
+# on the same loop, and calls on the same session are serialized.
+#
+# Sessions are keyed by (app, user, session). Resident sessions are tracked in
+# an LRU: sessions idle past a TTL, or the least recently used ones once the
+# count or estimated memory budget is exceeded, are spilled to the session
+# store and dropped from memory, then rebuilt from the store on their next
+# turn - so RAM stays bounded however many users one container serves.
+#
+#   runtime = get_runtime()
+#   runtime.register("science_agent_v1", science_agent)
+#   async with runtime.session("science_agent_v1", "user_1", "session_001", initial_state) as state:
+#       state["last_message"] = query
+#       answer = await runtime.ask("science_agent_v1", query, "user_1", "session_001")
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from agents.session_store import get_session_store
+from agents.telemetry import get_logger
+
+log = get_logger(__name__)
+
+MAX_SESSIONS = int(os.getenv("WISE_ADK_MAX_SESSIONS", "1000"))
+SESSION_TTL_S = float(os.getenv("WISE_ADK_SESSION_TTL_S", "1800"))
+SESSION_MEMORY_MB = float(os.getenv("WISE_ADK_SESSION_MEMORY_MB", "256"))
+# Rough per-event cost of the ADK event history kept on each session.
+_EVENT_BYTES = 1024
+
+
+async def call_agent_async(query: str, runner, user_id, session_id):
+    """Sends a query to the agent and returns the final response text."""
+    #Prepare the user's messages in ADK format
+    content = types.Content(role='user', parts=[types.Part(text=query)])
+
+    final_response_text = "Agent did not produce a final response." #Default response
+
+    #run_async executes the agent logic and yields Events.
+    #We iterate through events to find the final answer.
+    async for event in runner.run_async(user_id=user_id, session_id=session_id, new_message=content):
+        if event.is_final_response():
+            if event.content and event.content.parts:
+                final_response_text = event.content.parts[0].text
+            elif event.actions and event.actions.escalate: #Handle potential errors
+                final_response_text = f"Agent escalated: {event.error_message or 'No specific message.'}"
+            break
+    return final_response_text
+
+
+class AgentRuntime:
+    def __init__(self, max_sessions: int = MAX_SESSIONS, session_ttl_s: float = SESSION_TTL_S,
+                 memory_budget_mb: float = SESSION_MEMORY_MB):
+        """
+        A shared event loop thread plus the runners and session service of every registered agent.
+        The loop starts on first use. Resident sessions are bounded by count, idle time and memory.
+        """
+        self.session_service = InMemorySessionService()
+        self.max_sessions = max_sessions
+        self.session_ttl_s = session_ttl_s
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024)
+        self._runners = {}
+        self._session_locks = {}
+        self._session_users = {}  # key -> turns holding or waiting for the session's lock
+        self._resident = OrderedDict()  # (app, user, session) -> (last_used, estimated bytes), LRU first
+        self._resident_bytes = 0
+        self._evicted = set()  # keys spilled to the store, to count restores
+        self._sweeper = None
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"calls": 0, "in_flight": 0, "errors": 0, "evictions": 0, "restores": 0}
+
+    # --- Loop ---
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._start_lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    ready = threading.Event()
+
+                    def _serve():
+                        asyncio.set_event_loop(loop)
+                        loop.call_soon(ready.set)
+                        loop.run_forever()
+
+                    self._thread = threading.Thread(target=_serve, name="wise-adk-loop", daemon=True)
+                    self._thread.start()
+                    ready.wait()
+                    self._loop = loop
+                    self._sweeper = asyncio.run_coroutine_threadsafe(self._sweep_forever(), loop)
+        return self._loop
+
+    def submit(self, coro):
+        """Schedules a coroutine on the runtime loop and returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(self._tracked(coro), self._ensure_loop())
+
+    def run(self, coro, timeout: float = None):
+        """
+        Sync entry point: runs a coroutine on the shared loop and blocks for its result.
+        If the wait times out (or is interrupted) the coroutine is cancelled rather than left running.
+        """
+        loop = self._ensure_loop()
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("AgentRuntime.run() cannot block the runtime's own loop - await arun() instead.")
+        future = asyncio.run_coroutine_threadsafe(self._tracked(coro), loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    async def arun(self, coro):
+        """Async entry point: awaits a coroutine on the shared loop, from any event loop."""
+        loop = self._ensure_loop()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            return await self._tracked(coro)
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._tracked(coro), loop))
+
+    async def _tracked(self, coro):
+        with self._stats_lock:
+            self._stats["calls"] += 1
+            self._stats["in_flight"] += 1
+        try:
+            return await coro
+        except Exception:
+            with self._stats_lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            with self._stats_lock:
+                self._stats["in_flight"] -= 1
+
+    # --- Agents and sessions ---
+
+    def register(self, app_name: str, agent) -> Runner:
+        """Creates (once) the Runner for `agent` under `app_name` and returns it."""
+        runner = self._runners.get(app_name)
+        if runner is None:
+            runner = Runner(agent=agent, app_name=app_name, session_service=self.session_service)
+            self._runners[app_name] = runner
+            log.debug("Runner created for agent '%s'.", runner.agent.name)
+        return runner
+
+    def runner(self, app_name: str) -> Runner:
+        try:
+            return self._runners[app_name]
+        except KeyError:
+            raise KeyError(f"No agent registered under '{app_name}'.")
+
+    def _stored(self, app_name: str, user_id: str, session_id: str):
+        return self.session_service.sessions.get(app_name, {}).get(user_id, {}).get(session_id)
+
+    async def ensure_session(self, app_name: str, user_id: str, session_id: str, initial_state=None) -> dict:
+        """
+        Returns the live state dict of a session, creating the session on first use (or after it
+        was evicted). `initial_state` may be a dict or a zero-argument callable that builds one.
+        """
+        key = (app_name, user_id, session_id)
+        stored = self._stored(*key)
+        if stored is None:
+            state = initial_state() if callable(initial_state) else initial_state
+            await self.session_service.create_session(
+                app_name=app_name, user_id=user_id, session_id=session_id, state=state or {}
+            )
+            stored = self._stored(*key)
+            if key in self._evicted:
+                self._evicted.discard(key)
+                with self._stats_lock:
+                    self._stats["restores"] += 1
+        self._touch(key, stored)
+        return stored.state
+
+    @asynccontextmanager
+    async def session(self, app_name: str, user_id: str, session_id: str, initial_state=None):
+        """Holds the session's lock and yields its live state, so concurrent turns on one session never interleave."""
+        key = (app_name, user_id, session_id)
+        lock = self._session_locks.get(key)
+        if lock is None:
+            lock = self._session_locks[key] = asyncio.Lock()
+        # Counted from before the wait until after the release, so evict() never drops a lock that a
+        # waiter is about to take (lock.locked() is briefly False between a release and the next acquire).
+        self._session_users[key] = self._session_users.get(key, 0) + 1
+        try:
+            async with lock:
+                try:
+                    yield await self.ensure_session(app_name, user_id, session_id, initial_state)
+                finally:
+                    stored = self._stored(*key)
+                    if stored is not None:
+                        # Re-measure after the turn: the state and event history have grown.
+                        self._touch(key, stored)
+        finally:
+            users = self._session_users.pop(key) - 1
+            if users:
+                self._session_users[key] = users
+        await self._enforce_budget()
+
+    # --- Resident-session bookkeeping and eviction ---
+
+    @staticmethod
+    def _estimate_bytes(stored) -> int:
+        try:
+            state_bytes = len(json.dumps(stored.state, default=str))
+        except (TypeError, ValueError):
+            state_bytes = 4096
+        return state_bytes + _EVENT_BYTES * len(getattr(stored, "events", None) or [])
+
+    def _touch(self, key: tuple, stored):
+        size = self._estimate_bytes(stored)
+        _, old_size = self._resident.pop(key, (None, 0))
+        self._resident[key] = (time.monotonic(), size)
+        self._resident_bytes += size - old_size
+
+    async def evict(self, app_name: str, user_id: str, session_id: str) -> bool:
+        """
+        Spills a session's scalar state to the session store and drops it from memory.
+        Sessions with a turn in progress or waiting are left alone. Returns True if it was evicted.
+        """
+        key = (app_name, user_id, session_id)
+        if self._session_users.get(key):
+            return False
+        stored = self._stored(*key)
+        if stored is not None:
+            # Messages are already in the store's append-only log; only the other fields need spilling.
+            spill = {k: v for k, v in stored.state.items() if k != "messages"}
+            try:
+                get_session_store().set_state(user_id, session_id, **spill)
+            except (TypeError, ValueError) as e:
+                log.warning(f"⚠️ AgentRuntime: Could not spill session {key} ({e}).")
+            await self.session_service.delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+            users = self.session_service.sessions.get(app_name, {})
+            if not users.get(user_id, True):
+                users.pop(user_id, None)
+        _, size = self._resident.pop(key, (None, 0))
+        self._resident_bytes -= size
+        self._session_locks.pop(key, None)
+        if len(self._evicted) > 10 * self.max_sessions:
+            self._evicted.clear()
+        self._evicted.add(key)
+        with self._stats_lock:
+            self._stats["evictions"] += 1
+        return True
+
+    async def _enforce_budget(self):
+        now = time.monotonic()
+        for key, (last_used, _) in list(self._resident.items()):
+            over_budget = len(self._resident) > self.max_sessions or self._resident_bytes > self.memory_budget_bytes
+            idle = now - last_used > self.session_ttl_s
+            if not (over_budget or idle):
+                # The LRU is ordered by last use, so every later session is fresher still.
+                break
+            await self.evict(*key)
+
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(max(1.0, min(60.0, self.session_ttl_s / 4)))
+            try:
+                await self._enforce_budget()
+            except Exception as e:
+                log.warning(f"⚠️ AgentRuntime: Session sweep failed ({e}).")
+
+    async def ask(self, app_name: str, query: str, user_id: str, session_id: str) -> str:
+        """Runs one turn of the agent registered under `app_name` and returns its final response."""
+        return await call_agent_async(query=query, runner=self.runner(app_name), user_id=user_id, session_id=session_id)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {**self._stats, "runners": len(self._runners), "resident_sessions": len(self._resident),
+                    "resident_bytes": self._resident_bytes, "memory_budget_bytes": self.memory_budget_bytes}
+
+    def shutdown(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._loop = None
+
+
+# --- The process-wide runtime ---
+_runtime = None
+_runtime_lock = threading.Lock()
+
+
+def get_runtime() -> AgentRuntime:
+    global _runtime
+    if _runtime is None:
+        with _runtime_lock:
+            if _runtime is None:
+                _runtime = AgentRuntime()
+    return _runtime
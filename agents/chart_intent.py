@@ -0,0 +1,158 @@
+# agents/chart_intent.py
+#
+# The chart-intent layer in front of the LLM. Common phrasings ("plot the
+# closing price over time", "volume by year", "histogram of returns") are parsed
+# locally into a query spec (see query_engine.py) and executed directly.
+# Everything else goes to the LLM - first for a spec, then for code - and its
+# answers are cached by request + dataset schema, with case and whitespace
+# folded, so the same question asked again is only paid for once.
+
+import hashlib
+import re
+import threading
+
+from agents.telemetry import get_logger, observe
+
+log = get_logger(__name__)
+
+# --- Vocabulary ---
+# Ordered longest-first so "adjusted close" wins over "close".
+_COLUMN_SYNONYMS = [
+    ("adjusted close", "Adj Close"), ("adj close", "Adj Close"),
+    ("closing price", "Close"), ("close price", "Close"), ("closing", "Close"), ("close", "Close"),
+    ("opening price", "Open"), ("open price", "Open"), ("opening", "Open"), ("open", "Open"),
+    ("high", "High"), ("low", "Low"),
+    ("trading volume", "Volume"), ("volume", "Volume"), ("shares traded", "Volume"),
+    ("price", "Close"),
+]
+_RETURNS_RE = re.compile(r"\b(returns?|daily change|daily changes|pct change|percent change)\b")
+_HISTOGRAM_RE = re.compile(r"\b(histogram|distribution|spread of)\b")
+_BY_YEAR_RE = re.compile(r"\b(by year|per year|each year|yearly|annual|annually)\b")
+_BY_MONTH_RE = re.compile(r"\b(by month|per month|each month|monthly)\b")
+_OVER_TIME_RE = re.compile(r"\b(over time|trend|history|historical|timeline|time series)\b")
+_FILLER_RE = re.compile(r"\b(please|can you|could you|would you|show me|give me|i want|i'd like|a|an|the|of|for|me)\b")
+# Words that name the chart itself rather than qualify it. Anything else left over after the column and
+# the modifiers above (years, dates, "vs", "in", "after", a second column, ...) sends the request to the LLM.
+_CHART_WORDS_RE = re.compile(r"\b(plot|chart|graph|visuali[sz]e|draw|display|show|line|bar|wmt|walmart|stock|daily)\b")
+
+
+def normalize_request(message: str) -> str:
+    """For parsing: lowercases, drops punctuation and filler words, and collapses whitespace."""
+    text = re.sub(r"[^a-z0-9 ]+", " ", message.lower())
+    text = _FILLER_RE.sub(" ", text)
+    return " ".join(text.split())
+
+
+def cache_key_text(message: str) -> str:
+    """
+    For cache keys: only case, whitespace and a trailing '.', '?' or '!' are folded. Operators, decimal
+    points, minus signs and ranges ("volume > 1e7", "2023-2024") are kept, since they change the chart.
+    """
+    return " ".join(message.lower().split()).rstrip(".?! ")
+
+
+def schema_signature(df) -> str:
+    return ",".join(f"{col}:{dtype}" for col, dtype in df.dtypes.items())
+
+
+def _request_key(kind: str, message: str, df) -> str:
+    payload = f"{cache_key_text(message)}|{schema_signature(df)}"
+    return f"{kind}:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def chart_code_key(message: str, df) -> str:
+    """Cache key for generated chart code: request (see cache_key_text) + dataset schema."""
+    return _request_key("chart_code", message, df)
+
+
+def chart_spec_key(message: str, df) -> str:
+    """Cache key for an LLM-written query spec: request (see cache_key_text) + dataset schema."""
+    return _request_key("chart_spec", message, df)
+
+
+def _take_columns(text: str, columns):
+    """Returns (columns named in `text`, `text` with their phrases removed). Longer phrases are taken first."""
+    found = []
+    for phrase, column in _COLUMN_SYNONYMS:
+        pattern = rf"\b{phrase}\b"
+        if re.search(pattern, text):
+            if column not in columns:
+                return None, text
+            if column not in found:
+                found.append(column)
+            text = re.sub(pattern, " ", text)
+    return found, text
+
+
+def _leftover(text: str, *patterns) -> list:
+    for pattern in (_CHART_WORDS_RE,) + patterns:
+        text = pattern.sub(" ", text)
+    return text.split()
+
+
+def parse_chart_intent(message: str, columns):
+    """
+    Maps a plotting request onto a query spec over the known columns, or returns None
+    when the request is not one we can answer deterministically. The parser only answers
+    when it understood every word: one column, at most one modifier (by year, by month,
+    histogram, over time) and chart words. Dates, years, comparisons ("vs"), several columns
+    or anything else it does not know go to the LLM, which can express them in a spec.
+    """
+    text = normalize_request(message)
+    columns = set(columns)
+    if "Date" not in columns:
+        return None
+
+    if _RETURNS_RE.search(text) and "Close" in columns and not _OVER_TIME_RE.search(text):
+        if _leftover(text, _RETURNS_RE, _HISTOGRAM_RE):
+            return None
+        return {"chart": "histogram", "y": ["Close"], "transform": "pct_change", "label": "Daily Return (%)",
+                "title": "WMT Daily Returns Distribution"}
+
+    found, rest = _take_columns(text, columns)
+    if not found or len(found) > 1:
+        return None
+    column = found[0]
+    modifiers = [m for m in (_BY_YEAR_RE, _BY_MONTH_RE, _HISTOGRAM_RE, _OVER_TIME_RE) if m.search(rest)]
+    if len(modifiers) > 1 or _leftover(rest, *modifiers):
+        return None
+
+    if _BY_YEAR_RE.search(text):
+        agg = "sum" if column == "Volume" else "mean"
+        return {"chart": "bar", "y": [column], "resample": "Y", "aggregation": agg,
+                "title": f"WMT {column} by Year ({agg})"}
+    if _BY_MONTH_RE.search(text):
+        agg = "sum" if column == "Volume" else "mean"
+        return {"chart": "bar", "y": [column], "resample": "M", "aggregation": agg,
+                "title": f"WMT {column} by Month ({agg})"}
+    if _HISTOGRAM_RE.search(text):
+        return {"chart": "histogram", "y": [column], "title": f"WMT {column} Distribution"}
+    return {"chart": "line", "y": [column], "title": f"WMT {column} Over Time"}
+
+
+# --- Per-path hit rates and latency ---
+_stats_lock = threading.Lock()
+_path_stats = {path: {"count": 0, "total_ms": 0.0} for path in ("parser", "spec_cache", "llm_spec", "code_cache", "llm")}
+
+
+def record_chart_path(path: str, elapsed_ms: float):
+    with _stats_lock:
+        stats = _path_stats[path]
+        stats["count"] += 1
+        stats["total_ms"] += elapsed_ms
+        total = sum(s["count"] for s in _path_stats.values())
+        summary = ", ".join(
+            f"{name} {s['count'] / total:.0%} (avg {s['total_ms'] / s['count']:.0f} ms)"
+            for name, s in _path_stats.items() if s["count"]
+        )
+    observe(f"chart.{path}", elapsed_ms)
+    log.debug("📊 Chart path: %s in %.0f ms | %s", path, elapsed_ms, summary)
+
+
+def chart_path_stats() -> dict:
+    """Counts and mean latency (ms) per chart path: parser, spec_cache, llm_spec, code_cache, llm."""
+    with _stats_lock:
+        return {
+            name: {"count": s["count"], "avg_ms": (s["total_ms"] / s["count"]) if s["count"] else None}
+            for name, s in _path_stats.items()
+        }
@@ -0,0 +1,204 @@
+# agents/chart_sandbox.py
+#
+# Runs LLM-written chart code in a pool of pre-warmed worker processes instead
+# of inside the Streamlit server. Workers import pandas/plotly and memory-map
+# the dataset up front, run each snippet under an address-space cap, and send
+# back only the figure JSON. A snippet that overruns its wall-clock timeout or
+# is cancelled gets its worker killed and replaced, so one pathological query
+# never stalls other users.
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; workers then run without a memory cap.
+    resource = None
+
+
+class ChartExecutionError(Exception):
+    """The generated code raised, produced no figure, or its worker died."""
+
+
+class ChartTimeoutError(ChartExecutionError):
+    """The generated code ran past its wall-clock timeout (or was cancelled)."""
+
+
+def _worker_main(conn, memory_mb: int, preload_paths: list):
+    """Entry point of a sandbox worker process."""
+    if resource is not None and memory_mb:
+        limit = memory_mb * 1024 * 1024
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ValueError, OSError):
+            pass
+
+    import pandas as pd
+    import plotly.express as px
+    from agents.dataset_store import get_dataset
+    from agents.figure_compaction import figure_json
+
+    for path in preload_paths:
+        get_dataset(path)
+    conn.send(("ready", None))
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if message is None:
+            return
+        code, data_path, compact = message
+        try:
+            df = get_dataset(data_path)
+            if df is None:
+                raise FileNotFoundError(f"Data file not found: {data_path}")
+            scope = {'df': df, 'px': px, 'pd': pd}
+            exec(code, scope, scope)
+            fig = scope.get('fig')
+            if fig is None:
+                conn.send(("error", "The generated code did not assign a figure to 'fig'."))
+            else:
+                conn.send(("ok", figure_json(fig, compact)))
+        except MemoryError:
+            conn.send(("error", "The chart needed more memory than allowed."))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, ctx, memory_mb: int, preload_paths: list):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main, args=(child_conn, memory_mb, preload_paths), daemon=True, name="wise-chart-worker"
+        )
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def wait_ready(self, timeout: float) -> bool:
+        if not self.ready and self.conn.poll(timeout):
+            self.ready = self.conn.recv()[0] == "ready"
+        return self.ready
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.join(timeout=1)
+        except Exception:
+            pass
+        self.conn.close()
+
+
+class ChartSandbox:
+    def __init__(self, pool_size: int = 2, timeout_s: float = 10.0, memory_mb: int = 1024, preload_paths: list = None):
+        """
+        A fixed-size pool of chart workers. `preload_paths` are mapped by every worker at start-up.
+        """
+        self.pool_size = pool_size
+        self.timeout_s = timeout_s
+        self.memory_mb = memory_mb
+        self.preload_paths = [os.path.abspath(p) for p in (preload_paths or [])]
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._stats = {"ok": 0, "errors": 0, "timeouts": 0, "cancelled": 0, "restarts": 0}
+        for _ in range(pool_size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self) -> _Worker:
+        return _Worker(self._ctx, self.memory_mb, self.preload_paths)
+
+    def _replace(self, worker: _Worker, reason: str):
+        worker.kill()
+        with self._lock:
+            self._stats["restarts"] += 1
+            self._stats[reason] += 1
+        self._idle.put(self._spawn())
+
+    def execute(self, code: str, data_path: str, timeout_s: float = None, cancel_event: threading.Event = None,
+                compact: bool = True) -> tuple:
+        """
+        Runs `code` against the dataset at `data_path` in a worker and returns (figure JSON, downsampled):
+        the figure is downsampled and compactly encoded unless compact=False, and `downsampled` says
+        whether that actually dropped points.
+        Raises ChartTimeoutError on timeout/cancellation and ChartExecutionError on any other failure.
+        """
+        timeout_s = self.timeout_s if timeout_s is None else timeout_s
+        deadline = time.monotonic() + timeout_s
+        try:
+            worker = self._idle.get(timeout=timeout_s)
+        except queue.Empty:
+            raise ChartTimeoutError("All chart workers are busy. Please try again in a moment.")
+
+        try:
+            ready = worker.wait_ready(max(0.0, deadline - time.monotonic()))
+        except (EOFError, OSError):
+            # The worker died during start-up (import or preload failure, memory cap).
+            self._replace(worker, "errors")
+            raise ChartExecutionError("The chart worker crashed while starting.")
+        if not ready:
+            self._replace(worker, "timeouts")
+            raise ChartTimeoutError("The chart worker did not start in time.")
+
+        try:
+            worker.conn.send((code, os.path.abspath(data_path), compact))
+            while not worker.conn.poll(0.05):
+                if cancel_event is not None and cancel_event.is_set():
+                    self._replace(worker, "cancelled")
+                    raise ChartTimeoutError("The chart was cancelled.")
+                if time.monotonic() >= deadline:
+                    self._replace(worker, "timeouts")
+                    raise ChartTimeoutError(f"The chart took longer than {timeout_s:.0f}s and was stopped.")
+            status, payload = worker.conn.recv()
+        except (EOFError, OSError, BrokenPipeError):
+            # The worker died mid-run - most likely it hit the memory cap.
+            self._replace(worker, "errors")
+            raise ChartExecutionError("The chart worker crashed (likely out of memory).")
+
+        self._idle.put(worker)
+        with self._lock:
+            self._stats["ok" if status == "ok" else "errors"] += 1
+        if status != "ok":
+            raise ChartExecutionError(payload)
+        return payload
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "pool_size": self.pool_size, "idle": self._idle.qsize()}
+
+    def shutdown(self):
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+            worker.kill()
+
+
+# --- The process-wide sandbox, created on first use ---
+_sandbox = None
+_sandbox_lock = threading.Lock()
+
+
+def get_chart_sandbox(preload_path: str = None) -> ChartSandbox:
+    """Returns the shared sandbox, starting its workers (pre-mapping `preload_path`) the first time."""
+    global _sandbox
+    if _sandbox is None:
+        with _sandbox_lock:
+            if _sandbox is None:
+                _sandbox = ChartSandbox(
+                    pool_size=int(os.getenv("WISE_CHART_WORKERS", "2")),
+                    timeout_s=float(os.getenv("WISE_CHART_TIMEOUT_S", "10")),
+                    memory_mb=int(os.getenv("WISE_CHART_MEMORY_MB", "1024")),
+                    preload_paths=[preload_path] if preload_path else None,
+                )
+    return _sandbox
@@ -0,0 +1,163 @@
+# agents/context_window.py
+#
+# Bounded conversation context for the ConversationalAgent prompts. The last N
+# messages are kept verbatim; older ones are folded into a running summary that
+# gemini-1.5-flash updates in the background, a few messages at a time. The
+# whole block is held under a token budget (estimated locally, no tokenizer
+# call), and the formatted text is cached so a normal turn only appends the
+# new messages. Per-turn prompt size - and so latency - stays flat however long
+# the session runs.
+
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from agents.gemini_client import generate
+from agents.telemetry import get_logger
+
+log = get_logger(__name__)
+
+RECENT_MESSAGES = int(os.getenv("WISE_CONTEXT_RECENT_MESSAGES", "8"))
+TOKEN_BUDGET = int(os.getenv("WISE_CONTEXT_TOKEN_BUDGET", "1500"))
+FOLD_BATCH = 4
+
+_summarizer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="wise-summary")
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly 4 characters per token for English text - close enough for budgeting."""
+    return (len(text) + 3) // 4
+
+
+def _format_message(msg: dict) -> str:
+    role = "User" if msg["role"] == "user" else "AI"
+    if msg.get("type") == "plotly":
+        return f"{role}: [Chart: {msg.get('query', 'a chart')}]"
+    return f"{role}: {msg.get('content', '')}"
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * 4
+    return text if len(text) <= max_chars else text[:max_chars - 3] + "..."
+
+
+class ConversationContext:
+    def __init__(self, recent_messages: int = RECENT_MESSAGES, token_budget: int = TOKEN_BUDGET,
+                 fold_batch: int = FOLD_BATCH):
+        """
+        Tracks one conversation's history incrementally. Call format(history) every turn.
+        """
+        self.recent_messages = recent_messages
+        self.token_budget = token_budget
+        self.fold_batch = fold_batch
+        self._lock = threading.Lock()
+        with self._lock:
+            self._reset(None)
+
+    def _reset(self, first_message):
+        # Callers hold self._lock.
+        self._first_message = first_message
+        self._seen = 0
+        self._recent = deque()       # (line, tokens) kept verbatim
+        self._recent_tokens = 0
+        self._pending = []           # evicted lines not yet in the summary
+        self._summary = ""
+        self._fold = None            # in-flight summary Future
+        self._prefix = None
+
+    def format(self, history: list) -> str:
+        """Returns the bounded history block for the prompt."""
+        with self._lock:
+            if not history:
+                self._reset(None)
+                return "This is the beginning of the conversation."
+
+            first = history[0].get("content")
+            if len(history) < self._seen or first != self._first_message:
+                self._reset(first)
+
+            self._apply_finished_fold()
+            evicted = False
+            appended = []
+            for msg in history[self._seen:]:
+                line = _format_message(msg)
+                tokens = estimate_tokens(line)
+                self._recent.append((line, tokens))
+                self._recent_tokens += tokens
+                appended.append(line)
+            self._seen = len(history)
+
+            while len(self._recent) > 1 and (len(self._recent) > self.recent_messages or self._over_budget()):
+                line, tokens = self._recent.popleft()
+                self._recent_tokens -= tokens
+                self._pending.append(line)
+                evicted = True
+            if self._over_budget():
+                # One message bigger than the whole budget: keep only as much of it as fits.
+                line, tokens = self._recent.pop()
+                line = _truncate(line, max(1, self.token_budget - self._earlier_tokens()))
+                self._recent.append((line, estimate_tokens(line)))
+                self._recent_tokens += estimate_tokens(line) - tokens
+                evicted = True
+            self._maybe_start_fold()
+
+            if self._prefix is None or evicted:
+                self._prefix = self._render()
+            elif appended:
+                # The common case: nothing left the window, so only the delta is formatted.
+                self._prefix += "".join(f"{line}\n" for line in appended)
+            return self._prefix
+
+    # --- Internals ---
+
+    def _summary_budget(self) -> int:
+        return self.token_budget // 4
+
+    def _pending_text(self) -> list:
+        # Lines waiting for the summarizer are shown condensed so they never blow the budget.
+        return [_truncate(line, 40) for line in self._pending]
+
+    def _earlier_tokens(self) -> int:
+        return estimate_tokens(self._summary) + sum(estimate_tokens(p) for p in self._pending_text())
+
+    def _over_budget(self) -> bool:
+        return self._earlier_tokens() + self._recent_tokens > self.token_budget
+
+    def _render(self) -> str:
+        parts = []
+        if self._summary:
+            parts.append(f"Summary of earlier conversation: {self._summary}\n")
+        if self._pending:
+            parts.append("".join(f"{line}\n" for line in self._pending_text()))
+        parts.append("".join(f"{line}\n" for line, _ in self._recent))
+        return "".join(parts)
+
+    def _maybe_start_fold(self):
+        if self._fold is not None or len(self._pending) < self.fold_batch:
+            return
+        batch = list(self._pending)
+        self._fold = (len(batch), _summarizer.submit(self._summarize, self._summary, batch, self._summary_budget()))
+
+    def _apply_finished_fold(self):
+        if self._fold is None or not self._fold[1].done():
+            return
+        folded, future = self._fold
+        self._fold = None
+        try:
+            self._summary = future.result()
+        except Exception as e:
+            log.warning(f"⚠️ ConversationContext: Summary update failed ({e}). Keeping a condensed transcript instead.")
+            self._summary = _truncate(" ".join([self._summary] + self._pending_text()[:folded]).strip(),
+                                      self._summary_budget())
+        del self._pending[:folded]
+        self._prefix = None
+
+    @staticmethod
+    def _summarize(summary: str, lines: list, budget_tokens: int) -> str:
+        transcript = "\n".join(lines)
+        prompt = f"""You maintain a running summary of a conversation between a user and an AI assistant.
+        CURRENT SUMMARY:\n---\n{summary or '(empty)'}\n---\n
+        NEW MESSAGES TO FOLD IN:\n---\n{transcript}\n---\n
+        Write the updated summary. Keep names, numbers, decisions and open questions. Use at most {budget_tokens * 3 // 4} words. Output only the summary."""
+        return _truncate(generate("summary", 'gemini-1.5-flash', prompt), budget_tokens)
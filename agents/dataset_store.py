@@ -0,0 +1,175 @@
+# agents/dataset_store.py
+#
+# Process-wide registry of the datasets the agents read. Each file is loaded
+# once per process with compact dtypes and a parsed datetime index, instead of
+# once per Streamlit session (integer columns downcast, prices kept at full
+# float64 precision). When pyarrow is installed the compacted frame is
+# written to an Arrow IPC file and memory-mapped, so several worker processes
+# on the same host share the same pages. A file is only reloaded when its
+# mtime changes AND its content hash differs.
+
+import hashlib
+import os
+import threading
+
+import pandas as pd
+
+from agents.telemetry import get_logger
+
+log = get_logger(__name__)
+ARROW_CACHE_VERSION = "v2"
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:  # pyarrow is optional; without it we keep a private in-memory copy.
+    pa = None
+    ipc = None
+
+
+def _file_digest(path: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Parses 'Date' and downcasts integer columns to the smallest dtype that holds them. Floats stay
+    float64: float32 keeps only ~7 significant digits, which would round every price.
+    """
+    df = df.copy()
+    if "Date" in df.columns:
+        df["Date"] = pd.to_datetime(df["Date"])
+    for col in df.columns:
+        if pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast="integer")
+    return df
+
+
+def _read_only(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rebuilds a frame over read-only copies of its columns, so an in-place write through a session's
+    view fails (or, with copy-on-write, copies) instead of changing the frame every session shares.
+    The memory-mapped frames are read-only already.
+    """
+    columns = {}
+    for col in df.columns:
+        values = df[col].to_numpy(copy=True)
+        values.flags.writeable = False
+        columns[col] = values
+    return pd.DataFrame(columns, index=df.index, copy=False)
+
+
+def _with_date_index(df: pd.DataFrame) -> pd.DataFrame:
+    # The 'Date' column stays in place for generated chart code; the index is an unnamed copy of it.
+    if "Date" in df.columns:
+        df.index = pd.DatetimeIndex(df["Date"].values)
+    return df
+
+
+class _Entry:
+    __slots__ = ("mtime_ns", "size", "digest", "frame")
+
+    def __init__(self, mtime_ns, size, digest, frame):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.digest = digest
+        self.frame = frame
+
+
+class DatasetStore:
+    def __init__(self, cache_dir: str = None):
+        """
+        Loads each dataset once per process. `cache_dir` holds the Arrow IPC files;
+        by default a '.cache' folder next to each dataset.
+        """
+        self.cache_dir = cache_dir
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, data_path: str):
+        """
+        Returns a read-only view of the dataset, or None if the file does not exist.
+        The view is a shallow copy over read-only buffers: adding or replacing columns never touches
+        the shared frame, and writing values in place raises (or copies, under copy-on-write).
+        """
+        path = os.path.abspath(data_path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or (entry.mtime_ns, entry.size) != (stat.st_mtime_ns, stat.st_size):
+                digest = _file_digest(path)
+                if entry is not None and entry.digest == digest:
+                    # Touched but unchanged - keep the frame we already have.
+                    entry.mtime_ns, entry.size = stat.st_mtime_ns, stat.st_size
+                else:
+                    entry = _Entry(stat.st_mtime_ns, stat.st_size, digest, self._load(path, digest))
+                    self._entries[path] = entry
+            return entry.frame.copy(deep=False)
+
+    def version(self, data_path: str) -> str:
+        """The content hash of the loaded dataset, or 'missing'."""
+        path = os.path.abspath(data_path)
+        if self.get(path) is None:
+            return "missing"
+        return self._entries[path].digest
+
+    # --- Loading ---
+
+    def _load(self, path: str, digest: str) -> pd.DataFrame:
+        if pa is None:
+            log.info(f"📦 DatasetStore: Loading {os.path.basename(path)} into memory (pyarrow not installed).")
+            return _with_date_index(_read_only(compact_frame(pd.read_csv(path))))
+
+        cache_dir = self.cache_dir or os.path.join(os.path.dirname(path), ".cache")
+        # The cache format version in the name retires caches written with older dtypes (float32 prices).
+        arrow_path = os.path.join(cache_dir, f"{os.path.basename(path)}.{digest}.{ARROW_CACHE_VERSION}.arrow")
+        if not os.path.exists(arrow_path):
+            log.info(f"📦 DatasetStore: Building Arrow cache for {os.path.basename(path)}...")
+            frame = compact_frame(pd.read_csv(path))
+            try:
+                self._write_arrow(frame, arrow_path)
+            except OSError as e:
+                log.warning(f"⚠️ DatasetStore: Could not write Arrow cache ({e}). Keeping a private copy.")
+                return _with_date_index(_read_only(frame))
+
+        log.info(f"📦 DatasetStore: Memory-mapping {os.path.basename(arrow_path)}")
+        source = pa.memory_map(arrow_path, "r")
+        table = ipc.open_file(source).read_all()
+        # split_blocks keeps numeric columns zero-copy over the mapped pages.
+        return _with_date_index(table.to_pandas(split_blocks=True))
+
+    @staticmethod
+    def _write_arrow(frame: pd.DataFrame, arrow_path: str):
+        cache_dir = os.path.dirname(arrow_path)
+        os.makedirs(cache_dir, exist_ok=True)
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        tmp_path = f"{arrow_path}.{os.getpid()}.tmp"
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, arrow_path)
+        # Drop caches built from older versions of the same file.
+        prefix = os.path.basename(arrow_path).rsplit(".", 3)[0] + "."
+        for name in os.listdir(cache_dir):
+            if name.startswith(prefix) and name.endswith(".arrow") and name != os.path.basename(arrow_path):
+                try:
+                    os.remove(os.path.join(cache_dir, name))
+                except OSError:
+                    pass
+
+
+# --- The process-wide store ---
+dataset_store = DatasetStore(cache_dir=os.getenv("WISE_DATASET_CACHE_DIR") or None)
+
+
+def get_dataset(data_path: str):
+    """Shortcut for dataset_store.get(data_path)."""
+    return dataset_store.get(data_path)
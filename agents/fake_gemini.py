@@ -0,0 +1,255 @@
+# agents/fake_gemini.py
+#
+# A deterministic stand-in for google.generativeai.GenerativeModel, so the
+# app's own overhead can be measured (and the app demoed) without network
+# access. Replies come from rules matched against the prompt - canned text or
+# a str.format template filled from the regex's named groups - and a default
+# rule writes filler prose. Latency is drawn from a configurable distribution,
+# and a configurable share of calls fail with API-like errors (429/500/503
+# with a .code, or a timeout) that the rate limiter treats like the real ones.
+# Randomness is seeded per (model, prompt, repeat), so a run sees the same
+# replies, latencies and errors whatever order its threads call in.
+#
+#   from agents.fake_gemini import FakeBackend
+#   from agents.gemini_client import use_model_factory
+#   use_model_factory(FakeBackend(latency="lognormal:400,0.3", error_rate=0.02).model)
+#   # or for the whole app: WISE_GEMINI_BACKEND=fake streamlit run main.py
+
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+
+# Used by get_fake_backend(), i.e. when the app runs with WISE_GEMINI_BACKEND=fake.
+DEFAULT_LATENCY = os.getenv("WISE_FAKE_GEMINI_LATENCY", "lognormal:300,0.4")
+DEFAULT_ERROR_RATE = float(os.getenv("WISE_FAKE_GEMINI_ERROR_RATE", "0"))
+DEFAULT_SEED = int(os.getenv("WISE_FAKE_GEMINI_SEED", "0"))
+
+ERROR_CODES = (429, 500, 503)
+# A stream's first chunk arrives after this share of the call's latency; the rest is spread over the other chunks.
+FIRST_CHUNK_SHARE = 0.4
+
+_FILLER = ("the", "data", "suggests", "a", "steady", "trend", "with", "occasional", "spikes", "in", "volume",
+           "which", "often", "line", "up", "with", "earnings", "and", "broader", "market", "moves", "so", "it",
+           "is", "worth", "comparing", "several", "periods", "before", "drawing", "conclusions")
+
+
+class FakeAPIError(Exception):
+    """An error shaped like google.api_core's: the HTTP status is in .code."""
+
+    def __init__(self, code: int, message: str = None):
+        super().__init__(message or f"{code} fake Gemini error")
+        self.code = code
+
+
+class Latency:
+    def __init__(self, spec="0"):
+        """
+        A latency distribution in milliseconds, from a spec string:
+        "120" or "fixed:120", "uniform:50,150", "normal:300,50" (mean, sd) or "lognormal:300,0.4" (median, sigma).
+        """
+        self.spec = str(spec)
+        kind, _, args = self.spec.partition(":") if ":" in self.spec else ("fixed", "", self.spec)
+        try:
+            params = [float(x) for x in args.split(",")]
+        except ValueError:
+            raise ValueError(f"Malformed latency spec '{spec}'.")
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if expected.get(kind) != len(params):
+            raise ValueError(f"Malformed latency spec '{spec}'.")
+        self.kind, self.params = kind, params
+
+    def sample_ms(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            value = self.params[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(*self.params)
+        elif self.kind == "normal":
+            value = rng.gauss(*self.params)
+        else:
+            median, sigma = self.params
+            value = rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+        return max(0.0, value)
+
+
+# --- Replies ---
+
+def _vibe_reply(match, prompt, rng) -> str:
+    message = match.group("message").lower()
+    if re.search(r"\b(what if|imagine|write|poem|story|brainstorm|dream)\b", message):
+        return "creative"
+    if re.search(r"\b(hi|hello|hey|thanks|ok|more)\b", message) and len(message.split()) <= 4:
+        return "none"
+    return "scientific"
+
+
+SPEC_REPLY = json.dumps({
+    "chart": "line", "y": ["Close"], "date_range": {"start": None, "end": None}, "filters": [],
+    "resample": "M", "aggregation": "mean", "transform": None, "title": "WMT Average Monthly Close",
+})
+CODE_REPLY = "fig = px.line(df, x='Date', y='Close', title='WMT Closing Price Over Time')"
+
+# (pattern, reply): the first pattern that matches the prompt wins. A reply is a str.format template
+# filled from the pattern's named groups (used as-is when there are none, so JSON needs no escaping),
+# or a callable (match, prompt, rng) -> str.
+DEFAULT_RULES = [
+    (r"Vibe Detection AI.*User Message: \"(?P<message>.*)\"", _vibe_reply),
+    (r"JSON query spec", SPEC_REPLY),
+    (r"Plotly Express", CODE_REPLY),
+    (r"running summary of a conversation", "The user and the assistant have been exploring WMT stock data: "
+                                           "price trends, volume spikes and what drove them."),
+    (r"You found that (?P<finding>.*?)\.\s*\n", "I was looking through your Walmart data and noticed that "
+                                                "{finding}. What do you think was behind it?"),
+    (r"thought-provoking question or 'what if' statement", "What if the next big move in the data is hiding "
+                                                           "in the days nobody is watching?"),
+]
+
+
+class FakeUsage:
+    def __init__(self, prompt_tokens: int, output_tokens: int):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+class FakeResponse:
+    """A response or stream chunk: .text, plus .usage_metadata on whole responses and final chunks."""
+
+    def __init__(self, text: str, usage: FakeUsage = None):
+        self.text = text
+        self.usage_metadata = usage
+
+
+def _count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeBackend:
+    def __init__(self, rules=None, latency="0", error_rate: float = 0.0, error_codes=ERROR_CODES,
+                 reply_words: int = 120, stream_chunks: int = 8, seed: int = 0):
+        """
+        Serves every model built by model(). `rules` are tried before DEFAULT_RULES; prompts no rule
+        matches get `reply_words` words of filler prose. `error_rate` of calls raise FakeAPIError with
+        one of `error_codes` (after their latency, as a real failed call would).
+        """
+        self.rules = [(re.compile(p, re.DOTALL), reply) for p, reply in list(rules or []) + DEFAULT_RULES]
+        self.latency = latency if isinstance(latency, Latency) else Latency(latency)
+        self.error_rate = error_rate
+        self.error_codes = tuple(error_codes)
+        self.reply_words = reply_words
+        self.stream_chunks = max(1, stream_chunks)
+        self.seed = seed
+        self._lock = threading.Lock()
+        self._repeats = {}
+        self._stats = {"calls": 0, "errors": 0, "timeouts": 0, "streams": 0, "prompt_tokens": 0, "output_tokens": 0}
+
+    def model(self, model_name: str) -> "FakeGenerativeModel":
+        """The factory for gemini_client.use_model_factory."""
+        return FakeGenerativeModel(model_name, self)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+    def reset(self):
+        """Forgets prompt repeats and counters, so the next run replays the same sequence."""
+        with self._lock:
+            self._repeats.clear()
+            self._stats = dict.fromkeys(self._stats, 0)
+
+    def _count(self, **counters):
+        with self._lock:
+            for counter, n in counters.items():
+                self._stats[counter] += n
+
+    def plan(self, model_name: str, prompt: str, generation_config=None, request_options=None):
+        """
+        Decides one call: returns (text, usage, latency_s, error). The error, if any, is raised after
+        the latency; a latency above the request timeout becomes a TimeoutError at the timeout.
+        """
+        with self._lock:
+            repeat = self._repeats.get((model_name, prompt), 0)
+            self._repeats[(model_name, prompt)] = repeat + 1
+        rng = random.Random(f"{self.seed}:{model_name}:{repeat}:{prompt}")
+        latency_s = self.latency.sample_ms(rng) / 1000
+        timeout_s = (request_options or {}).get("timeout")
+        if timeout_s is not None and latency_s > timeout_s:
+            self._count(calls=1, timeouts=1)
+            return None, None, timeout_s, TimeoutError(f"fake Gemini call exceeded its {timeout_s:.1f}s timeout")
+        if rng.random() < self.error_rate:
+            self._count(calls=1, errors=1)
+            return None, None, latency_s, FakeAPIError(rng.choice(self.error_codes))
+
+        text = self._reply(prompt, rng)
+        max_tokens = (generation_config or {}).get("max_output_tokens") if isinstance(generation_config, dict) else None
+        if max_tokens:
+            text = text[:max_tokens * 4]
+        usage = FakeUsage(_count_tokens(prompt), _count_tokens(text))
+        self._count(calls=1, prompt_tokens=usage.prompt_token_count, output_tokens=usage.candidates_token_count)
+        return text, usage, latency_s, None
+
+    def _reply(self, prompt: str, rng: random.Random) -> str:
+        for pattern, reply in self.rules:
+            match = pattern.search(prompt)
+            if match:
+                if callable(reply):
+                    return reply(match, prompt, rng)
+                groups = match.groupdict()
+                return reply.format(**groups) if groups else reply
+        words = [rng.choice(_FILLER) for _ in range(self.reply_words)]
+        return " ".join(words).capitalize() + "."
+
+    def chunks(self, text: str, usage: FakeUsage) -> list:
+        """Splits a reply into stream chunks; the last one carries the usage metadata."""
+        words = text.split(" ")
+        size = max(1, math.ceil(len(words) / self.stream_chunks))
+        parts = [" ".join(words[i:i + size]) + (" " if i + size < len(words) else "") for i in range(0, len(words), size)]
+        return [FakeResponse(part, usage if i == len(parts) - 1 else None) for i, part in enumerate(parts)]
+
+
+class FakeGenerativeModel:
+    def __init__(self, model_name: str, backend: FakeBackend):
+        """Implements the parts of genai.GenerativeModel the app uses: generate_content(_async), with streaming."""
+        self.model_name = model_name
+        self.backend = backend
+
+    def generate_content(self, prompt, generation_config=None, stream: bool = False, request_options=None, **_):
+        text, usage, latency_s, error = self.backend.plan(self.model_name, prompt, generation_config, request_options)
+        if stream and error is None:
+            self.backend._count(streams=1)
+            return self._stream(self.backend.chunks(text, usage), latency_s)
+        time.sleep(latency_s)
+        if error is not None:
+            raise error
+        return FakeResponse(text, usage)
+
+    async def generate_content_async(self, prompt, generation_config=None, request_options=None, **_):
+        text, usage, latency_s, error = self.backend.plan(self.model_name, prompt, generation_config, request_options)
+        await asyncio.sleep(latency_s)
+        if error is not None:
+            raise error
+        return FakeResponse(text, usage)
+
+    @staticmethod
+    def _stream(chunks: list, latency_s: float):
+        rest_s = latency_s * (1 - FIRST_CHUNK_SHARE) / max(1, len(chunks) - 1)
+        for i, chunk in enumerate(chunks):
+            time.sleep(latency_s * FIRST_CHUNK_SHARE if i == 0 else rest_s)
+            yield chunk
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_fake_backend() -> FakeBackend:
+    """The process-wide backend used with WISE_GEMINI_BACKEND=fake (configured by WISE_FAKE_GEMINI_*)."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = FakeBackend(latency=DEFAULT_LATENCY, error_rate=DEFAULT_ERROR_RATE, seed=DEFAULT_SEED)
+        return _backend
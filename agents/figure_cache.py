@@ -0,0 +1,63 @@
+# agents/figure_cache.py
+#
+# Memoizes parsed Plotly figures for the chat history render loop. Every
+# st.rerun() used to call pio.from_json on every chart in the conversation;
+# now each figure JSON is parsed once per process and looked up by its id
+# (a content hash) after that. Figures handed out are shared - treat them as
+# read-only.
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+def figure_id(figure_json: str) -> str:
+    """A short content hash that identifies a figure JSON payload."""
+    return hashlib.blake2b(figure_json.encode("utf-8"), digest_size=12).hexdigest()
+
+
+class FigureCache:
+    def __init__(self, max_entries: int = 64):
+        """
+        A bounded LRU of parsed figures keyed by figure id.
+        """
+        self.max_entries = max_entries
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, figure_json: str, key: str = None):
+        """Returns the parsed figure for `figure_json`, parsing it only on a miss."""
+        key = key or figure_id(figure_json)
+        with self._lock:
+            fig = self._figures.get(key)
+            if fig is not None:
+                self._figures.move_to_end(key)
+                self.hits += 1
+                return fig
+            self.misses += 1
+
+        import plotly.io as pio  # deferred: only chat turns with charts need it
+
+        fig = pio.from_json(figure_json)
+        with self._lock:
+            self._figures[key] = fig
+            self._figures.move_to_end(key)
+            while len(self._figures) > self.max_entries:
+                self._figures.popitem(last=False)
+        return fig
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._figures)}
+
+
+# --- Shared by every session in the process ---
+figure_cache = FigureCache(max_entries=int(os.getenv("WISE_FIGURE_CACHE_ENTRIES", "64")))
+
+
+def get_figure(figure_json: str, key: str = None):
+    """Shortcut for figure_cache.get(figure_json, key)."""
+    return figure_cache.get(figure_json, key)
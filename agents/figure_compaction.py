@@ -0,0 +1,156 @@
+# agents/figure_compaction.py
+#
+# Post-processing for chart figures before they are serialized and kept in
+# session state. Long line traces are decimated with LTTB (marker traces with
+# per-bucket min/max) down to a pixel budget, anything still too big is moved to
+# WebGL, and dates are sent as epoch-ms typed arrays so Plotly's base64
+# encoding covers every axis. The full-resolution figure stays one cached
+# re-query away for when the user wants to zoom in.
+
+import os
+
+import numpy as np
+import plotly.graph_objects as go
+
+from agents.response_cache import ResponseCache
+
+PIXEL_BUDGET = int(os.getenv("WISE_CHART_PIXEL_BUDGET", "1500"))
+WEBGL_THRESHOLD = int(os.getenv("WISE_CHART_WEBGL_THRESHOLD", "5000"))
+
+# Per-point trace attributes that must be sliced together with x/y.
+_ALIGNED_ATTRS = ("text", "hovertext", "customdata")
+
+# Full-resolution figure JSON, keyed by chart request, shared by every session.
+full_resolution_cache = ResponseCache(max_entries=int(os.getenv("WISE_FULL_RES_CACHE_ENTRIES", "16")))
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of the n_out points that best keep the line's shape."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    y = np.nan_to_num(y)
+    every = (n - 2) / (n_out - 2)
+    edges = (np.floor(np.arange(n_out - 1) * every) + 1).astype(np.int64)
+    edges = np.append(edges, n - 1)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_end = max(next_end, end + 1)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        out[i + 1] = a
+    return out
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Keeps the min and max of each of n_out/2 buckets, so spikes survive decimation."""
+    n = len(y)
+    buckets = max(1, n_out // 2)
+    if n <= n_out:
+        return np.arange(n)
+    y = np.nan_to_num(y)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    keep = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            seg = y[start:end]
+            keep += [start + int(np.argmin(seg)), start + int(np.argmax(seg))]
+    return np.unique(keep)
+
+
+def _as_numeric_x(values):
+    """Returns (float array, is_date) or (None, False) when x is not numeric or datetime."""
+    arr = np.asarray(values)
+    if arr.dtype.kind == "M":
+        return arr.astype("datetime64[ms]").astype(np.int64).astype(np.float64), True
+    if arr.dtype.kind in "iuf":
+        return arr.astype(np.float64), False
+    if arr.dtype.kind in "OU":
+        try:
+            parsed = arr.astype("datetime64[ms]")
+        except (ValueError, TypeError):
+            return None, False
+        return parsed.astype(np.int64).astype(np.float64), True
+    return None, False
+
+
+def _slice_aligned(trace, idx: np.ndarray, n: int):
+    for attr in _ALIGNED_ATTRS:
+        value = getattr(trace, attr, None)
+        if value is not None and not isinstance(value, str) and len(value) == n:
+            trace[attr] = np.asarray(value)[idx]
+    for attr in ("color", "size"):
+        value = getattr(trace.marker, attr, None) if getattr(trace, "marker", None) is not None else None
+        if value is not None and not isinstance(value, str) and np.ndim(value) == 1 and len(value) == n:
+            trace.marker[attr] = np.asarray(value)[idx]
+
+
+def compact_figure(fig: go.Figure, pixel_budget: int = PIXEL_BUDGET, webgl_threshold: int = WEBGL_THRESHOLD) -> go.Figure:
+    """Decimates, WebGL-switches and typed-array-encodes a figure in place, and returns it."""
+    _compact(fig, pixel_budget, webgl_threshold)
+    return fig
+
+
+def figure_json(fig: go.Figure, compact: bool = True) -> tuple:
+    """Serializes a figure (compacted unless compact=False). Returns (JSON, whether decimation dropped points)."""
+    dropped = _compact(fig, PIXEL_BUDGET, WEBGL_THRESHOLD) if compact else 0
+    return fig.to_json(), dropped > 0
+
+
+def _compact(fig: go.Figure, pixel_budget: int, webgl_threshold: int) -> int:
+    """compact_figure's body; returns how many points decimation dropped."""
+    dropped = 0
+    date_axes = set()
+    new_data = []
+    for trace in fig.data:
+        if trace.type not in ("scatter", "scattergl") or trace.x is None or trace.y is None:
+            new_data.append(trace)
+            continue
+        x, is_date = _as_numeric_x(trace.x)
+        if x is None:
+            new_data.append(trace)
+            continue
+        y_raw = np.asarray(trace.y)
+        if y_raw.dtype.kind not in "iuf":
+            new_data.append(trace)
+            continue
+        y = y_raw.astype(np.float64)
+        n = len(y)
+
+        if n > pixel_budget and len(x) == n and np.all(np.diff(x) >= 0):
+            mode = trace.mode or "lines"
+            idx = lttb_indices(x, y, pixel_budget) if "lines" in mode else minmax_indices(y, pixel_budget)
+            _slice_aligned(trace, idx, n)
+            x, y_raw = x[idx], y_raw[idx]
+            dropped += n - len(idx)
+
+        if is_date:
+            date_axes.add(trace.xaxis or "x")
+        # Numpy arrays serialize as base64 typed arrays; the y dtype is kept.
+        trace.x = x
+        trace.y = y_raw
+
+        if trace.type == "scatter" and len(y_raw) > webgl_threshold:
+            props = trace.to_plotly_json()
+            props.pop("type", None)
+            try:
+                trace = go.Scattergl(props)
+            except ValueError:
+                pass  # attribute WebGL does not support (e.g. spline lines) - keep SVG
+        new_data.append(trace)
+
+    fig.data = []
+    for trace in new_data:
+        fig.add_trace(trace)
+    for axis in date_axes:
+        layout_key = "xaxis" if axis == "x" else f"xaxis{axis[1:]}"
+        fig.layout[layout_key].type = "date"
+    # Streamlit applies its own theme; the default template is ~8 KB of dead weight per chart.
+    fig.layout.template = None
+    return dropped
@@ -0,0 +1,366 @@
+# agents/gemini_client.py
+#
+# The one place the app talks to Gemini. Owns the API configuration, one
+# GenerativeModel per model name (sharing the library's pooled client
+# channel), the shared google.genai Client used by the ADK agents, and
+# per-model defaults such as request timeouts. Every agent calls generate /
+# generate_async / generate_stream, which consult the response cache first,
+# so caching, timeouts and instrumentation all live here (each call is an
+# "llm_call" telemetry span with its model, tokens and cache hit). Cache misses are
+# coalesced: identical requests already in flight (same model, prompt, config
+# and dataset version) share one API call instead of each sending their own.
+# Every API call then goes through the shared rate limiter (per-model RPM/TPM
+# buckets, adaptive concurrency, retries with backoff within a deadline).
+# generate_async(..., client="genai") sends the request through the google.genai
+# Client instead (the ADK agents' tools), with the same cache, coalescing,
+# limiter, spans and fake backend.
+#
+#   from agents.gemini_client import generate, generate_stream
+#   text = generate("vibe", 'gemini-1.5-flash', prompt)
+#   text = await generate_async("science", 'gemini-2.0-flash', prompt, client="genai")
+#   for chunk in generate_stream("scientific", 'gemini-1.5-flash', prompt): ...
+
+import os
+import threading
+import time
+
+from agents.rate_limiter import estimate_tokens, rate_limiter
+from agents.response_cache import CALL_SITE_TTLS, DEFAULT_TTL, make_key, response_cache
+from agents.single_flight import SingleFlight
+from agents.telemetry import span
+
+# --- Per-model defaults ---
+# timeout_s bounds one request; deadline_s bounds the whole call, retries and quota waits included.
+DEFAULT_TIMEOUT_S = float(os.getenv("WISE_GEMINI_TIMEOUT_S", "60"))
+DEFAULT_DEADLINE_S = float(os.getenv("WISE_GEMINI_DEADLINE_S", "90"))
+MODEL_DEFAULTS = {
+    "gemini-1.5-flash": {"timeout_s": 30.0, "deadline_s": 45.0},
+    "gemini-1.5-pro": {"timeout_s": 60.0, "deadline_s": 90.0},
+    "gemini-2.0-flash": {"timeout_s": 30.0, "deadline_s": 45.0},
+}
+
+# "fake" serves every model from agents/fake_gemini.py: no network, no API key (for offline runs and benchmarks).
+BACKEND = os.getenv("WISE_GEMINI_BACKEND", "live")
+
+_lock = threading.Lock()
+_configured = False
+_models = {}
+_model_factory = None
+_genai_client = None
+_stats = {}
+# Followers wait for the leader's deadline plus this grace before giving up on it.
+COALESCE_GRACE_S = float(os.getenv("WISE_GEMINI_COALESCE_GRACE_S", "5"))
+_flights = SingleFlight()
+
+
+def configure(api_key: str = None):
+    """Configures the API key once per process (GOOGLE_API_KEY by default). Safe to call repeatedly."""
+    global _configured
+    api_key = api_key or os.getenv("GOOGLE_API_KEY")
+    with _lock:
+        if _configured or not api_key:
+            return
+        import google.generativeai as genai  # imported on first use: it costs ~0.4 s at startup
+
+        genai.configure(api_key=api_key)
+        _configured = True
+
+
+def use_model_factory(factory):
+    """
+    Builds models with `factory(model_name)` instead of genai.GenerativeModel (None restores the live API),
+    e.g. agents.fake_gemini.FakeBackend(...).model. Models built so far are dropped.
+    """
+    global _model_factory
+    with _lock:
+        _model_factory = factory
+        _models.clear()
+
+
+def _build_model(model_name: str):
+    if _model_factory is not None:
+        return _model_factory(model_name)
+    if BACKEND == "fake":
+        from agents.fake_gemini import get_fake_backend
+
+        return get_fake_backend().model(model_name)
+    import google.generativeai as genai
+
+    return genai.GenerativeModel(model_name)
+
+
+def get_model(model_name: str):
+    """The shared GenerativeModel for `model_name`, created on first use."""
+    model = _models.get(model_name)
+    if model is None:
+        if _model_factory is None and BACKEND != "fake":
+            configure()
+        with _lock:
+            model = _models.get(model_name)
+            if model is None:
+                model = _models[model_name] = _build_model(model_name)
+    return model
+
+
+def get_genai_client():
+    """The shared google.genai Client (used by the ADK agents' tools), created on first use."""
+    global _genai_client
+    if _genai_client is None:
+        from google import genai as google_genai
+        from google.genai import types
+
+        with _lock:
+            if _genai_client is None:
+                _genai_client = google_genai.Client(
+                    api_key=os.getenv("GOOGLE_API_KEY"),
+                    http_options=types.HttpOptions(timeout=int(DEFAULT_TIMEOUT_S * 1000)),
+                )
+    return _genai_client
+
+
+def _genai_generate_async(model_name: str, prompt: str, generation_config, timeout_s: float):
+    """One request through the google.genai Client; the fake backend and model factories stand in for it too."""
+    if _model_factory is not None or BACKEND == "fake":
+        return get_model(model_name).generate_content_async(
+            prompt, generation_config=generation_config, request_options={"timeout": timeout_s}
+        )
+    from google.genai import types
+
+    config = types.GenerateContentConfig(
+        **(generation_config or {}), http_options=types.HttpOptions(timeout=int(timeout_s * 1000))
+    )
+    return get_genai_client().aio.models.generate_content(model=model_name, contents=prompt, config=config)
+
+
+def warm_up(model_names=("gemini-1.5-flash",), background: bool = False):
+    """
+    Builds the models (and with them the pooled client channel) before the first request needs them.
+    With background=True this happens on a daemon thread, so the caller's first render never waits on it.
+    """
+    if background:
+        threading.Thread(target=warm_up, args=(model_names,), name="wise-gemini-warm-up", daemon=True).start()
+        return
+    for model_name in model_names:
+        get_model(model_name)
+
+
+def _timeout(model_name: str, timeout_s: float = None) -> float:
+    if timeout_s is None:
+        timeout_s = MODEL_DEFAULTS.get(model_name, {}).get("timeout_s", DEFAULT_TIMEOUT_S)
+    return timeout_s
+
+
+def _deadline(model_name: str, deadline_s: float = None) -> float:
+    if deadline_s is None:
+        deadline_s = MODEL_DEFAULTS.get(model_name, {}).get("deadline_s", DEFAULT_DEADLINE_S)
+    return deadline_s
+
+
+def _ttl(site: str, ttl: float = None) -> float:
+    return ttl if ttl is not None else CALL_SITE_TTLS.get(site, DEFAULT_TTL)
+
+
+def _record(model_name: str, outcome: str, elapsed_ms: float = 0.0):
+    with _lock:
+        stats = _stats.setdefault(model_name, {"calls": 0, "cache_hits": 0, "errors": 0, "total_ms": 0.0})
+        stats[outcome] += 1
+        stats["total_ms"] += elapsed_ms
+
+
+def stats() -> dict:
+    """Per-model API calls, cache hits, errors and mean API latency (ms)."""
+    with _lock:
+        return {
+            name: {**s, "avg_ms": (s["total_ms"] / s["calls"]) if s["calls"] else None}
+            for name, s in _stats.items()
+        }
+
+
+def in_flight() -> int:
+    """How many distinct non-streaming Gemini requests are in flight right now."""
+    return _flights.in_flight()
+
+
+def limiter_stats() -> dict:
+    """Per-model rate limiter state: bucket levels, concurrency limit, queueing, 429s, retries, give-ups."""
+    return rate_limiter.stats()
+
+
+def coalescing_stats() -> dict:
+    """Leader calls, coalesced (saved) calls and follower timeouts, overall and per call site."""
+    return _flights.stats()
+
+
+# --- Entry points ---
+
+def _note_usage(record: dict, response):
+    """Copies prompt/output token counts from a response's usage metadata onto a telemetry span."""
+    usage = getattr(response, "usage_metadata", None)
+    for field, attr in (("prompt_tokens", "prompt_token_count"), ("output_tokens", "candidates_token_count")):
+        value = getattr(usage, attr, None)
+        if isinstance(value, int):
+            record[field] = value
+
+
+def generate(site: str, model_name: str, prompt: str, generation_config=None, dataset_version: str = None,
+             ttl: float = None, cache: bool = True, timeout_s: float = None, deadline_s: float = None) -> str:
+    """
+    Returns the stripped text of a Gemini completion, served from the response cache when possible.
+    Concurrent identical misses share one call, which is rate limited and retried on transient errors
+    until its deadline. Errors that remain are raised to every caller sharing the call and never cached.
+    """
+    with span("llm_call", site=site, model=model_name, cache_hit=False) as s:
+        key = make_key(model_name, prompt, generation_config, dataset_version)
+        if cache:
+            cached = response_cache.get(key, site=site)
+            if cached is not None:
+                _record(model_name, "cache_hits")
+                s["cache_hit"] = True
+                return cached
+
+        timeout_s, deadline_s = _timeout(model_name, timeout_s), _deadline(model_name, deadline_s)
+
+        def _call() -> str:
+            started = time.perf_counter()
+            s["coalesced"] = False
+            try:
+                response = rate_limiter.call(
+                    model_name, estimate_tokens(prompt, generation_config),
+                    lambda attempt_timeout_s: get_model(model_name).generate_content(
+                        prompt, generation_config=generation_config, request_options={"timeout": attempt_timeout_s}
+                    ),
+                    deadline_s, timeout_s,
+                )
+                text = response.text.strip()
+            except Exception:
+                _record(model_name, "errors")
+                raise
+            _record(model_name, "calls", (time.perf_counter() - started) * 1000)
+            # Tokens are counted once, on the leader's span; followers sharing the call are marked coalesced.
+            _note_usage(s, response)
+            if cache:
+                response_cache.put(key, text, _ttl(site, ttl))
+            return text
+
+        text = _flights.do(key, _call, timeout_s=deadline_s + COALESCE_GRACE_S, site=site)
+        s.setdefault("coalesced", True)
+        return text
+
+
+async def generate_async(site: str, model_name: str, prompt: str, generation_config=None,
+                         dataset_version: str = None, ttl: float = None, cache: bool = True,
+                         timeout_s: float = None, deadline_s: float = None, client: str = "generativeai") -> str:
+    """
+    Async twin of generate. client="genai" sends the request through the shared google.genai Client
+    (generation_config is then a dict of GenerateContentConfig fields); answers are cached alike.
+    """
+    if client not in ("generativeai", "genai"):
+        raise ValueError(f"Unknown Gemini client '{client}'.")
+    if client == "genai":
+        def _request(attempt_timeout_s):
+            return _genai_generate_async(model_name, prompt, generation_config, attempt_timeout_s)
+    else:
+        def _request(attempt_timeout_s):
+            return get_model(model_name).generate_content_async(
+                prompt, generation_config=generation_config, request_options={"timeout": attempt_timeout_s}
+            )
+
+    with span("llm_call", site=site, model=model_name, cache_hit=False) as s:
+        key = make_key(model_name, prompt, generation_config, dataset_version)
+        if cache:
+            cached = response_cache.get(key, site=site)
+            if cached is not None:
+                _record(model_name, "cache_hits")
+                s["cache_hit"] = True
+                return cached
+
+        timeout_s, deadline_s = _timeout(model_name, timeout_s), _deadline(model_name, deadline_s)
+
+        async def _call() -> str:
+            started = time.perf_counter()
+            s["coalesced"] = False
+            try:
+                response = await rate_limiter.acall(
+                    model_name, estimate_tokens(prompt, generation_config), _request, deadline_s, timeout_s,
+                )
+                # google.genai responses have text=None when the candidate holds no text parts.
+                text = (response.text or "").strip()
+            except Exception:
+                _record(model_name, "errors")
+                raise
+            _record(model_name, "calls", (time.perf_counter() - started) * 1000)
+            _note_usage(s, response)
+            if cache:
+                response_cache.put(key, text, _ttl(site, ttl))
+            return text
+
+        text = await _flights.ado(key, _call, timeout_s=deadline_s + COALESCE_GRACE_S, site=site)
+        s.setdefault("coalesced", True)
+        return text
+
+
+def _chunk_text(chunk) -> str:
+    try:
+        return chunk.text
+    except ValueError:
+        # Chunks without text parts (e.g. the final finish_reason chunk) carry nothing to show.
+        return ""
+
+
+def generate_stream(site: str, model_name: str, prompt: str, generation_config=None, dataset_version: str = None,
+                    ttl: float = None, cache: bool = True, timeout_s: float = None, deadline_s: float = None):
+    """
+    Streaming twin of generate: yields text chunks as Gemini produces them.
+    A cache hit yields the whole stored answer as one chunk; a completed stream is cached.
+    Streams are not coalesced - a stream the caller abandons midway has no result to share.
+    Rate limiting and retries cover opening the stream up to its first chunk; once text has been
+    shown, a failure is raised rather than retried.
+    """
+    with span("llm_call", site=site, model=model_name, cache_hit=False, stream=True) as s:
+        key = make_key(model_name, prompt, generation_config, dataset_version)
+        if cache:
+            cached = response_cache.get(key, site=site)
+            if cached is not None:
+                _record(model_name, "cache_hits")
+                s["cache_hit"] = True
+                yield cached
+                return
+
+        timeout_s, deadline_s = _timeout(model_name, timeout_s), _deadline(model_name, deadline_s)
+
+        def _open(attempt_timeout_s):
+            response = get_model(model_name).generate_content(
+                prompt, generation_config=generation_config, stream=True,
+                request_options={"timeout": attempt_timeout_s},
+            )
+            chunks = iter(response)
+            return next(chunks, None), chunks
+
+        started = time.perf_counter()
+        texts = []
+        try:
+            first, rest = rate_limiter.call(
+                model_name, estimate_tokens(prompt, generation_config), _open, deadline_s, timeout_s,
+                observe_latency=False,
+            )
+            s["first_chunk_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            last = first
+            for chunk in ([first] if first is not None else []):
+                text = _chunk_text(chunk)
+                if text:
+                    texts.append(text)
+                    yield text
+            for chunk in rest:
+                last = chunk
+                text = _chunk_text(chunk)
+                if text:
+                    texts.append(text)
+                    yield text
+        except Exception:
+            _record(model_name, "errors")
+            raise
+        _record(model_name, "calls", (time.perf_counter() - started) * 1000)
+        # The final chunk carries the usage metadata for the whole stream.
+        _note_usage(s, last)
+        if cache:
+            response_cache.put(key, "".join(texts).strip(), _ttl(site, ttl))
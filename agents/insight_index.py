@@ -0,0 +1,211 @@
+# agents/insight_index.py
+#
+# A small index of "interesting facts" about a stock dataset: top volume days,
+# largest daily moves, volatility spikes, drawdowns and winning/losing streaks.
+# scripts/process_dataset.py builds it next to the processed data; the
+# DaydreamAgent samples one fact per spark in O(1) instead of scanning the table.
+
+import json
+import os
+import random
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from agents.dataset_store import get_dataset
+from agents.telemetry import get_logger
+
+log = get_logger(__name__)
+
+INDEX_VERSION = 2
+
+
+def insight_index_path(data_path: str) -> str:
+    """data/wmt_stock_data.csv -> data/wmt_stock_data_insights.json"""
+    return f"{os.path.splitext(data_path)[0]}_insights.json"
+
+
+def _day(ts) -> str:
+    return pd.Timestamp(ts).strftime('%Y-%m-%d')
+
+
+def _volume_peaks(df: pd.DataFrame, k: int) -> list:
+    top = df.nlargest(k, 'Volume')
+    return [
+        {"kind": "volume_peak", "date": _day(d), "volume": int(v), "close": round(float(c), 2),
+         "text": f"on {_day(d)}, trading volume hit a massive peak of {int(v):,} shares, closing at ${float(c):.2f}"}
+        for d, v, c in zip(top['Date'], top['Volume'], top['Close'])
+    ]
+
+
+def _daily_moves(df: pd.DataFrame, returns: np.ndarray, k: int) -> list:
+    order = np.argsort(returns)
+    order = order[~np.isnan(returns[order])]
+    # Rises and falls are picked from their own side, so a short series never yields the same day twice;
+    # moves that would read as 0.0% are not worth an insight.
+    shown = np.round(returns[order] * 100, 1)
+    rises, falls = order[shown > 0][::-1][:k], order[shown < 0][:k]
+    moves, seen = [], set()
+    for i in np.concatenate([rises, falls]):
+        day = _day(df['Date'].iat[i])
+        if day in seen:
+            continue
+        seen.add(day)
+        pct = returns[i] * 100
+        direction = "jumped" if pct > 0 else "fell"
+        moves.append({
+            "kind": "daily_move", "date": day, "pct_change": round(float(pct), 2),
+            "close": round(float(df['Close'].iat[i]), 2),
+            "text": f"on {day}, the stock {direction} {abs(pct):.1f}% in a single day to ${float(df['Close'].iat[i]):.2f}",
+        })
+    return moves
+
+
+def _volatility_spikes(df: pd.DataFrame, returns: np.ndarray, k: int, window: int) -> list:
+    vol = pd.Series(returns).rolling(window).std().to_numpy() * np.sqrt(252) * 100
+    months = df['Date'].dt.to_period('M').to_numpy()
+    spikes, seen = [], set()
+    for i in np.argsort(np.nan_to_num(vol, nan=-1.0))[::-1]:
+        if np.isnan(vol[i]) or len(spikes) >= k:
+            break
+        if months[i] in seen:  # one spike per month, so the index is not one crisis k times over
+            continue
+        seen.add(months[i])
+        spikes.append({
+            "kind": "volatility_spike", "date": _day(df['Date'].iat[i]), "annualized_vol_pct": round(float(vol[i]), 1),
+            "text": f"in the {window} trading days up to {_day(df['Date'].iat[i])}, annualized volatility spiked to {vol[i]:.0f}%",
+        })
+    return spikes
+
+
+def _drawdowns(df: pd.DataFrame, k: int) -> list:
+    close = df['Close'].to_numpy(dtype=float)
+    peak = np.maximum.accumulate(close)
+    depth = close / peak - 1.0
+    # A new episode starts at every new high; the trough is the deepest point inside it.
+    episode = np.cumsum(close >= peak)
+    frame = pd.DataFrame({"episode": episode, "depth": depth, "pos": np.arange(len(close))})
+    troughs = frame.loc[frame.groupby("episode")["depth"].idxmin()]
+    troughs = troughs[troughs["depth"] < 0].nsmallest(k, "depth")
+    first_pos = frame.groupby("episode")["pos"].min()
+    results = []
+    for ep, d, pos in zip(troughs["episode"], troughs["depth"], troughs["pos"]):
+        start = int(first_pos[ep])
+        results.append({
+            "kind": "drawdown", "peak_date": _day(df['Date'].iat[start]), "trough_date": _day(df['Date'].iat[pos]),
+            "depth_pct": round(float(d) * 100, 1),
+            "text": (f"from its high on {_day(df['Date'].iat[start])} to {_day(df['Date'].iat[pos])}, "
+                     f"the stock drew down {abs(d) * 100:.1f}%"),
+        })
+    return results
+
+
+def _streaks(df: pd.DataFrame, returns: np.ndarray, k: int) -> list:
+    sign = np.sign(np.nan_to_num(returns))
+    run_id = np.concatenate([[0], np.cumsum(sign[1:] != sign[:-1])])
+    runs = pd.DataFrame({"run": run_id, "sign": sign, "pos": np.arange(len(sign))}).groupby("run").agg(
+        sign=("sign", "first"), start=("pos", "min"), end=("pos", "max"), length=("pos", "size"))
+    results = []
+    for s, word in ((1, "up"), (-1, "down")):
+        for _, r in runs[runs["sign"] == s].nlargest(k, "length").iterrows():
+            start, end = int(r["start"]), int(r["end"])
+            results.append({
+                "kind": "streak", "direction": word, "length": int(r["length"]),
+                "start": _day(df['Date'].iat[start]), "end": _day(df['Date'].iat[end]),
+                "text": (f"between {_day(df['Date'].iat[start])} and {_day(df['Date'].iat[end])}, "
+                         f"the stock closed {word} {int(r['length'])} days in a row"),
+            })
+    return results
+
+
+def build_insight_index(df: pd.DataFrame, top_k: int = 5, window: int = 21) -> dict:
+    """Computes every insight family with vectorized pandas/NumPy. Needs 'Date', 'Close' and 'Volume'."""
+    df = df[['Date', 'Close', 'Volume']].copy()
+    df['Date'] = pd.to_datetime(df['Date'])
+    df = df.sort_values('Date').reset_index(drop=True)
+    close = df['Close'].to_numpy(dtype=float)
+    returns = np.full(len(close), np.nan)
+    returns[1:] = close[1:] / close[:-1] - 1.0
+
+    insights = (
+        _volume_peaks(df, top_k)
+        + _daily_moves(df, returns, top_k)
+        + _volatility_spikes(df, returns, top_k, window)
+        + _drawdowns(df, top_k)
+        + _streaks(df, returns, top_k)
+    )
+    return {
+        "version": INDEX_VERSION,
+        "built_at": time.time(),
+        "rows": len(df),
+        "start": _day(df['Date'].iat[0]) if len(df) else None,
+        "end": _day(df['Date'].iat[-1]) if len(df) else None,
+        "insights": insights,
+    }
+
+
+def write_insight_index(df: pd.DataFrame, data_path: str, **kwargs) -> str:
+    """Builds the index for `df` and writes it next to `data_path`. Returns the index path."""
+    path = insight_index_path(data_path)
+    _write_index(build_insight_index(df, **kwargs), path)
+    return path
+
+
+def _write_index(index: dict, path: str):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+# --- Loading for request-time sampling ---
+_loaded = {}
+_lock = threading.Lock()
+
+
+def load_insight_index(data_path: str):
+    """
+    Returns the insight index for a dataset, or None if there is no data.
+    A missing or stale index file (older than the data) is rebuilt once from the dataset store.
+    """
+    path = insight_index_path(data_path)
+    try:
+        data_mtime = os.stat(data_path).st_mtime_ns
+    except OSError:
+        return None
+
+    with _lock:
+        cached = _loaded.get(path)
+        if cached is not None and cached[0] == data_mtime:
+            return cached[1]
+
+        index = None
+        try:
+            if os.stat(path).st_mtime_ns >= data_mtime:
+                with open(path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+        except (OSError, ValueError):
+            index = None
+
+        if index is None or index.get("version") != INDEX_VERSION:
+            log.info(f"🗂️ InsightIndex: Building index for {os.path.basename(data_path)} (none on disk).")
+            df = get_dataset(data_path)
+            if df is None:
+                return None
+            index = build_insight_index(df)
+            try:
+                _write_index(index, path)
+            except OSError as e:
+                log.warning(f"⚠️ InsightIndex: Could not write {path} - {e}")
+        _loaded[path] = (data_mtime, index)
+        return index
+
+
+def sample_insight(data_path: str, rng: random.Random = random):
+    """Picks one insight at random in O(1). Returns None when there is nothing to pick."""
+    index = load_insight_index(data_path)
+    if not index or not index.get("insights"):
+        return None
+    return rng.choice(index["insights"])
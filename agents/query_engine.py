@@ -0,0 +1,273 @@
+# agents/query_engine.py
+#
+# Declarative chart queries. Instead of running free-form code against the
+# whole DataFrame, a chart request is described by a small JSON spec - value
+# columns, filters, date range, resample frequency, aggregation and chart
+# type - and executed here with vectorized pandas. When the partitioned
+# Parquet written by scripts/process_dataset.py is present (and newer than the
+# CSV), only the needed columns are read and the date range / filters are
+# pushed down to partition pruning and row-group statistics; otherwise the
+# shared registry frame is filtered in memory. Results are cached per spec.
+#
+# Spec format (every key but "y" is optional):
+#   {"chart": "line", "y": ["Close"], "date_range": {"start": "2021-01-01", "end": null},
+#    "filters": [{"column": "Volume", "op": ">", "value": 20000000}],
+#    "resample": "M", "aggregation": "mean", "transform": null, "label": null, "title": "..."}
+
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import plotly.express as px
+
+from agents.dataset_store import dataset_store, get_dataset
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+CHART_TYPES = ("line", "area", "scatter", "bar", "histogram")
+FILTER_OPS = ("==", "!=", ">", ">=", "<", "<=", "in")
+AGGREGATIONS = ("mean", "sum", "min", "max", "median", "first", "last", "count")
+# Spec frequency -> pandas offset alias (period starts, so bars line up with their label).
+RESAMPLE_FREQS = {"D": "D", "W": "W", "M": "MS", "Q": "QS", "Y": "YS"}
+TRANSFORMS = ("pct_change",)
+
+
+class QuerySpecError(ValueError):
+    """The spec is malformed or refers to columns/operations the engine does not support."""
+
+
+def _as_timestamp(value, field: str):
+    if value in (None, ""):
+        return None
+    try:
+        return pd.Timestamp(value)
+    except (ValueError, TypeError):
+        raise QuerySpecError(f"{field} is not a date: {value!r}")
+
+
+def normalize_spec(spec: dict, columns) -> dict:
+    """
+    Validates a spec against the dataset's columns and returns it in canonical form
+    (defaults filled in, columns as lists, dates as ISO strings). Raises QuerySpecError.
+    """
+    if not isinstance(spec, dict):
+        raise QuerySpecError("The spec must be a JSON object.")
+    columns = [c for c in columns if c != "Date"]
+
+    chart = spec.get("chart", "line")
+    if chart not in CHART_TYPES:
+        raise QuerySpecError(f"Unsupported chart type: {chart!r}")
+
+    y = spec.get("y")
+    y = [y] if isinstance(y, str) else list(y or [])
+    if not y:
+        raise QuerySpecError("The spec needs at least one value column in 'y'.")
+    for col in y:
+        if col not in columns:
+            raise QuerySpecError(f"Unknown column: {col!r}")
+
+    date_range = spec.get("date_range") or {}
+    start = _as_timestamp(date_range.get("start"), "date_range.start")
+    end = _as_timestamp(date_range.get("end"), "date_range.end")
+    if start is not None and end is not None and start > end:
+        raise QuerySpecError("date_range.start is after date_range.end.")
+
+    filters = []
+    for f in spec.get("filters") or []:
+        column, op, value = f.get("column"), f.get("op"), f.get("value")
+        if column not in columns:
+            raise QuerySpecError(f"Unknown filter column: {column!r}")
+        if op not in FILTER_OPS:
+            raise QuerySpecError(f"Unsupported filter operator: {op!r}")
+        if op == "in" and not isinstance(value, list):
+            raise QuerySpecError("The 'in' operator needs a list value.")
+        filters.append({"column": column, "op": op, "value": value})
+
+    resample = spec.get("resample") or None
+    if resample is not None and resample not in RESAMPLE_FREQS:
+        raise QuerySpecError(f"Unsupported resample frequency: {resample!r}")
+    aggregation = spec.get("aggregation") or ("sum" if y == ["Volume"] else "mean")
+    if aggregation not in AGGREGATIONS:
+        raise QuerySpecError(f"Unsupported aggregation: {aggregation!r}")
+    transform = spec.get("transform") or None
+    if transform is not None and transform not in TRANSFORMS:
+        raise QuerySpecError(f"Unsupported transform: {transform!r}")
+    label = spec.get("label") or None
+    if label is not None and len(y) != 1:
+        raise QuerySpecError("'label' only applies to a single value column.")
+
+    return {
+        "chart": chart,
+        "y": y,
+        "date_range": {"start": start.date().isoformat() if start is not None else None,
+                       "end": end.date().isoformat() if end is not None else None},
+        "filters": filters,
+        "resample": resample,
+        "aggregation": aggregation if resample else None,
+        "transform": transform,
+        "label": label,
+        "title": str(spec.get("title") or f"WMT {', '.join(y)}"),
+    }
+
+
+def spec_key(spec: dict) -> str:
+    """Canonical JSON of a normalized spec - equal specs always give equal keys."""
+    return json.dumps(spec, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def parquet_dir_for(data_path: str) -> str:
+    """Where process_dataset.py writes the partitioned Parquet for a processed CSV."""
+    return f"{os.path.splitext(os.path.abspath(data_path))[0]}_parquet"
+
+
+class QueryEngine:
+    def __init__(self, data_path: str, max_results: int = 32):
+        """
+        Executes specs against one dataset. Result frames are kept in a small LRU keyed by
+        spec and dataset version; treat them as read-only.
+        """
+        self.data_path = os.path.abspath(data_path)
+        self.parquet_dir = parquet_dir_for(data_path)
+        self.max_results = max_results
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def columns(self) -> list:
+        df = get_dataset(self.data_path)
+        return list(df.columns) if df is not None else []
+
+    def _use_parquet(self) -> bool:
+        # Only trust the Parquet copy when it was written after the CSV the app reads.
+        if pq is None:
+            return False
+        manifest = os.path.join(self.parquet_dir, "_manifest.json")
+        try:
+            return os.stat(manifest).st_mtime_ns >= os.stat(self.data_path).st_mtime_ns
+        except OSError:
+            return False
+
+    def execute(self, spec: dict) -> pd.DataFrame:
+        """Returns the (cached) result frame for a spec: Date plus the value columns."""
+        spec = normalize_spec(spec, self.columns)
+        key = (spec_key(spec), dataset_store.version(self.data_path))
+        with self._lock:
+            frame = self._results.get(key)
+            if frame is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return frame
+            self.misses += 1
+
+        frame = self._run(spec)
+        with self._lock:
+            self._results[key] = frame
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+        return frame
+
+    def figure(self, spec: dict):
+        """Executes a spec and draws it with Plotly Express."""
+        spec = normalize_spec(spec, self.columns)
+        frame = self.execute(spec)
+        values = [spec["label"]] if spec["label"] else spec["y"]
+        y = values[0] if len(values) == 1 else values
+        if spec["chart"] == "histogram":
+            return px.histogram(frame, x=y, nbins=100, title=spec["title"])
+        x = "Date"
+        if spec["resample"] == "Y":
+            frame = frame.assign(Year=frame["Date"].dt.year)
+            x = "Year"
+        draw = {"line": px.line, "area": px.area, "scatter": px.scatter, "bar": px.bar}[spec["chart"]]
+        return draw(frame, x=x, y=y, title=spec["title"])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._results),
+                    "source": "parquet" if self._use_parquet() else "memory"}
+
+    # --- Execution ---
+
+    def _run(self, spec: dict) -> pd.DataFrame:
+        needed = list(dict.fromkeys(["Date"] + spec["y"] + [f["column"] for f in spec["filters"]]))
+        start = pd.Timestamp(spec["date_range"]["start"]) if spec["date_range"]["start"] else None
+        end = pd.Timestamp(spec["date_range"]["end"]) if spec["date_range"]["end"] else None
+        # The end date is inclusive.
+        end_exclusive = end + pd.Timedelta(days=1) if end is not None else None
+
+        if self._use_parquet():
+            df = self._read_parquet(needed, spec["filters"], start, end_exclusive)
+        else:
+            df = self._read_memory(needed, spec["filters"], start, end_exclusive)
+
+        df = df.sort_values("Date", kind="stable")
+        values = df[spec["y"]].astype(float)
+        if spec["transform"] == "pct_change":
+            values = values.pct_change() * 100
+        values.index = pd.DatetimeIndex(df["Date"].values)
+        if spec["resample"]:
+            values = values.resample(RESAMPLE_FREQS[spec["resample"]]).agg(spec["aggregation"])
+        values = values.dropna(how="all")
+        if spec["label"]:
+            values = values.rename(columns={spec["y"][0]: spec["label"]})
+        values.index.name = "Date"
+        return values.reset_index()
+
+    def _read_parquet(self, needed: list, filters: list, start, end_exclusive) -> pd.DataFrame:
+        pushdown = []
+        if start is not None:
+            # The Year partition bound prunes whole directories; the Date bound uses row-group stats.
+            pushdown += [("Year", ">=", start.year), ("Date", ">=", start)]
+        if end_exclusive is not None:
+            pushdown += [("Year", "<=", end_exclusive.year), ("Date", "<", end_exclusive)]
+        for f in filters:
+            value = f["value"]
+            if f["column"] in ("Year", "Month"):
+                value = [int(v) for v in value] if isinstance(value, list) else int(value)
+            pushdown.append((f["column"], f["op"], value))
+        table = pq.read_table(self.parquet_dir, columns=needed, filters=pushdown or None, partitioning="hive")
+        df = table.to_pandas()
+        for col in ("Year", "Month"):
+            if col in df.columns:
+                df[col] = df[col].astype(int)
+        return df
+
+    def _read_memory(self, needed: list, filters: list, start, end_exclusive) -> pd.DataFrame:
+        df = get_dataset(self.data_path)
+        if df is None:
+            raise FileNotFoundError(f"Data file not found: {self.data_path}")
+        mask = pd.Series(True, index=df.index)
+        if start is not None:
+            mask &= df["Date"] >= start
+        if end_exclusive is not None:
+            mask &= df["Date"] < end_exclusive
+        for f in filters:
+            column, op, value = df[f["column"]], f["op"], f["value"]
+            if op == "in":
+                mask &= column.isin(value)
+            else:
+                mask &= {"==": column.__eq__, "!=": column.__ne__, ">": column.__gt__, ">=": column.__ge__,
+                         "<": column.__lt__, "<=": column.__le__}[op](value)
+        return df.loc[mask.to_numpy(), needed]
+
+
+# --- One engine per dataset, shared by every session ---
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_query_engine(data_path: str) -> QueryEngine:
+    path = os.path.abspath(data_path)
+    with _engines_lock:
+        engine = _engines.get(path)
+        if engine is None:
+            engine = _engines[path] = QueryEngine(path)
+        return engine
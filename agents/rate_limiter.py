@@ -0,0 +1,363 @@
+# agents/rate_limiter.py
+#
+# One limiter for every Gemini request the app makes (used by
+# agents/gemini_client.py). Per model it keeps:
+#   * token buckets for requests/minute and tokens/minute, so bursts are
+#     smoothed out locally instead of being rejected by the API with 429s;
+#   * an AIMD concurrency limit - it grows by one slot per "window" of
+#     successful calls and halves on a 429, and backs off gently when
+#     latency climbs well above its unloaded baseline;
+#   * retries of transient failures (429, 5xx, timeouts) with full-jitter
+#     exponential backoff, all within a per-call deadline.
+#
+#   response = rate_limiter.call("gemini-1.5-flash", estimated_tokens, lambda timeout_s: ..., deadline_s=60)
+#   rate_limiter.stats()  # per-model bucket levels, limits, waits, 429s, retries
+
+import asyncio
+import os
+import random
+import threading
+import time
+
+from agents.telemetry import get_logger
+
+log = get_logger(__name__)
+
+# Requests and tokens per minute. Defaults are the paid-tier quotas; override per deployment, e.g.
+# WISE_GEMINI_RATE_LIMITS="gemini-1.5-flash=15/1000000,gemini-1.5-pro=2/32000" for the free tier.
+DEFAULT_RATE_LIMITS = {
+    "gemini-1.5-flash": (2000, 4_000_000),
+    "gemini-1.5-pro": (1000, 4_000_000),
+    "gemini-2.0-flash": (2000, 4_000_000),
+}
+FALLBACK_RATE_LIMIT = (1000, 1_000_000)
+# Buckets hold this many seconds' worth of quota, which is the largest burst we send at once.
+BURST_S = 10.0
+
+INITIAL_CONCURRENCY = int(os.getenv("WISE_GEMINI_CONCURRENCY", "8"))
+MAX_CONCURRENCY = int(os.getenv("WISE_GEMINI_MAX_CONCURRENCY", "64"))
+# Latency this many times the unloaded baseline counts as congestion.
+LATENCY_TOLERANCE = 2.0
+
+MAX_RETRIES = int(os.getenv("WISE_GEMINI_MAX_RETRIES", "4"))
+BACKOFF_BASE_S = 0.5
+BACKOFF_CAP_S = 8.0
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def _parse_limits(spec: str) -> dict:
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            model, values = item.split("=")
+            rpm, tpm = values.split("/")
+            limits[model.strip()] = (float(rpm), float(tpm))
+        except ValueError:
+            log.warning(f"⚠️ RateLimiter: Ignoring malformed limit '{item}' (expected model=rpm/tpm).")
+    return limits
+
+
+RATE_LIMITS = {**DEFAULT_RATE_LIMITS, **_parse_limits(os.getenv("WISE_GEMINI_RATE_LIMITS", ""))}
+
+
+class RateLimitTimeout(TimeoutError):
+    """The call could not get through the local limiter (or its retries) before its deadline."""
+
+
+def error_code(error: Exception):
+    """The HTTP status of an API error (google.api_core exceptions carry it as .code), if any."""
+    code = getattr(error, "code", None)
+    if callable(code):  # grpc-style errors expose code() instead
+        try:
+            code = code()
+        except Exception:
+            return None
+    return code if isinstance(code, int) else None
+
+
+def is_throttled(error: Exception) -> bool:
+    return error_code(error) == 429 or type(error).__name__ == "ResourceExhausted"
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, RateLimitTimeout):
+        return False
+    return (
+        error_code(error) in RETRYABLE_CODES
+        or type(error).__name__ in ("ResourceExhausted", "ServiceUnavailable", "InternalServerError", "DeadlineExceeded")
+        or isinstance(error, (TimeoutError, ConnectionError))
+    )
+
+
+def _usage_tokens(response):
+    usage = getattr(response, "usage_metadata", None)
+    total = getattr(usage, "total_token_count", None)
+    return total if isinstance(total, int) else None
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst_s: float = BURST_S):
+        """
+        A bucket refilled at `per_minute` / 60 per second. Reservations may drive it negative,
+        which queues callers fairly: each one is told how long to wait for its share.
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_s)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, n: float, now: float) -> float:
+        """Takes `n` tokens and returns how many seconds the caller must wait before using them."""
+        self._refill(now)
+        self.tokens -= min(n, self.capacity)
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self, n: float, now: float):
+        self._refill(now)
+        self.tokens = min(self.capacity, self.tokens + n)
+
+    def available(self, now: float) -> float:
+        self._refill(now)
+        return self.tokens
+
+
+class ModelLimiter:
+    def __init__(self, model_name: str, rpm: float, tpm: float,
+                 initial_concurrency: int = INITIAL_CONCURRENCY, max_concurrency: int = MAX_CONCURRENCY):
+        """
+        Request/token buckets and the adaptive concurrency limit of one model.
+        """
+        self.model_name = model_name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.limit = float(min(initial_concurrency, max_concurrency))
+        self.in_flight = 0
+        self.latency_ewma = None
+        self.latency_baseline = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self._stats = {"requests": 0, "throttled_429": 0, "errors": 0, "retries": 0, "gave_up": 0, "local_timeouts": 0,
+                       "cancelled": 0, "queued_s": 0.0}
+
+    # --- Admission ---
+
+    def reserve(self, estimated_tokens: int, deadline: float) -> float:
+        """Reserves one request and `estimated_tokens`; returns the wait. Raises if the wait would pass the deadline."""
+        with self._cond:
+            now = time.monotonic()
+            wait = max(self.requests.reserve(1, now), self.tokens.reserve(estimated_tokens, now))
+            if now + wait > deadline:
+                self.requests.refund(1, now)
+                self.tokens.refund(estimated_tokens, now)
+                self._stats["local_timeouts"] += 1
+                raise RateLimitTimeout(f"{self.model_name}: quota wait of {wait:.1f}s would pass the deadline.")
+            self._stats["queued_s"] += wait
+            return wait
+
+    def try_enter(self) -> bool:
+        with self._cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def enter(self, deadline: float):
+        """Blocks for a concurrency slot until the deadline."""
+        started = time.monotonic()
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["local_timeouts"] += 1
+                    raise RateLimitTimeout(f"{self.model_name}: no concurrency slot before the deadline.")
+                self._cond.wait(remaining)
+            self.in_flight += 1
+            self._stats["queued_s"] += time.monotonic() - started
+
+    # --- Feedback ---
+
+    def exit(self, outcome: str, latency_s: float = None, estimated_tokens: int = 0, used_tokens: int = None):
+        """Releases the slot and adapts: additive increase on success, multiplicative decrease on 429s or congestion."""
+        with self._cond:
+            self.in_flight -= 1
+            self._stats["requests"] += 1
+            if outcome == "ok":
+                self._observe_latency(latency_s)
+                if self.latency_baseline and self.latency_ewma > LATENCY_TOLERANCE * self.latency_baseline:
+                    self._decrease(0.9)
+                else:
+                    self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+                if used_tokens is not None:
+                    # Settle the estimate against what the API actually counted.
+                    now = time.monotonic()
+                    if used_tokens < estimated_tokens:
+                        self.tokens.refund(estimated_tokens - used_tokens, now)
+                    else:
+                        self.tokens.reserve(used_tokens - estimated_tokens, now)
+            elif outcome == "throttled":
+                self._stats["throttled_429"] += 1
+                self._decrease(0.5)
+            self._cond.notify_all()
+
+    def _decrease(self, factor: float):
+        # At most one decrease per round trip: a burst of 429s from calls sent together is one signal, not many.
+        now = time.monotonic()
+        if now - self._last_decrease >= (self.latency_ewma or 1.0):
+            self.limit = max(1.0, self.limit * factor)
+            self._last_decrease = now
+
+    def _observe_latency(self, latency_s: float):
+        if latency_s is None:
+            return
+        self.latency_ewma = latency_s if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency_s
+        if self.latency_baseline is None or self.latency_ewma < self.latency_baseline:
+            self.latency_baseline = self.latency_ewma
+        else:
+            # Drift up slowly, so the baseline follows a genuinely slower model without chasing congestion.
+            self.latency_baseline += 0.01 * (self.latency_ewma - self.latency_baseline)
+
+    def count(self, counter: str):
+        with self._cond:
+            self._stats[counter] += 1
+
+    def stats(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            return {
+                **self._stats,
+                "requests_available": round(self.requests.available(now), 1),
+                "tokens_available": round(self.tokens.available(now)),
+                "concurrency_limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "latency_ewma_ms": round(self.latency_ewma * 1000, 1) if self.latency_ewma else None,
+                "latency_baseline_ms": round(self.latency_baseline * 1000, 1) if self.latency_baseline else None,
+            }
+
+
+class RateLimiter:
+    def __init__(self, limits: dict = None, max_retries: int = MAX_RETRIES):
+        """
+        Per-model limiters, created on first use from `limits` ({model: (rpm, tpm)}).
+        """
+        self.limits = RATE_LIMITS if limits is None else limits
+        self.max_retries = max_retries
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def model(self, model_name: str) -> ModelLimiter:
+        limiter = self._models.get(model_name)
+        if limiter is None:
+            with self._lock:
+                limiter = self._models.get(model_name)
+                if limiter is None:
+                    rpm, tpm = self.limits.get(model_name, FALLBACK_RATE_LIMIT)
+                    limiter = self._models[model_name] = ModelLimiter(model_name, rpm, tpm)
+        return limiter
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        return random.uniform(0, min(BACKOFF_CAP_S, BACKOFF_BASE_S * 2 ** attempt))
+
+    def _after_error(self, limiter: ModelLimiter, error: Exception, attempt: int, deadline: float):
+        """Settles a failed attempt. Returns the backoff before the next one, or re-raises the error."""
+        limiter.exit("throttled" if is_throttled(error) else "error")
+        if not is_retryable(error):
+            limiter.count("errors")
+            raise error
+        if attempt >= self.max_retries:
+            limiter.count("gave_up")
+            raise error
+        backoff = self._backoff(attempt)
+        if time.monotonic() + backoff >= deadline:
+            limiter.count("gave_up")
+            raise error
+        limiter.count("retries")
+        return backoff
+
+    @staticmethod
+    def _after_cancel(limiter: ModelLimiter):
+        """Settles an attempt abandoned mid-flight. It says nothing about the API, so the limit is left alone."""
+        limiter.exit("cancelled")
+        limiter.count("cancelled")
+
+    # --- Entry points ---
+
+    def call(self, model_name: str, estimated_tokens: int, fn, deadline_s: float, timeout_s: float = None,
+             observe_latency: bool = True):
+        """
+        Runs `fn(timeout_s)` under the model's limits, retrying transient errors with jittered
+        backoff until `deadline_s` from now. Each attempt's timeout is capped by the time left.
+        Pass observe_latency=False when `fn` does not cover the whole call (e.g. a stream's first chunk).
+        """
+        limiter = self.model(model_name)
+        deadline = time.monotonic() + deadline_s
+        attempt = 0
+        while True:
+            time.sleep(limiter.reserve(estimated_tokens, deadline))
+            limiter.enter(deadline)
+            started = time.monotonic()
+            try:
+                response = fn(max(0.1, min(timeout_s or deadline_s, deadline - started)))
+            except Exception as e:
+                backoff = self._after_error(limiter, e, attempt, deadline)
+            except BaseException:
+                # KeyboardInterrupt, SystemExit: the slot must still be released.
+                self._after_cancel(limiter)
+                raise
+            else:
+                latency_s = time.monotonic() - started if observe_latency else None
+                limiter.exit("ok", latency_s, estimated_tokens, _usage_tokens(response))
+                return response
+            time.sleep(backoff)
+            attempt += 1
+
+    async def acall(self, model_name: str, estimated_tokens: int, fn, deadline_s: float, timeout_s: float = None):
+        """Async twin of call: `fn(timeout_s)` returns an awaitable, and waits never block the event loop."""
+        limiter = self.model(model_name)
+        deadline = time.monotonic() + deadline_s
+        attempt = 0
+        while True:
+            await asyncio.sleep(limiter.reserve(estimated_tokens, deadline))
+            while not limiter.try_enter():
+                if time.monotonic() >= deadline:
+                    limiter.count("local_timeouts")
+                    raise RateLimitTimeout(f"{model_name}: no concurrency slot before the deadline.")
+                await asyncio.sleep(0.05)
+            started = time.monotonic()
+            try:
+                response = await fn(max(0.1, min(timeout_s or deadline_s, deadline - started)))
+            except Exception as e:
+                backoff = self._after_error(limiter, e, attempt, deadline)
+            except BaseException:
+                # asyncio.CancelledError (a cancelled tool call or turn): the slot must still be released.
+                self._after_cancel(limiter)
+                raise
+            else:
+                limiter.exit("ok", time.monotonic() - started, estimated_tokens, _usage_tokens(response))
+                return response
+            await asyncio.sleep(backoff)
+            attempt += 1
+
+    def stats(self) -> dict:
+        """Per-model bucket levels, concurrency limit, in-flight calls, queueing, 429s, errors, retries and give-ups."""
+        with self._lock:
+            models = dict(self._models)
+        return {name: limiter.stats() for name, limiter in models.items()}
+
+
+def estimate_tokens(prompt: str, generation_config=None, default_output_tokens: int = 512) -> int:
+    """A cheap upper-ish estimate of a call's tokens: ~4 characters per prompt token plus the output cap."""
+    if isinstance(generation_config, dict):
+        output = generation_config.get("max_output_tokens")
+    else:
+        output = getattr(generation_config, "max_output_tokens", None)
+    return len(str(prompt)) // 4 + 1 + (output or default_output_tokens)
+
+
+# --- The process-wide limiter every Gemini call goes through ---
+rate_limiter = RateLimiter()
@@ -0,0 +1,278 @@
+# agents/response_cache.py
+#
+# Shared response cache for every Gemini call the app makes (consulted by
+# agents/gemini_client.py).
+# Keys cover the model name, the prompt, the generation config and the
+# dataset version, so a changed CSV or a tweaked temperature never serves a
+# stale answer. Entries live in a size-bounded in-memory LRU and, when
+# WISE_CACHE_DIR is set, in an on-disk tier that survives container restarts.
+# The disk tier has its own entry and byte budgets (least recently used files
+# go first) and expired files are swept: all at once on the first write after
+# start-up, then at most every few minutes.
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from agents.telemetry import get_logger
+
+log = get_logger(__name__)
+
+# --- Per call-site TTLs (seconds) ---
+# Vibe labels, chart specs and chart code are deterministic for a given input, so they can
+# live for a long time. Conversational answers and sparks go stale faster.
+CALL_SITE_TTLS = {
+    "vibe": 7 * 24 * 3600,
+    "daydream_spark": 6 * 3600,
+    "contextual_spark": 15 * 60,
+    "scientific": 30 * 60,
+    "creative": 30 * 60,
+    "chart_code": 7 * 24 * 3600,
+    "chart_spec": 7 * 24 * 3600,
+    "summary": 24 * 3600,
+}
+DEFAULT_TTL = 15 * 60
+
+DISK_MAX_ENTRIES = int(os.getenv("WISE_CACHE_DISK_MAX_ENTRIES", "10000"))
+DISK_MAX_BYTES = int(float(os.getenv("WISE_CACHE_DISK_MAX_MB", "256")) * 1024 * 1024)
+DISK_SWEEP_INTERVAL_S = 300
+# Temp files this old were left by a writer that died mid-write.
+_STALE_TMP_S = 3600
+
+
+def _config_fingerprint(generation_config):
+    """Turns a GenerationConfig (dict, dataclass or proto-like object) into something JSON-able."""
+    if generation_config is None:
+        return None
+    if isinstance(generation_config, dict):
+        return generation_config
+    if hasattr(generation_config, "__dict__"):
+        return {k: v for k, v in vars(generation_config).items() if v is not None}
+    return repr(generation_config)
+
+
+def make_key(model_name: str, prompt: str, generation_config=None, dataset_version=None) -> str:
+    """Builds a stable cache key from everything that can change a model's answer."""
+    payload = json.dumps(
+        {
+            "model": model_name,
+            "prompt": prompt,
+            "config": _config_fingerprint(generation_config),
+            "dataset": dataset_version,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def dataset_version(data_path: str) -> str:
+    """A cheap version stamp for a data file: its mtime and size."""
+    try:
+        stat = os.stat(data_path)
+    except OSError:
+        return "missing"
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 512, disk_dir: str = None, disk_max_entries: int = DISK_MAX_ENTRIES,
+                 disk_max_bytes: int = DISK_MAX_BYTES):
+        """
+        A two-tier cache: a bounded LRU in memory and an optional directory on disk, itself bounded
+        by `disk_max_entries` files and `disk_max_bytes` bytes. The disk budget is tracked per process;
+        files other processes write to a shared directory are counted at this process's next start.
+        """
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.disk_max_entries = disk_max_entries
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._site_stats = {}
+        # key -> (bytes, expires_at) for the files on disk, least recently used first; built on the first write.
+        self._disk_index = None
+        self._disk_bytes = 0
+        self._disk_lock = threading.Lock()
+        self._disk_stats = {"disk_evictions": 0, "disk_expired": 0}
+        self._next_sweep = 0.0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    # --- Public API ---
+
+    def get(self, key: str, site: str = "default"):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._record(site, "memory_hits")
+                    return value
+                del self._memory[key]
+
+        value = self._disk_get(key, now)
+        with self._lock:
+            if value is not None:
+                self._record(site, "disk_hits")
+            else:
+                self._record(site, "misses")
+        if value is not None:
+            expires_at, text = value
+            self._memory_put(key, text, expires_at)
+            return text
+        return None
+
+    def put(self, key: str, value: str, ttl: float):
+        expires_at = time.time() + ttl
+        self._memory_put(key, value, expires_at)
+        self._disk_put(key, value, expires_at)
+
+    def stats(self) -> dict:
+        """Hit/miss counters, overall and per call site, plus the disk tier's size and evictions."""
+        with self._disk_lock:
+            disk = {**self._disk_stats, "disk_entries": len(self._disk_index or ()), "disk_bytes": self._disk_bytes}
+        with self._lock:
+            return {
+                **self._stats,
+                **disk,
+                "entries": len(self._memory),
+                "sites": {site: dict(counts) for site, counts in self._site_stats.items()},
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+
+    # --- Internals ---
+
+    def _record(self, site: str, counter: str):
+        self._stats[counter] += 1
+        site_counts = self._site_stats.setdefault(site, {"hits": 0, "misses": 0})
+        site_counts["misses" if counter == "misses" else "hits"] += 1
+
+    def _memory_put(self, key: str, value: str, expires_at: float):
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _disk_get(self, key: str, now: float):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self._disk_lock:
+            if entry.get("expires_at", 0) <= now:
+                self._disk_remove(key)
+                self._disk_stats["disk_expired"] += 1
+                return None
+            if self._disk_index is not None and key in self._disk_index:
+                self._disk_index.move_to_end(key)
+        return entry["expires_at"], entry["value"]
+
+    def _disk_put(self, key: str, value: str, expires_at: float):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        data = json.dumps({"expires_at": expires_at, "value": value}).encode("utf-8")
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log.warning(f"⚠️ ResponseCache: Could not write disk entry - {e}")
+            return
+        with self._disk_lock:
+            if self._disk_index is None:
+                self._disk_scan()
+            old = self._disk_index.pop(key, None)
+            self._disk_bytes += len(data) - (old[0] if old else 0)
+            self._disk_index[key] = (len(data), expires_at)
+            now = time.time()
+            if now >= self._next_sweep:
+                self._disk_sweep(now)
+            while self._disk_index and (len(self._disk_index) > self.disk_max_entries
+                                        or self._disk_bytes > self.disk_max_bytes):
+                self._disk_remove(next(iter(self._disk_index)))
+                self._disk_stats["disk_evictions"] += 1
+
+    # Callers of the _disk_* helpers below hold self._disk_lock.
+
+    def _disk_remove(self, key: str):
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            pass
+        if self._disk_index is not None:
+            entry = self._disk_index.pop(key, None)
+            if entry is not None:
+                self._disk_bytes -= entry[0]
+
+    def _disk_scan(self):
+        """Indexes the files already on disk (oldest first), dropping expired, unreadable and stale temp files."""
+        now = time.time()
+        found = []
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                if name.endswith(".tmp"):
+                    try:
+                        if os.stat(path).st_mtime < now - _STALE_TMP_S:
+                            os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    stat = os.stat(path)
+                    with open(path, "r", encoding="utf-8") as f:
+                        expires_at = json.load(f).get("expires_at", 0)
+                except (OSError, ValueError, AttributeError):
+                    expires_at = 0
+                if expires_at <= now:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    self._disk_stats["disk_expired"] += 1
+                    continue
+                found.append((stat.st_mtime, name[:-len(".json")], stat.st_size, expires_at))
+        found.sort()
+        self._disk_index = OrderedDict((key, (size, expires_at)) for _, key, size, expires_at in found)
+        self._disk_bytes = sum(size for size, _ in self._disk_index.values())
+        self._next_sweep = now + DISK_SWEEP_INTERVAL_S
+        log.debug("ResponseCache: %d disk entries (%d bytes) after start-up sweep", len(self._disk_index), self._disk_bytes)
+
+    def _disk_sweep(self, now: float):
+        expired = [key for key, (_, expires_at) in self._disk_index.items() if expires_at <= now]
+        for key in expired:
+            self._disk_remove(key)
+        self._disk_stats["disk_expired"] += len(expired)
+        self._next_sweep = now + DISK_SWEEP_INTERVAL_S
+
+
+# --- The process-wide cache every agent goes through ---
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("WISE_CACHE_MAX_ENTRIES", "512")),
+    disk_dir=os.getenv("WISE_CACHE_DIR") or None,
+)
+
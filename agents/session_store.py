@@ -0,0 +1,293 @@
+# agents/session_store.py
+#
+# Durable chat state for the ADK (PROD) agents. Replaces the whole-file
+# load/append/rewrite of data/chat_state.json: every message is one INSERT
+# into an append-only log in SQLite (WAL mode, so several processes can write
+# safely and readers never block), scalar state such as the vibe is an upsert,
+# and "the last N messages" is an indexed range read. Every `compact_every`
+# appends to a session, its older log rows are moved into an archive table, so
+# the log stays short without ever losing history; a compaction only touches
+# the rows it moves, and reads of the last N messages never load more than N.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from agents.telemetry import get_logger
+
+log = get_logger(__name__)
+
+_PROJ_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DB_PATH = os.path.join(_PROJ_ROOT, 'data', 'chat_state.db')
+COMPACT_EVERY = int(os.getenv("WISE_SESSION_COMPACT_EVERY", "500"))
+# How many messages the agents load into a live session. Older ones stay in the store.
+HISTORY_LIMIT = int(os.getenv("WISE_SESSION_HISTORY_LIMIT", "50"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_by_session ON messages (user_id, session_id, id);
+CREATE TABLE IF NOT EXISTS session_state (
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (user_id, session_id, key)
+);
+CREATE TABLE IF NOT EXISTS archived_messages (
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (user_id, session_id, id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS log_sizes (
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    PRIMARY KEY (user_id, session_id)
+);
+"""
+
+
+class SessionStore:
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, compact_every: int = COMPACT_EVERY):
+        """
+        Opens (and creates) the store at `db_path`. Each thread gets its own connection.
+        """
+        self.db_path = db_path
+        self.compact_every = compact_every
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+        self._upgrade_snapshots()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- Writes ---
+
+    def append(self, user_id: str, session_id: str, content: str, role: str = "user") -> int:
+        """Appends one message to the session's log and returns its id."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            message_id = conn.execute(
+                "INSERT INTO messages (user_id, session_id, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                (user_id, session_id, role, content, time.time()),
+            ).lastrowid
+            # The session's log size is counted once (for stores older than the counter) and then kept up to date.
+            conn.execute(
+                "INSERT INTO log_sizes (user_id, session_id, rows) "
+                "SELECT ?, ?, COUNT(*) FROM messages WHERE user_id = ? AND session_id = ? "
+                "ON CONFLICT (user_id, session_id) DO UPDATE SET rows = rows + 1",
+                (user_id, session_id, user_id, session_id),
+            )
+            (log_rows,) = conn.execute(
+                "SELECT rows FROM log_sizes WHERE user_id = ? AND session_id = ?", (user_id, session_id)
+            ).fetchone()
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        # A compaction leaves HISTORY_LIMIT rows, so this fires every `compact_every` appends to this session.
+        if self.compact_every and log_rows >= HISTORY_LIMIT + self.compact_every:
+            self.compact(user_id, session_id)
+        return message_id
+
+    def set_state(self, user_id: str, session_id: str, **fields):
+        """Upserts scalar session fields (e.g. vibe, last_message). Values are stored as JSON."""
+        if not fields:
+            return
+        self._conn().executemany(
+            "INSERT INTO session_state (user_id, session_id, key, value) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (user_id, session_id, key) DO UPDATE SET value = excluded.value",
+            [(user_id, session_id, key, json.dumps(value)) for key, value in fields.items()],
+        )
+
+    def compact(self, user_id: str, session_id: str, keep: int = HISTORY_LIMIT):
+        """
+        Moves all but the newest `keep` log rows of a session into the archive. Only the moved rows are
+        read and written. Runs in one IMMEDIATE transaction, so concurrent writers simply wait their turn.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            newest_moved = conn.execute(
+                "SELECT id FROM messages WHERE user_id = ? AND session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?",
+                (user_id, session_id, keep),
+            ).fetchone()
+            if newest_moved:
+                upto_id = newest_moved[0]
+                conn.execute(
+                    "INSERT INTO archived_messages (user_id, session_id, id, role, content, created_at) "
+                    "SELECT user_id, session_id, id, role, content, created_at FROM messages "
+                    "WHERE user_id = ? AND session_id = ? AND id <= ?",
+                    (user_id, session_id, upto_id),
+                )
+                moved = conn.execute(
+                    "DELETE FROM messages WHERE user_id = ? AND session_id = ? AND id <= ?",
+                    (user_id, session_id, upto_id),
+                ).rowcount
+                conn.execute(
+                    "UPDATE log_sizes SET rows = MAX(0, rows - ?) WHERE user_id = ? AND session_id = ?",
+                    (moved, user_id, session_id),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    # --- Reads ---
+
+    def recent(self, user_id: str, session_id: str, n: int = HISTORY_LIMIT) -> list:
+        """The last `n` messages of a session, oldest first (an indexed range read)."""
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT content FROM messages WHERE user_id = ? AND session_id = ? ORDER BY id DESC LIMIT ?",
+            (user_id, session_id, n),
+        ).fetchall()
+        if len(rows) < n:
+            rows += conn.execute(
+                "SELECT content FROM archived_messages WHERE user_id = ? AND session_id = ? ORDER BY id DESC LIMIT ?",
+                (user_id, session_id, n - len(rows)),
+            ).fetchall()
+        return [content for (content,) in reversed(rows)]
+
+    def history(self, user_id: str, session_id: str) -> list:
+        """Every message of a session, oldest first (archive + log)."""
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT content FROM archived_messages WHERE user_id = ? AND session_id = ? ORDER BY id",
+            (user_id, session_id),
+        ).fetchall()
+        rows += conn.execute(
+            "SELECT content FROM messages WHERE user_id = ? AND session_id = ? ORDER BY id", (user_id, session_id)
+        ).fetchall()
+        return [content for (content,) in rows]
+
+    def load_state(self, user_id: str, session_id: str, history_limit: int = HISTORY_LIMIT) -> dict:
+        """
+        The session in the shape the agents keep in ADK state:
+        {"vibe": ..., "messages": [last `history_limit` messages], "last_message": ..., **other fields}.
+        """
+        state = {"vibe": None, "messages": [], "last_message": None}
+        for key, value in self._conn().execute(
+            "SELECT key, value FROM session_state WHERE user_id = ? AND session_id = ?", (user_id, session_id)
+        ):
+            state[key] = json.loads(value)
+        state["messages"] = self.recent(user_id, session_id, history_limit)
+        return state
+
+    def has_session(self, user_id: str, session_id: str) -> bool:
+        conn = self._conn()
+        for table in ("messages", "session_state", "archived_messages"):
+            if conn.execute(f"SELECT 1 FROM {table} WHERE user_id = ? AND session_id = ? LIMIT 1",
+                            (user_id, session_id)).fetchone():
+                return True
+        return False
+
+    # --- Migration ---
+
+    def _upgrade_snapshots(self):
+        """Expands the JSON snapshot rows of earlier stores into archived rows, then drops that table."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'snapshots'").fetchone():
+                for user_id, session_id, upto_id, messages, created_at in conn.execute(
+                    "SELECT user_id, session_id, upto_id, messages, created_at FROM snapshots"
+                ).fetchall():
+                    # The snapshotted messages came from distinct log ids up to upto_id, so these ids are free.
+                    messages = json.loads(messages)
+                    first_id = upto_id - len(messages) + 1
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO archived_messages (user_id, session_id, id, role, content, created_at) "
+                        "VALUES (?, ?, ?, 'user', ?, ?)",
+                        [(user_id, session_id, first_id + i, str(m), created_at) for i, m in enumerate(messages)],
+                    )
+                conn.execute("DROP TABLE snapshots")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def migrate_json(self, json_path: str, user_id: str, session_id: str) -> bool:
+        """
+        Imports a legacy chat_state.json into an empty session, then renames the file to
+        `<name>.migrated` so it is never imported twice. Returns True if anything was imported.
+        """
+        if not os.path.exists(json_path):
+            return False
+        with open(json_path, "r") as f:
+            legacy = json.load(f)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Checked inside the write lock, so two processes starting together import only once.
+            if self.has_session(user_id, session_id):
+                conn.execute("ROLLBACK")
+                return False
+            now = time.time()
+            conn.executemany(
+                "INSERT INTO messages (user_id, session_id, role, content, created_at) VALUES (?, ?, 'user', ?, ?)",
+                [(user_id, session_id, str(m), now) for m in legacy.get("messages") or []],
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO session_state (user_id, session_id, key, value) VALUES (?, ?, ?, ?)",
+                [(user_id, session_id, key, json.dumps(value)) for key, value in legacy.items() if key != "messages"],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        os.replace(json_path, f"{json_path}.migrated")
+        log.info(f"🟢 Migrated {json_path} into the session store.")
+        return True
+
+
+# --- Seeding live ADK sessions ---
+# The single-user demo kept its state in ../data/chat_state.json under these ids.
+LEGACY_USER_ID = "user_1"
+LEGACY_SESSION_ID = "session_001"
+LEGACY_STATE_PATH = "../data/chat_state.json"
+
+
+def state_loader(user_id: str, session_id: str):
+    """A zero-argument callable that builds a session's initial ADK state from the store."""
+    def _load() -> dict:
+        store = get_session_store()
+        if (user_id, session_id) == (LEGACY_USER_ID, LEGACY_SESSION_ID):
+            store.migrate_json(LEGACY_STATE_PATH, user_id, session_id)
+        return store.load_state(user_id, session_id)
+    return _load
+
+
+# --- The process-wide store, opened on first use ---
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SessionStore(os.getenv("WISE_SESSION_DB") or DEFAULT_DB_PATH)
+    return _store
@@ -0,0 +1,125 @@
+# agents/single_flight.py
+#
+# Request coalescing for identical in-flight calls. When many sessions ask
+# the same question at once (every welcome screen wanting a spark for the
+# same dataset, a burst of "hello"s through the vibe detector), the first
+# caller for a key makes the call and everyone else arriving while it is in
+# flight waits for that one result instead of sending a duplicate request.
+# Works across threads (Streamlit sessions) and across event loops, because
+# the shared result is a concurrent.futures.Future.
+#
+#   flights = SingleFlight()
+#   text = flights.do(key, lambda: call_the_api(prompt), timeout_s=30, site="vibe")
+#   text = await flights.ado(key, lambda: call_the_api_async(prompt), timeout_s=30)
+
+import asyncio
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+
+class SingleFlightTimeout(TimeoutError):
+    """A follower gave up waiting for the in-flight call it joined."""
+
+
+class SingleFlight:
+    def __init__(self):
+        """
+        Tracks one in-flight call per key. Followers wait up to their own timeout;
+        the leader's result - or its exception - is shared with every follower.
+        """
+        self._calls = {}  # key -> Future of the in-flight leader call
+        self._lock = threading.Lock()
+        self._stats = {"leaders": 0, "coalesced": 0, "timeouts": 0, "shared_errors": 0}
+        self._site_stats = {}
+
+    # --- Public API ---
+
+    def do(self, key: str, fn, timeout_s: float = None, site: str = "default"):
+        """Runs `fn()` for the first caller of `key`; concurrent callers with the same key share its result."""
+        future, leader = self._join(key, site)
+        if leader:
+            return self._lead(key, future, fn)
+        try:
+            return future.result(timeout_s)
+        except FutureTimeout:
+            self._timed_out(key, timeout_s)
+        except Exception:
+            self._shared_error()
+            raise
+
+    async def ado(self, key: str, fn, timeout_s: float = None, site: str = "default"):
+        """Async twin of do: `fn()` returns an awaitable. Followers may be on any event loop."""
+        future, leader = self._join(key, site)
+        if leader:
+            try:
+                result = await fn()
+            except BaseException as e:
+                self._finish(key, future, error=e)
+                raise
+            self._finish(key, future, result=result)
+            return result
+        try:
+            # Shielded, so a follower timing out never cancels the leader's shared future.
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout_s)
+        except asyncio.TimeoutError:
+            self._timed_out(key, timeout_s)
+        except Exception:
+            self._shared_error()
+            raise
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> dict:
+        """Leader calls, coalesced (saved) calls and follower timeouts, overall and per call site."""
+        with self._lock:
+            return {
+                **self._stats,
+                "in_flight": len(self._calls),
+                "sites": {site: dict(counts) for site, counts in self._site_stats.items()},
+            }
+
+    # --- Internals ---
+
+    def _join(self, key: str, site: str):
+        with self._lock:
+            site_counts = self._site_stats.setdefault(site, {"leaders": 0, "coalesced": 0})
+            future = self._calls.get(key)
+            if future is None:
+                future = self._calls[key] = Future()
+                self._stats["leaders"] += 1
+                site_counts["leaders"] += 1
+                return future, True
+            self._stats["coalesced"] += 1
+            site_counts["coalesced"] += 1
+            return future, False
+
+    def _lead(self, key: str, future: Future, fn):
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    def _finish(self, key: str, future: Future, result=None, error: BaseException = None):
+        # Unregister before resolving, so a caller arriving afterwards starts a fresh call
+        # (or, with the response cache in front, finds the answer the leader just stored).
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _timed_out(self, key: str, timeout_s: float):
+        with self._lock:
+            self._stats["timeouts"] += 1
+        raise SingleFlightTimeout(f"Timed out after {timeout_s}s waiting for in-flight request {key[:12]}.")
+
+    def _shared_error(self):
+        with self._lock:
+            self._stats["shared_errors"] += 1
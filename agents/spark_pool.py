@@ -0,0 +1,221 @@
+# agents/spark_pool.py
+#
+# A pool of pre-generated welcome sparks per dataset, so the welcome screen
+# never waits on Gemini. A background producer keeps each pool topped up:
+# when a pool drops below its low-water mark it generates sparks (one at a
+# time, at idle priority, deferring while foreground requests are in flight)
+# until the pool is full again. Entries expire after a TTL or when the
+# dataset changes, and diversity rules keep a pool from filling up with the
+# same kind of insight or repeating sparks that were just served.
+#
+#   pool = get_spark_pool()
+#   pool.ensure("data/wmt_stock_data.csv")        # start filling at startup
+#   spark = pool.pop("data/wmt_stock_data.csv")   # None while the pool is empty
+
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from agents.DaydreamAgent import generate_spark
+from agents.gemini_client import in_flight
+from agents.response_cache import dataset_version
+from agents.telemetry import get_logger
+
+log = get_logger(__name__)
+
+POOL_SIZE = int(os.getenv("WISE_SPARK_POOL_SIZE", "8"))
+LOW_WATER = int(os.getenv("WISE_SPARK_POOL_LOW_WATER", "3"))
+SPARK_TTL_S = float(os.getenv("WISE_SPARK_TTL_S", "3600"))
+# At most this share of a pool may come from one kind of insight (volume peaks, drawdowns, ...).
+MAX_KIND_SHARE = 0.5
+# How many recently served insights a refill avoids, per dataset.
+RECENT_INSIGHTS = 16
+# The producer defers up to this long while foreground Gemini requests are in flight.
+IDLE_MAX_DEFER_S = 5.0
+# After a failed generation the producer backs off before trying that dataset again.
+ERROR_BACKOFF_S = 30.0
+_SAMPLE_ATTEMPTS = 12
+
+
+def _insight_key(insight: dict) -> tuple:
+    return insight.get("kind"), insight.get("date"), insight.get("text")
+
+
+class SparkPool:
+    def __init__(self, generator=generate_spark, pool_size: int = POOL_SIZE, low_water: int = LOW_WATER,
+                 ttl_s: float = SPARK_TTL_S, rng: random.Random = None):
+        """
+        Bounded per-dataset pools of ready-made sparks plus the producer thread that refills them.
+        `generator(data_path, insight)` returns a spark for one insight and raises on failure.
+        """
+        self.generator = generator
+        self.pool_size = pool_size
+        self.low_water = min(low_water, pool_size)
+        self.ttl_s = ttl_s
+        self.max_per_kind = max(1, int(pool_size * MAX_KIND_SHARE))
+        self._rng = rng or random.Random()
+        self._pools = {}   # data_path -> deque of entries, oldest first
+        self._recent = {}  # data_path -> deque of recently served insight keys
+        self._backoff_until = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stats = {"pops": 0, "hits": 0, "misses": 0, "generated": 0, "expired": 0,
+                       "rejected": 0, "errors": 0, "deferred_s": 0.0}
+
+    # --- Public API ---
+
+    def ensure(self, data_path: str):
+        """Registers a dataset and wakes the producer so its pool starts filling."""
+        with self._cond:
+            self._pools.setdefault(data_path, deque())
+            self._recent.setdefault(data_path, deque(maxlen=RECENT_INSIGHTS))
+            self._cond.notify()
+        self._ensure_thread()
+
+    def pop(self, data_path: str):
+        """
+        Returns a fresh spark for the dataset, or None when the pool is empty. Never blocks on
+        Gemini: a pool at or below its low-water mark only wakes the producer.
+        """
+        self.ensure(data_path)
+        version = dataset_version(data_path)
+        with self._cond:
+            pool = self._pools[data_path]
+            self._expire(pool, version)
+            self._stats["pops"] += 1
+            entry = None
+            if pool:
+                # Prefer a different kind of insight from the last one served, for variety.
+                recent = self._recent[data_path]
+                last_kind = recent[-1][0] if recent else None
+                entry = next((e for e in pool if e["insight_key"][0] != last_kind), pool[0])
+                pool.remove(entry)
+                recent.append(entry["insight_key"])
+                self._stats["hits"] += 1
+            else:
+                self._stats["misses"] += 1
+            if len(pool) <= self.low_water:
+                self._cond.notify()
+        return entry["spark"] if entry else None
+
+    def size(self, data_path: str) -> int:
+        with self._cond:
+            return len(self._pools.get(data_path, ()))
+
+    def stats(self) -> dict:
+        """Pops served from the pool vs. empty, sparks generated, expired, rejected and failed, plus pool sizes."""
+        with self._cond:
+            return {**self._stats, "pools": {path: len(pool) for path, pool in self._pools.items()}}
+
+    # --- Producer ---
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._cond:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._produce_forever, name="wise-spark-pool", daemon=True)
+                    self._thread.start()
+
+    def _needs_refill(self, data_path: str, now: float) -> bool:
+        pool = self._pools[data_path]
+        if self._backoff_until.get(data_path, 0.0) > now:
+            return False
+        self._expire(pool, dataset_version(data_path))
+        return len(pool) <= self.low_water
+
+    def _produce_forever(self):
+        try:
+            os.nice(19)  # Linux applies nice per thread: the producer yields the CPU to request threads.
+        except (AttributeError, OSError):
+            pass
+        while True:
+            with self._cond:
+                now = time.time()
+                todo = [path for path in self._pools if self._needs_refill(path, now)]
+                if not todo:
+                    # Wake up now and then to expire stale entries even when nobody pops.
+                    self._cond.wait(timeout=min(60.0, self.ttl_s / 4))
+                    continue
+            for data_path in todo:
+                self._refill(data_path)
+                with self._cond:
+                    if len(self._pools[data_path]) <= self.low_water:
+                        # Out of eligible insights (or a failed call): don't spin, try again later.
+                        self._backoff_until[data_path] = time.time() + ERROR_BACKOFF_S
+
+    def _refill(self, data_path: str):
+        """Generates sparks for one dataset until its pool is full, a generation fails or no insight is eligible."""
+        while True:
+            with self._cond:
+                pool = self._pools[data_path]
+                if len(pool) >= self.pool_size:
+                    return
+                taken = {e["insight_key"] for e in pool} | set(self._recent[data_path])
+                kind_counts = {}
+                for e in pool:
+                    kind_counts[e["insight_key"][0]] = kind_counts.get(e["insight_key"][0], 0) + 1
+            insight = self._pick_insight(data_path, taken, kind_counts)
+            if insight is None:
+                return
+            self._wait_for_idle()
+            version = dataset_version(data_path)
+            try:
+                spark = self.generator(data_path, insight)
+            except Exception as e:
+                log.warning(f"⚠️ SparkPool: Could not generate a spark for {os.path.basename(data_path)} ({e}).")
+                with self._cond:
+                    self._stats["errors"] += 1
+                return
+            with self._cond:
+                pool = self._pools[data_path]
+                if not spark or any(e["spark"] == spark for e in pool):
+                    self._stats["rejected"] += 1
+                    return
+                pool.append({"spark": spark, "insight_key": _insight_key(insight),
+                             "version": version, "created_at": time.time()})
+                self._stats["generated"] += 1
+
+    def _pick_insight(self, data_path: str, taken: set, kind_counts: dict):
+        """Samples an insight that is not pooled or recently served and whose kind is not over its share."""
+        from agents.insight_index import sample_insight  # pulls in pandas; imported on the producer thread
+
+        for _ in range(_SAMPLE_ATTEMPTS):
+            insight = sample_insight(data_path, rng=self._rng)
+            if insight is None:
+                return None
+            key = _insight_key(insight)
+            if key not in taken and kind_counts.get(key[0], 0) < self.max_per_kind:
+                return insight
+            with self._cond:
+                self._stats["rejected"] += 1
+        return None
+
+    def _wait_for_idle(self):
+        """Defers (up to IDLE_MAX_DEFER_S) while the app's own Gemini requests are in flight."""
+        started = time.monotonic()
+        while in_flight() and time.monotonic() - started < IDLE_MAX_DEFER_S:
+            time.sleep(0.1)
+        with self._cond:
+            self._stats["deferred_s"] += time.monotonic() - started
+
+    def _expire(self, pool: deque, version: str):
+        cutoff = time.time() - self.ttl_s
+        for entry in [e for e in pool if e["created_at"] < cutoff or e["version"] != version]:
+            pool.remove(entry)
+            self._stats["expired"] += 1
+
+
+# --- The process-wide pool, shared by every session ---
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_spark_pool() -> SparkPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SparkPool()
+    return _pool
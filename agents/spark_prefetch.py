@@ -0,0 +1,113 @@
+# agents/spark_prefetch.py
+#
+# Speculative prefetch for the sidebar's "Generate a new idea" button. After
+# every assistant turn, main.py asks the session's prefetcher to generate the
+# next contextual spark in the background - for the current vibe, and
+# optionally for the other one too - so pressing the button is usually
+# instant. Prefetches are keyed by conversation position (how many user
+# messages the spark was built from); when the conversation moves on, older
+# prefetches are cancelled if they have not started and discarded otherwise.
+#
+#   prefetcher = SparkPrefetcher()
+#   prefetcher.schedule(messages, vibe)   # after an assistant reply
+#   spark = prefetcher.take(messages, vibe)  # when the button is pressed
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from agents.DaydreamAgent import get_contextual_spark
+from agents.telemetry import get_logger
+
+log = get_logger(__name__)
+
+VIBES = ("scientific", "creative")
+# Also prefetch for the vibe the user is not in, so a lens switch followed by the button is instant too.
+PREFETCH_OTHER_VIBE = os.getenv("WISE_SPARK_PREFETCH_OTHER_VIBE", "0") == "1"
+# How long a button press waits for a prefetch that is still running before giving up on it.
+TAKE_WAIT_S = float(os.getenv("WISE_SPARK_PREFETCH_WAIT_S", "30"))
+
+# Shared by every session in the process; prefetches are one flash call each.
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("WISE_SPARK_PREFETCH_WORKERS", "4")),
+                               thread_name_prefix="wise-prefetch")
+_stats_lock = threading.Lock()
+_stats = {"scheduled": 0, "hits": 0, "waited_hits": 0, "misses": 0, "wasted": 0, "cancelled": 0, "errors": 0}
+
+
+def _count(counter: str, n: int = 1):
+    with _stats_lock:
+        _stats[counter] += n
+
+
+def conversation_position(history: list) -> int:
+    """Contextual sparks are built from the user's messages only, so their count is the position."""
+    return sum(1 for msg in history if msg.get("role") == "user")
+
+
+class SparkPrefetcher:
+    def __init__(self, prefetch_other_vibe: bool = PREFETCH_OTHER_VIBE):
+        """
+        One per session (kept in st.session_state). Holds at most one position's worth of prefetches.
+        """
+        self.prefetch_other_vibe = prefetch_other_vibe
+        self._pending = {}  # (position, vibe) -> Future
+        self._lock = threading.Lock()
+
+    def schedule(self, history: list, vibe: str):
+        """Starts background spark generation for the conversation as it stands, dropping stale prefetches."""
+        position = conversation_position(history)
+        if not position:
+            return
+        vibes = [vibe] + ([v for v in VIBES if v != vibe] if self.prefetch_other_vibe else [])
+        snapshot = [dict(msg) for msg in history if msg.get("role") == "user"]
+        with self._lock:
+            self._discard(keep_position=position)
+            for v in vibes:
+                if (position, v) not in self._pending:
+                    self._pending[(position, v)] = _executor.submit(get_contextual_spark, v, snapshot)
+                    _count("scheduled")
+
+    def take(self, history: list, vibe: str, wait_s: float = TAKE_WAIT_S):
+        """
+        Returns the prefetched spark for this position and vibe, waiting for it if it is still running.
+        Falls back to generating one on the spot when nothing usable was prefetched.
+        """
+        key = (conversation_position(history), vibe)
+        with self._lock:
+            future = self._pending.pop(key, None)
+        if future is not None:
+            ready = future.done()
+            try:
+                spark = future.result(timeout=wait_s)
+            except Exception as e:
+                log.warning(f"⚠️ SparkPrefetcher: Prefetch failed, generating on demand ({e}).")
+                _count("errors")
+            else:
+                _count("hits" if ready else "waited_hits")
+                return spark
+        _count("misses")
+        return get_contextual_spark(vibe=vibe, history=history)
+
+    def discard(self):
+        """Drops every prefetch, e.g. when a new conversation starts."""
+        with self._lock:
+            self._discard(keep_position=None)
+
+    def _discard(self, keep_position):
+        for key in [k for k in self._pending if k[0] != keep_position]:
+            future = self._pending.pop(key)
+            if future.cancel():
+                _count("cancelled")
+            else:
+                # Already running or finished: the call was made, but nobody will read it.
+                _count("wasted")
+
+
+def prefetch_stats() -> dict:
+    """Prefetches scheduled, taken ready or after a wait, misses, and calls wasted or cancelled (all sessions)."""
+    with _stats_lock:
+        stats = dict(_stats)
+    taken = stats["hits"] + stats["waited_hits"]
+    presses = taken + stats["misses"]
+    stats["hit_rate"] = (taken / presses) if presses else None
+    return stats
@@ -0,0 +1,176 @@
+# agents/telemetry.py
+#
+# Structured logging and latency spans for the app, replacing ad-hoc print()
+# calls. Every module logs through a "wise.*" logger whose only handler is a
+# QueueHandler: the request thread just enqueues a record, and a listener
+# thread formats and writes it (to stderr, and as JSON lines to
+# WISE_TELEMETRY_FILE when set). Spans time one stage of a turn - vibe
+# detection, context formatting, the LLM call, chart code execution, figure
+# serialization, rendering - and record model, token counts, cache hits and
+# errors. Durations feed rolling per-stage histograms (p50/p95/p99) that the
+# admin panel in main.py shows and export_snapshot() writes to disk.
+#
+#   log = get_logger(__name__)
+#   with span("llm", model="gemini-1.5-flash", site="vibe") as s:
+#       ...
+#       s["prompt_tokens"] = 120
+#   latency_stats()  # {"llm": {"count": ..., "p50_ms": ..., "p95_ms": ..., "p99_ms": ...}, ...}
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+LOG_LEVEL = os.getenv("WISE_LOG_LEVEL", "INFO").upper()
+# Spans are logged at DEBUG, so stderr stays as quiet as the old prints unless asked otherwise.
+TELEMETRY_FILE = os.getenv("WISE_TELEMETRY_FILE") or None
+WINDOW = int(os.getenv("WISE_TELEMETRY_WINDOW", "1000"))
+_PROJ_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SNAPSHOT_PATH = os.path.join(_PROJ_ROOT, 'data', 'telemetry_snapshot.json')
+
+_ROOT = "wise"
+_setup_lock = threading.Lock()
+_listener = None
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and any span fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        span_fields = getattr(record, "span", None)
+        if span_fields:
+            entry["span"] = span_fields
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _setup():
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        console = logging.StreamHandler(sys.stderr)
+        console.setLevel(LOG_LEVEL)
+        console.setFormatter(logging.Formatter("%(message)s"))
+        handlers = [console]
+        if TELEMETRY_FILE:
+            os.makedirs(os.path.dirname(os.path.abspath(TELEMETRY_FILE)), exist_ok=True)
+            exporter = logging.FileHandler(TELEMETRY_FILE, encoding="utf-8")
+            exporter.setLevel(logging.DEBUG)
+            exporter.setFormatter(JsonLinesFormatter())
+            handlers.append(exporter)
+
+        records = queue.SimpleQueue()
+        root = logging.getLogger(_ROOT)
+        root.setLevel(logging.DEBUG if TELEMETRY_FILE else LOG_LEVEL)
+        root.addHandler(logging.handlers.QueueHandler(records))
+        root.propagate = False
+        _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """A logger under "wise." for a module (pass __name__). Records are handed off to the listener thread."""
+    _setup()
+    short = name.rsplit(".", 1)[-1]
+    return logging.getLogger(f"{_ROOT}.{short}")
+
+
+_log = get_logger(__name__)
+
+
+# --- Rolling latency histograms ---
+
+class StageStats:
+    def __init__(self, window: int = WINDOW):
+        """
+        The last `window` durations of one stage plus running totals of calls, errors, cache hits and tokens.
+        """
+        self.durations = deque(maxlen=window)
+        self.totals = {"count": 0, "errors": 0, "cache_hits": 0, "prompt_tokens": 0, "output_tokens": 0}
+
+    def observe(self, ms: float, fields: dict):
+        self.durations.append(ms)
+        self.totals["count"] += 1
+        if fields.get("error"):
+            self.totals["errors"] += 1
+        if fields.get("cache_hit"):
+            self.totals["cache_hits"] += 1
+        for counter in ("prompt_tokens", "output_tokens"):
+            if isinstance(fields.get(counter), int):
+                self.totals[counter] += fields[counter]
+
+    def summary(self) -> dict:
+        ordered = sorted(self.durations)
+
+        def _pct(p):
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 1)
+
+        return {**self.totals, "p50_ms": _pct(50), "p95_ms": _pct(95), "p99_ms": _pct(99),
+                "max_ms": round(ordered[-1], 1) if ordered else None}
+
+
+_stats_lock = threading.Lock()
+_stages = {}
+
+
+def observe(stage: str, ms: float, **fields):
+    """Adds one duration (and its fields) to a stage's rolling histogram."""
+    with _stats_lock:
+        stats = _stages.get(stage)
+        if stats is None:
+            stats = _stages[stage] = StageStats()
+        stats.observe(ms, fields)
+
+
+@contextmanager
+def span(stage: str, **fields):
+    """
+    Times a stage. Yields a dict the body can add fields to (model, prompt_tokens, output_tokens,
+    cache_hit, ...). Exceptions are recorded as the span's error and re-raised; a generator closed
+    early (GeneratorExit) is not an error.
+    """
+    started = time.perf_counter()
+    try:
+        yield fields
+    except Exception as e:
+        fields["error"] = type(e).__name__
+        raise
+    finally:
+        ms = (time.perf_counter() - started) * 1000
+        observe(stage, ms, **fields)
+        _log.debug("span %s %.1f ms", stage, ms, extra={"span": {"stage": stage, "ms": round(ms, 1), **fields}})
+
+
+def latency_stats() -> dict:
+    """Per-stage counts, errors, cache hits, tokens and rolling p50/p95/p99 (ms)."""
+    with _stats_lock:
+        return {stage: stats.summary() for stage, stats in sorted(_stages.items())}
+
+
+def export_snapshot(path: str = DEFAULT_SNAPSHOT_PATH, extra: dict = None) -> str:
+    """Writes latency_stats() (plus any `extra` sections) to a JSON file and returns its path."""
+    snapshot = {"exported_at": time.time(), "stages": latency_stats(), **(extra or {})}
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+    return path
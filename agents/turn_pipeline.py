@@ -0,0 +1,87 @@
+# agents/turn_pipeline.py
+#
+# Helpers for the chat turn in main.py. The vibe check only feeds a toast
+# suggestion, so it runs on a background thread next to answer generation
+# instead of in front of it, and it gets a deadline so a slow classifier can
+# never hold the answer back. Every stage is timed, and each timing also
+# feeds the rolling "turn.<stage>" latency histograms in agents/telemetry.py.
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from agents.VibeDetectionAgent import detect_vibe
+from agents.telemetry import get_logger, observe
+
+log = get_logger(__name__)
+
+# How long (seconds from the start of the turn) we are willing to wait for the vibe check.
+VIBE_DEADLINE_S = float(os.getenv("WISE_VIBE_DEADLINE_S", "1.5"))
+
+# Shared by every session in the process; vibe checks are short and mostly local.
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("WISE_TURN_WORKERS", "8")), thread_name_prefix="wise-turn")
+
+
+class TurnTimer:
+    def __init__(self):
+        """
+        Collects per-stage wall-clock timings (ms) for one chat turn. Safe to use from worker threads.
+        """
+        self.started_at = time.perf_counter()
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, started_at: float):
+        ms = (time.perf_counter() - started_at) * 1000
+        with self._lock:
+            self.timings[stage] = round(ms, 1)
+        observe(f"turn.{stage}", ms)
+
+    def elapsed(self) -> float:
+        """Seconds since the turn started."""
+        return time.perf_counter() - self.started_at
+
+    def finish(self) -> dict:
+        self.record("turn_total", self.started_at)
+        with self._lock:
+            return dict(self.timings)
+
+
+def start_vibe_check(message: str, timer: TurnTimer):
+    """Submits detect_vibe to the shared pool and returns its Future."""
+    def _run():
+        started_at = time.perf_counter()
+        try:
+            return detect_vibe(message)
+        finally:
+            timer.record("vibe_detection", started_at)
+    return _executor.submit(_run)
+
+
+def collect_vibe(future, timer: TurnTimer, deadline_s: float = VIBE_DEADLINE_S):
+    """
+    Returns the detected vibe if it is ready by the turn's deadline, else None.
+    A late check keeps running in the background; its answer still lands in the response cache.
+    A failed check is logged and also returns None: the suggestion is optional, the turn is not.
+    """
+    remaining = max(0.0, deadline_s - timer.elapsed())
+    try:
+        return future.result(timeout=remaining)
+    except FutureTimeout:
+        # Not the builtin TimeoutError before Python 3.11.
+        log.warning("⏱️ TurnPipeline: Vibe check missed its %.1fs deadline; skipping the suggestion.", deadline_s)
+        return None
+    except Exception:
+        log.exception("⚠️ TurnPipeline: Vibe check failed; skipping the suggestion.")
+        return None
+
+
+def timed_stream(chunks, timer: TurnTimer):
+    """Wraps a chunk generator to record time to first token, measured from the start of the turn."""
+    first = True
+    for chunk in chunks:
+        if first:
+            timer.record("first_token", timer.started_at)
+            first = False
+        yield chunk
@@ -0,0 +1,129 @@
+# agents/vibe_classifier.py
+#
+# A tiny, dependency-free vibe classifier that sits in front of the Gemini call
+# in detect_vibe. It is a multinomial naive Bayes model over hashed word
+# n-grams, trained at first use from the bundled corpus (agents/vibe_corpus.json,
+# which includes the labelled examples in the detect_vibe prompt). Classifying a
+# message takes microseconds and never touches the network. Its confidence is
+# calibrated so that messages it cannot judge (unknown words, weak evidence)
+# fall below the threshold and go to Gemini.
+
+import json
+import math
+import os
+import re
+import threading
+import zlib
+
+VIBE_LABELS = ("scientific", "creative", "none")
+
+_CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vibe_corpus.json")
+_NUM_BUCKETS = 1 << 18
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+# Calibration, checked with 5-fold cross-validation (scripts/evaluate_vibe_classifier.py --offline).
+# Unigrams, bigrams and the leading word overlap, so naive Bayes counts the same evidence several
+# times and its raw posterior is far too sharp; log-likelihoods are divided by TEMPERATURE.
+TEMPERATURE = 2.0
+# The confidence is then scaled by (share of the message's words seen in training) ** UNKNOWN_WORD_POWER,
+# so a message of unknown words has confidence 0 and always goes to Gemini.
+UNKNOWN_WORD_POWER = 0.25
+# The confidence detect_vibe needs to skip Gemini (WISE_VIBE_THRESHOLD overrides it). On held-out data
+# (5-fold CV of the bundled corpus) 0.8 answers about two thirds of messages locally at ~98% accuracy;
+# 0.9 is ~99% accurate but answers under half. Held-out figures understate coverage: the shipped model
+# is trained on every fold. Re-run the sweep after growing the corpus.
+DEFAULT_THRESHOLD = 0.8
+
+
+def _word_hash(token: str) -> int:
+    return zlib.crc32(f"w:{token}".encode("utf-8")) % _NUM_BUCKETS
+
+
+def _features(message: str) -> list:
+    """Hashed unigram, bigram, leading-word and length features for one message."""
+    tokens = _TOKEN_RE.findall(message.lower())
+    feats = [f"w:{tok}" for tok in tokens]
+    feats += [f"b:{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    if tokens:
+        feats.append(f"first:{tokens[0]}")
+    feats.append(f"len:{min(len(tokens), 6)}")
+    if message.rstrip().endswith("?"):
+        feats.append("q:?")
+    return [zlib.crc32(f.encode("utf-8")) % _NUM_BUCKETS for f in feats]
+
+
+class VibeClassifier:
+    def __init__(self, alpha: float = 0.5, temperature: float = TEMPERATURE,
+                 unknown_word_power: float = UNKNOWN_WORD_POWER):
+        """
+        Multinomial naive Bayes over hashed n-gram features, with the calibration above.
+        """
+        self.alpha = alpha
+        self.temperature = temperature
+        self.unknown_word_power = unknown_word_power
+        self._counts = {label: {} for label in VIBE_LABELS}
+        self._totals = {label: 0 for label in VIBE_LABELS}
+        self._docs = {label: 0 for label in VIBE_LABELS}
+        self._vocab = set()
+        self._words = set()
+
+    def fit(self, examples):
+        for text, label in examples:
+            if label not in self._counts:
+                continue
+            self._docs[label] += 1
+            counts = self._counts[label]
+            for h in _features(text):
+                counts[h] = counts.get(h, 0) + 1
+                self._totals[label] += 1
+                self._vocab.add(h)
+            self._words.update(_word_hash(tok) for tok in _TOKEN_RE.findall(text.lower()))
+        return self
+
+    def predict(self, message: str) -> tuple:
+        """
+        Returns (label, confidence): the tempered posterior of the winning label, scaled down by the
+        share of the message's words the model has never seen.
+        """
+        if not message or not message.strip():
+            return "none", 1.0
+        tokens = _TOKEN_RE.findall(message.lower())
+        known = sum(1 for tok in tokens if _word_hash(tok) in self._words) / len(tokens) if tokens else 0.0
+        feats = _features(message)
+        num_docs = sum(self._docs.values())
+        vocab_size = len(self._vocab) or 1
+        scores = {}
+        for label in VIBE_LABELS:
+            counts = self._counts[label]
+            denom = math.log(self._totals[label] + self.alpha * vocab_size)
+            log_likelihood = sum(math.log(counts.get(h, 0) + self.alpha) - denom for h in feats)
+            scores[label] = math.log((self._docs[label] + 1) / (num_docs + len(VIBE_LABELS))) + log_likelihood / self.temperature
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        norm = sum(math.exp(s - top) for s in scores.values())
+        return best, (known ** self.unknown_word_power) / norm
+
+
+def load_corpus(path: str = _CORPUS_PATH) -> list:
+    """Reads the bundled labelled corpus as a list of (text, label) pairs."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [(row["text"], row["label"]) for row in json.load(f)]
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_classifier() -> VibeClassifier:
+    """The process-wide classifier, trained once on first use."""
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = VibeClassifier().fit(load_corpus())
+    return _classifier
+
+
+def classify_vibe(message: str) -> tuple:
+    """Classifies a message locally. Returns (label, confidence)."""
+    return get_classifier().predict(message)
@@ -3,37 +3,36 @@
 # ==============================================================================
 import streamlit as st
 import time
-import plotly.io as pio
 from dotenv import load_dotenv
 import os
-import google.generativeai as genai
-import json
 
 # --- AGENT IMPORTS ---
+# Only light modules load here. google.generativeai, pandas and plotly are imported on first use,
+# and the ConversationalAgent (with its chart stack) only when a chat starts - see get_conversational_agent.
 from agents.VibeDetectionAgent import detect_vibe
-from agents.DaydreamAgent import get_daydream_spark
-from agents.ConversationalAgent import ConversationalAgent
+from agents.DaydreamAgent import FALLBACK_SPARK
+from agents.spark_pool import get_spark_pool
+from agents.spark_prefetch import SparkPrefetcher
+from agents.figure_cache import get_figure
+from agents.gemini_client import BACKEND, warm_up
+from agents.turn_pipeline import TurnTimer, start_vibe_check, collect_vibe, timed_stream
+from agents.telemetry import export_snapshot, get_logger, latency_stats, span
+
+log = get_logger(__name__)
+# Set WISE_ADMIN=1 to show per-stage latency histograms and the telemetry exporter in the sidebar.
+ADMIN_PANEL = os.getenv("WISE_ADMIN", "0") == "1"
 
 # --- CENTRALIZED API KEY CONFIGURATION ---
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
+if not GOOGLE_API_KEY and BACKEND != "fake":
     st.error("FATAL ERROR: GOOGLE_API_KEY not found in .env file!")
     st.stop()
-genai.configure(api_key=GOOGLE_API_KEY)
-
-# --- HELPER FUNCTION FOR ON-DEMAND SPARKS ---
-def get_contextual_spark(vibe: str, history: list):
-    print(f"✨ Generating a new contextual spark with vibe: {vibe}...")
-    conversation_context = "\n".join([f"{msg['content']}" for msg in history[-4:] if msg['role'] == 'user'])
-    if vibe == "scientific": vibe_instruction = "Your response must be analytical, data-focused, or scientific. Ask a clarifying question or propose a logical next step."
-    else: vibe_instruction = "Your response must be imaginative, metaphorical, or creative. Ask a 'what if' question or propose a lateral thinking idea."
-    prompt = f"""You are an AI assistant. A user is in the middle of a conversation. Your task is to generate a single, thought-provoking question or 'what if' statement that is relevant to the ongoing conversation, in a specific tone.
-    CURRENT CONVERSATION CONTEXT:\n---\n{conversation_context}\n---\n
-    INSTRUCTIONS:\n- {vibe_instruction}\n- Your response must be related to the conversation context.\n- Do NOT act like you are interrupting. Just provide the question/statement directly.\n- Be concise."""
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    response = model.generate_content(prompt)
-    return response.text.strip()
+# gemini_client configures the SDK from GOOGLE_API_KEY; importing and configuring it happens off the first render.
+warm_up(background=True)
+DATA_PATH = "data/wmt_stock_data.csv"
+# Welcome sparks are pre-generated in the background; start filling the pool before anyone needs one.
+get_spark_pool().ensure(DATA_PATH)
 
 # --- PAGE CONFIG & PERSONA SETUP ---
 st.set_page_config(page_title="Wise", page_icon="🦉", layout="wide")
@@ -46,7 +45,15 @@ PERSONA_CONFIG = {
 if "stage" not in st.session_state:
     st.session_state.stage = "onboarding"; st.session_state.messages = []; st.session_state.current_vibe = "scientific"
     st.session_state.user_profile = {"name": "Dave", "status": "new_user"}; st.session_state.dream_inbox = []
-    st.session_state.conversational_agent = ConversationalAgent(data_path="data/wmt_stock_data.csv")
+    st.session_state.spark_prefetcher = SparkPrefetcher()
+
+
+def get_conversational_agent():
+    """Built on first use rather than at session start: it loads the dataset and warms the chart workers."""
+    if "conversational_agent" not in st.session_state:
+        from agents.ConversationalAgent import ConversationalAgent
+        st.session_state.conversational_agent = ConversationalAgent(data_path=DATA_PATH)
+    return st.session_state.conversational_agent
 
 # --- UPDATED CSS FOR POLISHED LOOK & TEXT VISIBILITY ---
 st.markdown("""
@@ -100,10 +107,10 @@ if st.session_state.stage in ["onboarding", "welcome", "set_vibe"]:
         elif st.session_state.stage == "welcome":
             st.header(f"Welcome back, {st.session_state.user_profile['name']}.")
             if 'current_spark' not in st.session_state:
-                with st.spinner("Finding a new spark of inspiration..."):
-                    spark_idea = get_daydream_spark(data_path="data/wmt_stock_data.csv")
-                    st.session_state.current_spark = spark_idea
-                    if spark_idea not in st.session_state.dream_inbox: st.session_state.dream_inbox.append(spark_idea)
+                # Pop a ready-made spark; never wait on the LLM here. An empty pool shows the static welcome.
+                spark_idea = get_spark_pool().pop(DATA_PATH)
+                st.session_state.current_spark = spark_idea or FALLBACK_SPARK
+                if spark_idea and spark_idea not in st.session_state.dream_inbox: st.session_state.dream_inbox.append(spark_idea)
             st.info(f"💡 {st.session_state.current_spark}")
             btn_col1, btn_col2 = st.columns(2)
             if btn_col1.button("Explore this Idea", use_container_width=True):
@@ -127,6 +134,7 @@ elif st.session_state.stage == "chat":
         st.image("wise_logo.png.jpeg", width=80)
         if st.button("➕ New Conversation", use_container_width=True):
             if 'current_spark' in st.session_state: del st.session_state.current_spark
+            st.session_state.spark_prefetcher.discard()
             st.session_state.stage = "welcome"; st.session_state.messages = []; st.rerun()
         st.header("Cognitive Lens")
         for vibe_key, vibe_info in PERSONA_CONFIG.items():
@@ -136,7 +144,8 @@ elif st.session_state.stage == "chat":
         st.divider(); st.header("On-Demand Spark")
         if st.button("💡 Generate a new idea", use_container_width=True):
             with st.spinner("Finding a relevant spark..."):
-                spark_reply = get_contextual_spark(vibe=st.session_state.current_vibe, history=st.session_state.messages)
+                # Usually already generated in the background after the last reply.
+                spark_reply = st.session_state.spark_prefetcher.take(st.session_state.messages, st.session_state.current_vibe)
                 st.session_state.messages.append({"role": "assistant", "content": spark_reply, "avatar": "💡"})
                 if spark_reply not in st.session_state.dream_inbox: st.session_state.dream_inbox.append(spark_reply)
                 st.rerun()
@@ -144,21 +153,47 @@ elif st.session_state.stage == "chat":
         if not st.session_state.dream_inbox: st.caption("Your generated sparks will appear here.")
         else:
             for spark in reversed(st.session_state.dream_inbox): st.info(spark, icon="💡")
+        if ADMIN_PANEL:
+            st.divider(); st.header("Telemetry")
+            stage_stats = latency_stats()
+            if not stage_stats: st.caption("No spans recorded yet.")
+            else:
+                st.dataframe(
+                    [{"stage": stage, **{k: stats[k] for k in ("count", "p50_ms", "p95_ms", "p99_ms", "errors", "cache_hits", "prompt_tokens", "output_tokens")}}
+                     for stage, stats in stage_stats.items()],
+                    hide_index=True, use_container_width=True,
+                )
+            if st.button("💾 Export snapshot", use_container_width=True):
+                from agents.gemini_client import coalescing_stats, limiter_stats, stats as gemini_stats
+                from agents.spark_prefetch import prefetch_stats
+                snapshot_path = export_snapshot(extra={
+                    "gemini": gemini_stats(), "rate_limiter": limiter_stats(), "coalescing": coalescing_stats(),
+                    "spark_pool": get_spark_pool().stats(), "spark_prefetch": prefetch_stats(),
+                    "turn_timings": st.session_state.get("turn_timings", []),
+                })
+                st.caption(f"Wrote {snapshot_path}")
 
     main_col1, main_col2, main_col3 = st.columns([1, 4, 1])
     with main_col2:
         st.markdown(f"### Current Vibe: <span style='color: {current_persona['color']};'>{current_persona['label']}</span>", unsafe_allow_html=True); st.divider()
         
         # --- GRAPH FIX: Loop now renders from the full response object ---
-        for msg in st.session_state.messages:
+        for msg_index, msg in enumerate(st.session_state.messages):
             avatar = current_persona.get('avatar') if msg["role"] == "assistant" else "🧑‍💻"
             if "avatar" in msg: avatar = msg["avatar"]
             with st.chat_message(msg["role"], avatar=avatar):
                 # Check if the message is a graph response
                 if msg.get("type") == "plotly":
                     try:
-                        fig = pio.from_json(msg["content"])
-                        st.plotly_chart(fig, use_container_width=True)
+                        figure_json, figure_key = msg["content"], msg.get("figure_id")
+                        # Charts are stored downsampled; the full-resolution version is a cached re-query away.
+                        if msg.get("downsampled") and st.toggle("🔍 Full resolution", key=f"full_res_{msg_index}"):
+                            full_response = get_conversational_agent().full_resolution_chart(msg["query"])
+                            if full_response["type"] == "plotly": figure_json, figure_key = full_response["content"], None
+                        # Parsed figures are memoized, so a rerun does not re-parse every chart in the history.
+                        with span("render", kind="plotly"):
+                            fig = get_figure(figure_json, key=figure_key)
+                            st.plotly_chart(fig, use_container_width=True)
                     except Exception as e:
                         st.error(f"Error rendering chart from history: {e}")
                 else:
@@ -174,23 +209,42 @@ elif st.session_state.stage == "chat":
         last_message_obj = st.session_state.messages[-1]
         last_message_content = last_message_obj.get("content", "")
         
-        detected_vibe_in_chat = detect_vibe(last_message_content)
-        if detected_vibe_in_chat != 'none' and detected_vibe_in_chat != st.session_state.current_vibe:
-            other_vibe_label = PERSONA_CONFIG[detected_vibe_in_chat]['label']
-            st.toast(f"Your message seems {detected_vibe_in_chat}. Consider switching to the {other_vibe_label} lens!", icon="🤔")
+        # --- CONCURRENT TURN: the vibe check runs beside the answer, never in front of it ---
+        turn_timer = TurnTimer()
+        vibe_future = start_vibe_check(last_message_content, turn_timer)
             
         with main_col2.chat_message("assistant", avatar=current_persona["avatar"]):
+            answer_started = time.perf_counter()
             with st.spinner("Wise is thinking..."):
-                agent = st.session_state.conversational_agent; agent.lens = st.session_state.current_vibe
+                agent = get_conversational_agent(); agent.lens = st.session_state.current_vibe
                 history = st.session_state.messages[:-1]
                 
-                # The agent returns a full response dictionary
-                response_dict = agent.chat(last_message_content, history=history)
+                # The agent returns a full response dictionary; text answers arrive as a token stream
+                response_dict = agent.chat(last_message_content, history=history, stream=True)
+
+            # --- STREAMING: render tokens as they arrive, then keep the assembled text ---
+            if response_dict["type"] == "stream":
+                with span("render", kind="stream"):
+                    response_dict = {"type": "text", "content": st.write_stream(timed_stream(response_dict["content"], turn_timer)).strip()}
+            turn_timer.record("answer", answer_started)
                 
-                # --- GRAPH FIX: Append the entire response dict for AI messages ---
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "avatar": current_persona["avatar"],
-                    **response_dict  # Unpack the response dict (e.g., 'type' and 'content')
-                })
+            # --- GRAPH FIX: Append the entire response dict for AI messages ---
+            st.session_state.messages.append({
+                "role": "assistant",
+                "avatar": current_persona["avatar"],
+                **response_dict  # Unpack the response dict (e.g., 'type' and 'content')
+            })
+
+        # Speculatively generate the next on-demand spark while the user reads the reply.
+        st.session_state.spark_prefetcher.schedule(st.session_state.messages, st.session_state.current_vibe)
+
+        detected_vibe_in_chat = collect_vibe(vibe_future, turn_timer)
+        if detected_vibe_in_chat and detected_vibe_in_chat != 'none' and detected_vibe_in_chat != st.session_state.current_vibe:
+            other_vibe_label = PERSONA_CONFIG[detected_vibe_in_chat]['label']
+            st.toast(f"Your message seems {detected_vibe_in_chat}. Consider switching to the {other_vibe_label} lens!", icon="🤔")
+
+        turn_timings = turn_timer.finish()
+        log.debug("⏱️ Turn timings (ms): %s", turn_timings)
+        st.session_state.setdefault("turn_timings", []).append(turn_timings)
+        del st.session_state.turn_timings[:-50]
         st.rerun()
\ No newline at end of file
@@ -0,0 +1,84 @@
+# scripts/bench_chart_rerun.py
+#
+# Measures how long the chat history render loop spends turning stored chart
+# JSON back into figures on each st.rerun(), as the number of charts in the
+# conversation grows - once with pio.from_json on every chart (the old loop)
+# and once through the shared figure cache.
+#
+#   python scripts/bench_chart_rerun.py
+#   python scripts/bench_chart_rerun.py --charts 0 4 12 24 --reruns 10 --full-resolution --json results.json
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(script_dir, '..'))
+
+from agents.figure_cache import FigureCache, figure_id
+from agents.figure_compaction import compact_figure
+
+
+def _history_charts(count: int, rows: int, compact: bool) -> list:
+    """Builds `count` distinct chart messages over a synthetic daily price series."""
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range("1970-10-01", periods=rows)
+    messages = []
+    for i in range(count):
+        close = np.exp(np.cumsum(rng.normal(0.0003, 0.015, rows))) * 10
+        df = pd.DataFrame({"Date": dates, "Close": close.astype(np.float32)})
+        fig = px.line(df, x="Date", y="Close", title=f"Chart {i}")
+        content = (compact_figure(fig) if compact else fig).to_json()
+        messages.append({"role": "assistant", "type": "plotly", "content": content, "figure_id": figure_id(content)})
+    return messages
+
+
+def _rerun_ms(messages: list, parse) -> float:
+    started = time.perf_counter()
+    for msg in messages:
+        parse(msg)
+    return (time.perf_counter() - started) * 1000
+
+
+def run(chart_counts: list, reruns: int, rows: int, compact: bool) -> list:
+    results = []
+    for count in chart_counts:
+        messages = _history_charts(count, rows, compact)
+        cache = FigureCache(max_entries=max(64, count))
+        uncached = [_rerun_ms(messages, lambda m: pio.from_json(m["content"])) for _ in range(reruns)]
+        cached = [_rerun_ms(messages, lambda m: cache.get(m["content"], key=m["figure_id"])) for _ in range(reruns)]
+        results.append({
+            "charts": count,
+            "payload_kb": round(sum(len(m["content"]) for m in messages) / 1024, 1),
+            "uncached_ms": round(statistics.median(uncached), 2),
+            # The first rerun parses every chart once; steady state is what every later rerun pays.
+            "cached_first_ms": round(cached[0], 2),
+            "cached_ms": round(statistics.median(cached[1:] or cached), 2),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark chart re-parsing in the chat rerun loop.")
+    parser.add_argument("--charts", type=int, nargs="+", default=[0, 1, 2, 4, 8, 12, 24])
+    parser.add_argument("--reruns", type=int, default=5)
+    parser.add_argument("--rows", type=int, default=14000, help="Points per chart before downsampling.")
+    parser.add_argument("--full-resolution", action="store_true", help="Store charts without downsampling.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    results = run(args.charts, args.reruns, args.rows, compact=not args.full_resolution)
+    print(f"{'charts':>6} {'payload KB':>11} {'uncached ms':>12} {'cached 1st ms':>14} {'cached ms':>10}")
+    for r in results:
+        print(f"{r['charts']:>6} {r['payload_kb']:>11} {r['uncached_ms']:>12} {r['cached_first_ms']:>14} {r['cached_ms']:>10}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
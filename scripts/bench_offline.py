@@ -0,0 +1,346 @@
+# scripts/bench_offline.py
+#
+# Measures the app's own overhead with no network access: every Gemini call
+# is served by the deterministic fake backend in agents/fake_gemini.py, with
+# a configurable latency distribution and error rate. Scenarios:
+#   * vibe     - detect_vibe latency one message at a time (as routed, and
+#                forced through the Gemini fallback), and throughput from a
+#                thread pool;
+#   * chat     - ConversationalAgent.chat streaming turns at several history
+#                lengths (time to first chunk and whole turn);
+#   * chart    - the chart pipeline: LLM code generation, execution in the
+#                sandbox (which serializes the figure), the query engine with
+#                an in-process to_json, and a whole chat turn on the code path;
+#   * daydream - get_daydream_spark, from insight sampling to the spark text.
+# Results are JSON. With --baseline, p50s that got slower than the baseline
+# by more than --tolerance are reported and the script exits 1.
+#
+#   python scripts/bench_offline.py
+#   python scripts/bench_offline.py --latency lognormal:300,0.4 --error-rate 0.02 --json offline.json
+#   python scripts/bench_offline.py --scenarios vibe chat --baseline offline.json --tolerance 0.25
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(script_dir, '..'))
+
+# Measure the app, not the quota: unless told otherwise, the rate limiter lets every fake call through.
+os.environ.setdefault("WISE_GEMINI_RATE_LIMITS", ",".join(
+    f"{model}=1000000/1000000000" for model in ("gemini-1.5-flash", "gemini-1.5-pro", "gemini-2.0-flash")))
+os.environ["WISE_CACHE_DIR"] = ""  # memory-only response cache, so runs never see each other's answers
+os.environ.setdefault("WISE_SPARK_POOL_SIZE", "0")
+os.environ.setdefault("WISE_LOG_LEVEL", "WARNING")
+
+from agents.DaydreamAgent import FALLBACK_SPARK, get_daydream_spark
+from agents.VibeDetectionAgent import detect_vibe
+from agents.chart_sandbox import get_chart_sandbox
+from agents.fake_gemini import FakeBackend
+from agents.figure_compaction import compact_figure
+from agents.gemini_client import use_model_factory
+from agents.query_engine import get_query_engine, normalize_spec
+from agents.response_cache import response_cache
+from agents.telemetry import latency_stats
+
+SCENARIOS = ("vibe", "chat", "chart", "daydream")
+
+VIBE_MESSAGES = [
+    "Can you explain how the closing price is calculated?",
+    "What if the stock market were a living ocean?",
+    "hey there",
+    "Write a short poem about trading volume",
+    "What drove the drop in volume last spring?",
+    "tell me more",
+    "Imagine Walmart's stores as planets in a galaxy",
+    "How volatile was the stock compared to the year before?",
+    "that one",
+    "Let's brainstorm names for a new analytics feature",
+]
+CHAT_MESSAGES = [
+    "What drove the change in the closing price during period {i}?",
+    "How does trading volume relate to the big moves in window {i}?",
+    "Can you compare volatility across quarters, take {i}?",
+]
+ASSISTANT_REPLY = ("In period {i} the closing price drifted higher while volume stayed close to its average. "
+                   "The larger moves lined up with earnings dates, so it is worth comparing those windows "
+                   "against quieter stretches before reading too much into any single day.")
+# Chart requests (by chat()'s keywords) that the local parser cannot read, so they take the LLM path.
+CHART_REQUESTS = [
+    "Chart something interesting about the stock",
+    "Visualize the relationship between activity and swings",
+    "Graph a view that tells the story of this company",
+]
+
+
+def _summary(samples_ms: list) -> dict:
+    if not samples_ms:
+        return {"count": 0}
+    ordered = sorted(samples_ms)
+
+    def _pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 2)
+
+    return {"count": len(ordered), "mean_ms": round(statistics.fmean(ordered), 2),
+            "p50_ms": _pct(50), "p95_ms": _pct(95), "p99_ms": _pct(99)}
+
+
+def _timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def synthetic_dataset(directory: str, rows: int = 2500, seed: int = 0) -> str:
+    """Writes a WMT-shaped daily price CSV (the columns process_dataset.py produces) and returns its path."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2015-01-02", periods=rows)
+    close = np.exp(np.cumsum(rng.normal(0.0003, 0.015, rows))) * 60
+    spread = np.abs(rng.normal(0, 0.01, rows)) * close
+    df = pd.DataFrame({
+        "Date": dates.strftime("%Y-%m-%d"),
+        "Open": close + rng.normal(0, 0.005, rows) * close,
+        "High": close + spread,
+        "Low": close - spread,
+        "Close": close,
+        "Adj Close": close * 0.97,
+        "Volume": rng.lognormal(16, 0.4, rows).astype(np.int64),
+        "Year": dates.year,
+        "Month": dates.month,
+    })
+    path = os.path.join(directory, "wmt_stock_data.csv")
+    df.to_csv(path, index=False)
+    return path
+
+
+class Bench:
+    def __init__(self, data_path: str, latency: str, error_rate: float, seed: int):
+        """Runs scenarios against `data_path`, each with a fresh fake backend and an empty response cache."""
+        self.data_path = data_path
+        self.latency, self.error_rate, self.seed = latency, error_rate, seed
+        self.backend = None
+
+    def _install(self, rules=None) -> FakeBackend:
+        self.backend = FakeBackend(rules=rules, latency=self.latency, error_rate=self.error_rate, seed=self.seed)
+        use_model_factory(self.backend.model)
+        response_cache.clear()
+        return self.backend
+
+    def vibe(self, iterations: int, concurrency: int) -> dict:
+        backend = self._install()
+        detect_vibe(VIBE_MESSAGES[0] + " (warm-up)")
+        calls_before = backend.stats()["calls"]
+        messages = [f"{VIBE_MESSAGES[i % len(VIBE_MESSAGES)]} ({i})" for i in range(iterations)]
+        latencies = [_timed(detect_vibe, message)[1] for message in messages]
+        llm_calls = backend.stats()["calls"] - calls_before
+        # The same messages with the local classifier bypassed: the cost of the Gemini fallback path.
+        forced = [_timed(detect_vibe, f"{message} (llm)", threshold=float("inf"))[1] for message in messages]
+
+        messages = [f"{VIBE_MESSAGES[i % len(VIBE_MESSAGES)]} [{i}]" for i in range(iterations)]
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            _, wall_ms = _timed(lambda: list(pool.map(detect_vibe, messages)))
+        return {
+            "sequential": _summary(latencies),
+            "llm_path": _summary(forced),
+            "llm_share": round(llm_calls / iterations, 3) if iterations else None,
+            "concurrency": concurrency,
+            "throughput_msgs_per_s": round(iterations / (wall_ms / 1000), 1) if wall_ms else None,
+        }
+
+    def chat(self, history_lengths: list, iterations: int) -> dict:
+        from agents.ConversationalAgent import ConversationalAgent
+
+        results = {}
+        for length in history_lengths:
+            backend = self._install()
+            agent = ConversationalAgent(data_path=self.data_path)
+            history = [
+                {"role": "user", "content": CHAT_MESSAGES[i % len(CHAT_MESSAGES)].format(i=i)} if i % 2 == 0
+                else {"role": "assistant", "content": ASSISTANT_REPLY.format(i=i)}
+                for i in range(length)
+            ]
+            turns, first_chunks, errors = [], [], 0
+            for i in range(iterations + 1):
+                message = CHAT_MESSAGES[i % len(CHAT_MESSAGES)].format(i=f"{length}.{i}")
+                started = time.perf_counter()
+                first_chunk_ms = None
+                try:
+                    response = agent.chat(message, history, stream=True)
+                    for _ in response["content"] if response["type"] == "stream" else [response["content"]]:
+                        if first_chunk_ms is None:
+                            first_chunk_ms = (time.perf_counter() - started) * 1000
+                except Exception:
+                    errors += 1
+                    continue
+                if i == 0:
+                    continue  # warm-up turn
+                turns.append((time.perf_counter() - started) * 1000)
+                first_chunks.append(first_chunk_ms)
+            stats = backend.stats()
+            results[f"history_{length}"] = {
+                "turn": _summary(turns),
+                "first_chunk": _summary([ms for ms in first_chunks if ms is not None]),
+                "errors": errors,
+                "avg_prompt_tokens": round(stats["prompt_tokens"] / stats["calls"]) if stats["calls"] else None,
+            }
+        return results
+
+    def chart(self, iterations: int) -> dict:
+        from agents.ConversationalAgent import ConversationalAgent
+
+        # Declines every query spec, so chat() takes the generated-code path.
+        self._install(rules=[(r"JSON query spec", '{"unsupported": true}')])
+        agent = ConversationalAgent(data_path=self.data_path)
+        sandbox = get_chart_sandbox(self.data_path)
+        engine = get_query_engine(self.data_path)
+        start_dates = pd.to_datetime(agent.df["Date"]).sort_values().reset_index(drop=True)
+        codegen, sandbox_exec, query_exec, to_json, end_to_end, errors = [], [], [], [], [], 0
+        for i in range(iterations + 1):
+            request = f"{CHART_REQUESTS[i % len(CHART_REQUESTS)]} (take {i})"
+            try:
+                code, codegen_ms = _timed(agent._generate_chart_code, request)
+                _, exec_ms = _timed(sandbox.execute, code, self.data_path, compact=True)
+                # A distinct date range each time, so the query engine's result cache never answers.
+                spec = normalize_spec({"chart": "line", "y": ["Close"], "title": request,
+                                       "date_range": {"start": str(start_dates[i % len(start_dates)].date())}},
+                                      agent.df.columns)
+                fig, query_ms = _timed(engine.figure, spec)
+                _, json_ms = _timed(lambda: compact_figure(fig).to_json())
+                response, turn_ms = _timed(agent.chat, f"{request}, once more", [])
+            except Exception:
+                errors += 1
+                continue
+            if response["type"] != "plotly":
+                errors += 1
+                continue
+            if i == 0:
+                continue  # warm-up: first sandbox task, first query
+            codegen.append(codegen_ms)
+            sandbox_exec.append(exec_ms)
+            query_exec.append(query_ms)
+            to_json.append(json_ms)
+            end_to_end.append(turn_ms)
+        return {
+            "codegen": _summary(codegen),
+            "sandbox_exec": _summary(sandbox_exec),
+            "query_exec": _summary(query_exec),
+            "to_json": _summary(to_json),
+            "end_to_end": _summary(end_to_end),
+            "errors": errors,
+        }
+
+    def daydream(self, iterations: int) -> dict:
+        self._install()
+        get_daydream_spark(self.data_path)  # warm-up: builds the insight index
+        latencies, fallbacks = [], 0
+        for _ in range(iterations):
+            response_cache.clear()  # a spark repeats its insight's prompt; measure the miss path
+            spark, ms = _timed(get_daydream_spark, self.data_path)
+            latencies.append(ms)
+            fallbacks += spark == FALLBACK_SPARK
+        return {"spark": _summary(latencies), "fallbacks": fallbacks}
+
+
+def run(args) -> dict:
+    workdir = None
+    data_path = args.data
+    if data_path is None:
+        workdir = tempfile.TemporaryDirectory(prefix="wise-bench-")
+        data_path = synthetic_dataset(workdir.name)
+    bench = Bench(data_path, args.latency, args.error_rate, args.seed)
+    results = {
+        "config": {"latency": args.latency, "error_rate": args.error_rate, "seed": args.seed,
+                   "iterations": args.iterations, "data": args.data or "synthetic",
+                   "python": sys.version.split()[0]},
+        "scenarios": {},
+    }
+    try:
+        for name in args.scenarios:
+            started = time.perf_counter()
+            if name == "vibe":
+                result = bench.vibe(args.iterations, args.concurrency)
+            elif name == "chat":
+                result = bench.chat(args.history_lengths, args.iterations)
+            elif name == "chart":
+                result = bench.chart(args.iterations)
+            else:
+                result = bench.daydream(args.iterations)
+            result["fake_backend"] = bench.backend.stats()
+            result["wall_s"] = round(time.perf_counter() - started, 2)
+            results["scenarios"][name] = result
+    finally:
+        if {"chat", "chart"} & set(args.scenarios):
+            get_chart_sandbox().shutdown()
+        if workdir is not None:
+            workdir.cleanup()
+    # Per-stage spans (vibe detection, LLM call, code exec, ...) across the whole run.
+    results["stages"] = latency_stats()
+    return results
+
+
+def _p50s(node, path=()) -> dict:
+    """Flattens results to {"scenario/.../metric": p50_ms}."""
+    found = {}
+    if isinstance(node, dict):
+        if "p50_ms" in node:
+            found["/".join(path)] = node["p50_ms"]
+        for key, value in node.items():
+            found.update(_p50s(value, path + (key,)))
+    return found
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """The p50s that are more than `tolerance` (a fraction) slower than in the baseline's scenarios."""
+    current, previous = _p50s(results["scenarios"]), _p50s(baseline.get("scenarios", {}))
+    regressions = []
+    for metric, p50 in sorted(current.items()):
+        before = previous.get(metric)
+        if before and p50 > before * (1 + tolerance):
+            regressions.append({"metric": metric, "baseline_p50_ms": before, "p50_ms": p50,
+                                "change": round(p50 / before - 1, 3)})
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the app's own overhead against a fake Gemini backend.")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--iterations", type=int, default=30, help="Timed calls (or turns) per scenario.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Threads for the vibe throughput run.")
+    parser.add_argument("--history-lengths", type=int, nargs="+", default=[0, 4, 16, 64])
+    parser.add_argument("--latency", default="fixed:0",
+                        help="Fake API latency (ms): fixed:N, uniform:LO,HI, normal:MEAN,SD or lognormal:MEDIAN,SIGMA.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of fake calls that fail (429/500/503).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data", help="Dataset CSV (default: a synthetic WMT-shaped dataset in a temp dir).")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    parser.add_argument("--baseline", help="Earlier --json results to compare p50s against.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p50 slowdown vs the baseline.")
+    args = parser.parse_args()
+
+    results = run(args)
+    for metric, p50 in _p50s(results["scenarios"]).items():
+        print(f"  {metric:<40} p50 {p50:>9} ms")
+    if "vibe" in results["scenarios"]:
+        vibe = results["scenarios"]["vibe"]
+        print(f"  vibe throughput: {vibe['throughput_msgs_per_s']} msgs/s with {vibe['concurrency']} threads "
+              f"({vibe['llm_share']:.0%} sent to the LLM)")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            results["regressions"] = compare(results, json.load(f), args.tolerance)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    for regression in results.get("regressions", []):
+        print(f"🚨 Regression: {regression['metric']} p50 {regression['baseline_p50_ms']} -> "
+              f"{regression['p50_ms']} ms ({regression['change']:+.0%})")
+    if results.get("regressions"):
+        sys.exit(1)
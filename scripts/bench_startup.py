@@ -0,0 +1,157 @@
+# scripts/bench_startup.py
+#
+# Measures what a cold start costs before the first screen is drawn, and
+# checks it against a budget. Two measurements, each in a fresh interpreter
+# so nothing is already imported:
+#   * import time of main.py's modules and of each agent module, from
+#     `python -X importtime`, with the heaviest imports listed;
+#   * time to first render: the Streamlit script run headless (AppTest) from
+#     a cold process until the onboarding screen is built, then the welcome
+#     screen after "Let's Begin".
+# No Gemini call is made - the spark pool is disabled and the key is a dummy.
+#
+#   python scripts/bench_startup.py
+#   python scripts/bench_startup.py --runs 5 --budget-import-ms 300 --budget-render-ms 1500 --json startup.json
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+proj_root = os.path.abspath(os.path.join(script_dir, '..'))
+
+# What main.py imports at module level (streamlit itself is measured separately).
+MAIN_IMPORTS = [
+    "agents.VibeDetectionAgent", "agents.DaydreamAgent", "agents.spark_pool", "agents.spark_prefetch",
+    "agents.figure_cache", "agents.gemini_client", "agents.turn_pipeline",
+]
+AGENT_MODULES = [
+    "agents.ConversationalAgent", "agents.VibeDetectionAgent", "agents.DaydreamAgent",
+    "agents.ConversationalAgentPROD", "agents.VibeDetectionPROD", "agents.daydream_agentPROD",
+]
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+_FIRST_RENDER = """
+import json, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file("main.py", default_timeout=60)
+app.run()
+first = time.perf_counter()
+app.button[0].click().run()
+welcome = time.perf_counter()
+print(json.dumps({"first_render_ms": (first - started) * 1000, "welcome_ms": (welcome - first) * 1000,
+                  "exception": [str(e.value) for e in app.exception]}))
+"""
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("GOOGLE_API_KEY", "bench-startup-dummy-key")
+    env["WISE_SPARK_POOL_SIZE"] = "0"  # no background generation while we measure
+    env["PYTHONPATH"] = proj_root + os.pathsep + env.get("PYTHONPATH", "")
+    env["PYTHONWARNINGS"] = "ignore"
+    return env
+
+
+def import_profile(modules: list, top: int = 10) -> dict:
+    """Imports `modules` in a fresh interpreter under -X importtime. Returns total ms and the heaviest imports."""
+    code = "; ".join(f"import {m}" for m in modules)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=proj_root, env=_env(),
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"modules": modules, "error": proc.stderr.strip().splitlines()[-1:]}
+    total_us, entries = 0, []
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = int(match[1]), int(match[2]), match[3], match[4]
+        if len(indent) == 1 and name in modules:
+            # Top-level import: its cumulative time includes everything below it (but not interpreter startup).
+            total_us += cumulative_us
+        entries.append((cumulative_us, self_us, name))
+    heaviest = sorted(entries, reverse=True)[:top]
+    return {
+        "modules": modules,
+        "import_ms": round(total_us / 1000, 1),
+        "heaviest": [{"module": name, "cumulative_ms": round(c / 1000, 1), "self_ms": round(s / 1000, 1)}
+                     for c, s, name in heaviest],
+    }
+
+
+def first_render() -> dict:
+    """Runs main.py headless in a fresh interpreter: onboarding screen, then the welcome screen."""
+    proc = subprocess.run([sys.executable, "-c", _FIRST_RENDER], cwd=proj_root, env=_env(),
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1:]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def run(runs: int) -> dict:
+    main_runs = [import_profile(MAIN_IMPORTS) for _ in range(runs)]
+    streamlit_runs = [import_profile(["streamlit"]) for _ in range(runs)]
+    agents = {m: import_profile([m]) for m in AGENT_MODULES}
+    renders = [first_render() for _ in range(runs)]
+
+    def _median(items, key):
+        values = [item[key] for item in items if key in item]
+        return round(statistics.median(values), 1) if values else None
+
+    return {
+        "runs": runs,
+        "python": sys.version.split()[0],
+        "main_imports_ms": _median(main_runs, "import_ms"),
+        "main_heaviest": main_runs[-1].get("heaviest") or main_runs[-1].get("error"),
+        "streamlit_import_ms": _median(streamlit_runs, "import_ms"),
+        "agent_imports_ms": {m: p.get("import_ms", p.get("error")) for m, p in agents.items()},
+        "first_render_ms": _median(renders, "first_render_ms"),
+        "welcome_ms": _median(renders, "welcome_ms"),
+        "render_errors": [r.get("error") or r.get("exception") for r in renders if r.get("error") or r.get("exception")],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark cold-start import time and time to first render.")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters per measurement (median is reported).")
+    parser.add_argument("--budget-import-ms", type=float, default=300.0,
+                        help="Budget for main.py's agent imports (excluding streamlit).")
+    parser.add_argument("--budget-render-ms", type=float, default=2000.0,
+                        help="Budget for a cold process to build the first screen.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    results = run(args.runs)
+    print(f"main.py agent imports: {results['main_imports_ms']} ms (budget {args.budget_import_ms:g} ms)")
+    print(f"streamlit import:      {results['streamlit_import_ms']} ms")
+    print(f"first render (cold):   {results['first_render_ms']} ms (budget {args.budget_render_ms:g} ms)")
+    print(f"welcome screen:        {results['welcome_ms']} ms")
+    print("heaviest imports at startup:")
+    for entry in results["main_heaviest"] or []:
+        if isinstance(entry, dict):
+            print(f"  {entry['cumulative_ms']:>8} ms  {entry['module']}")
+    print("agent modules imported on their own (ms):")
+    for module, ms in results["agent_imports_ms"].items():
+        print(f"  {module:<36} {ms}")
+    for error in results["render_errors"]:
+        print(f"⚠️ first render: {error}")
+
+    results["budget"] = {"import_ms": args.budget_import_ms, "render_ms": args.budget_render_ms}
+    over = [
+        name for name, value, budget in (
+            ("import_ms", results["main_imports_ms"], args.budget_import_ms),
+            ("render_ms", results["first_render_ms"], args.budget_render_ms),
+        ) if value is None or value > budget
+    ]
+    results["over_budget"] = over
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if over:
+        print(f"🚨 Over budget: {', '.join(over)}")
+        sys.exit(1)
@@ -0,0 +1,141 @@
+# scripts/evaluate_vibe_classifier.py
+#
+# Compares the local vibe classifier against Gemini's labels and reports how
+# much latency the local path saves. Scores are always held-out: corpus
+# messages are classified by models trained on the other folds, never by a
+# model that saw them.
+#
+#   python scripts/evaluate_vibe_classifier.py                 # against gemini-1.5-flash labels
+#   python scripts/evaluate_vibe_classifier.py --offline       # 5-fold CV on the bundled corpus
+#   python scripts/evaluate_vibe_classifier.py --offline --sweep   # CV over temperatures and thresholds
+#   python scripts/evaluate_vibe_classifier.py --messages my_messages.txt --threshold 0.85
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(script_dir, '..'))
+
+from agents.vibe_classifier import (DEFAULT_THRESHOLD, TEMPERATURE, UNKNOWN_WORD_POWER, VibeClassifier, classify_vibe,
+                                    load_corpus)
+
+
+def _report(rows, threshold, reference_name):
+    """rows: list of (local_label, confidence, reference_label, local_ms, llm_ms or None)."""
+    total = len(rows)
+    correct = sum(1 for local, _, ref, _, _ in rows if local == ref)
+    confident = [r for r in rows if r[1] >= threshold]
+    confident_correct = sum(1 for local, _, ref, _, _ in confident if local == ref)
+    local_ms = [r[3] for r in rows]
+    llm_ms = [r[4] for r in rows if r[4] is not None]
+
+    print(f"\nMessages evaluated:            {total}")
+    print(f"Reference labels:              {reference_name}")
+    print(f"Threshold:                     {threshold:.2f}")
+    print(f"Accuracy (all messages):       {correct / total:.1%}")
+    print(f"Coverage (answered locally):   {len(confident) / total:.1%}")
+    if confident:
+        print(f"Accuracy (answered locally):   {confident_correct / len(confident):.1%}")
+    print(f"Local latency mean / max:      {statistics.mean(local_ms):.3f} ms / {max(local_ms):.3f} ms")
+    if llm_ms:
+        mean_llm = statistics.mean(llm_ms)
+        print(f"LLM latency mean:              {mean_llm:.0f} ms")
+        print(f"Latency saved per message:     {mean_llm * len(confident) / total:.0f} ms on average")
+        print(f"Latency saved in this run:     {mean_llm * len(confident) / 1000:.1f} s")
+
+
+def cross_validated(folds: int = 5, **params) -> dict:
+    """
+    Held-out predictions for the corpus: {text: (label, local_label, confidence, ms)}, each message
+    classified by a model trained on the other folds.
+    """
+    rows = load_corpus()
+    random.Random(0).shuffle(rows)
+    predictions = {}
+    for fold in range(folds):
+        train = [r for i, r in enumerate(rows) if i % folds != fold]
+        model = VibeClassifier(**params).fit(train)
+        for text, label in rows[fold::folds]:
+            start = time.perf_counter()
+            local, confidence = model.predict(text)
+            predictions[text] = (label, local, confidence, (time.perf_counter() - start) * 1000)
+    return predictions
+
+
+def evaluate_offline(threshold: float, folds: int = 5):
+    results = [(local, confidence, label, ms, None) for label, local, confidence, ms in cross_validated(folds).values()]
+    _report(results, threshold, f"bundled corpus ({folds}-fold CV)")
+
+
+def sweep(folds: int = 5):
+    """Held-out coverage and accuracy for a grid of calibration settings, to pick the constants and threshold."""
+    thresholds = (0.7, 0.8, 0.9, 0.95)
+    print(f"\n{'temperature':>11} {'oov power':>9}  " + "  ".join(f"cov/acc@{t:.2f}" for t in thresholds))
+    for temperature in (1.0, 1.5, 2.0, 3.0):
+        for power in (0.0, 0.25, 0.5, 1.0):
+            preds = cross_validated(folds, temperature=temperature, unknown_word_power=power).values()
+            cells = []
+            for t in thresholds:
+                confident = [(label, local) for label, local, confidence, _ in preds if confidence >= t]
+                accuracy = sum(1 for label, local in confident if label == local) / len(confident) if confident else 0.0
+                cells.append(f"{len(confident) / len(preds):5.0%}/{accuracy:4.0%}")
+            marker = "  <- current" if (temperature, power) == (TEMPERATURE, UNKNOWN_WORD_POWER) else ""
+            print(f"{temperature:>11.2f} {power:>9.2f}  " + "  ".join(f"{c:>12}" for c in cells) + marker)
+
+
+def evaluate_online(messages: list, threshold: float):
+    from dotenv import load_dotenv
+    from agents.VibeDetectionAgent import detect_vibe_llm
+    from agents.gemini_client import configure
+    from agents.response_cache import response_cache
+
+    load_dotenv()
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        print("FATAL ERROR: GOOGLE_API_KEY not found. Use --offline to evaluate without the API.")
+        sys.exit(1)
+    configure(api_key)
+    response_cache.clear()
+
+    # Corpus messages get their cross-validated prediction; scoring them with the shipped classifier
+    # would grade it on its own training data.
+    held_out = cross_validated()
+    results = []
+    for i, text in enumerate(messages, 1):
+        if text in held_out:
+            _, local, confidence, local_ms = held_out[text]
+        else:
+            start = time.perf_counter()
+            local, confidence = classify_vibe(text)
+            local_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        llm_label = detect_vibe_llm(text)
+        llm_ms = (time.perf_counter() - start) * 1000
+        results.append((local, confidence, llm_label, local_ms, llm_ms))
+        print(f"[{i}/{len(messages)}] local={local} ({confidence:.2f}) llm={llm_label} :: {text[:60]}")
+    _report(results, threshold, "gemini-1.5-flash")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate the local vibe classifier.")
+    parser.add_argument("--messages", help="Text file with one message per line (default: the bundled corpus).")
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("WISE_VIBE_THRESHOLD", DEFAULT_THRESHOLD)))
+    parser.add_argument("--offline", action="store_true", help="Cross-validate on the corpus labels; no API calls.")
+    parser.add_argument("--sweep", action="store_true", help="With --offline: compare calibration settings.")
+    args = parser.parse_args()
+
+    if args.offline:
+        evaluate_offline(args.threshold)
+        if args.sweep:
+            sweep()
+    else:
+        if args.messages:
+            with open(args.messages, "r", encoding="utf-8") as f:
+                messages = [line.strip() for line in f if line.strip()]
+        else:
+            messages = [text for text, _ in load_corpus()]
+        evaluate_online(messages, args.threshold)
@@ -1,49 +1,343 @@
 # scripts/process_dataset.py
+#
+# Streaming ingestion for Wise. The raw CSV is read in chunks (pyarrow's
+# streaming CSV reader when available, pandas chunks otherwise), the date
+# filter is applied during the scan, and each chunk is written straight out as
+#   - typed, compressed Parquet partitioned by Year/Month (hive layout),
+#   - the CSV the app reads today,
+# so peak memory is bounded by the chunk size, not the input size. Column
+# types are fixed up front from the CSV header (prices stay float64), so every
+# chunk and partition shares one schema. A schema/stats manifest is written
+# next to the Parquet data, and the insight index is built from a running
+# per-day Close/Volume aggregate.
+#
+#   python scripts/process_dataset.py
+#   python scripts/process_dataset.py --input ticks.csv --since 2015-01-01 --block-mb 64 --no-csv
 
-import pandas as pd
+import argparse
+import csv
+import json
 import os
+import shutil
+import sys
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
 
-print("Starting dataset processing for Wise...")
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(script_dir, '..'))
+from agents.insight_index import write_insight_index
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
 
 # --- A more robust way to define file paths ---
-# This locates the script's own directory first.
-script_dir = os.path.dirname(__file__) 
+# Paths are built relative to the script's location, so it works no matter where you run it from.
+DEFAULT_RAW_PATH = os.path.join(script_dir, '..', 'data', 'data', 'WMT_1970-10-01_2025-01-31.csv')
+DEFAULT_OUTPUT_PATH = os.path.join(script_dir, '..', 'app', 'data', 'wmt_stock_data.csv')
+PARTITION_COLS = ["Year", "Month"]
+INTEGER_COLS = {"Volume"}
+# Every other non-date column must be numeric (prices, adjusted prices) and is kept at full float64
+# precision. Integer columns use pandas' nullable Int64, so a missing volume stays missing.
+# Full timestamps, so intraday rows keep their time of day; the app parses either form.
+CSV_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Partition files kept open at once; input sorted by date only ever needs one.
+MAX_OPEN_WRITERS = 8
 
-# Now, we build paths relative to the script's location.
-# This makes the script work no matter where you run it from.
-# os.path.join handles the slashes correctly for any OS.
-raw_data_path = os.path.join(script_dir, '..', 'data', 'data', 'WMT_1970-10-01_2025-01-31.csv')
-output_path = os.path.join(script_dir, '..', 'app', 'data', 'wmt_stock_data.csv')
 
-# Use os.path.abspath to show the full, unambiguous path for debugging
-print(f"Attempting to read raw data from absolute path: {os.path.abspath(raw_data_path)}")
+class DatasetFormatError(ValueError):
+    """The raw CSV does not have the layout the ingest expects (a Date column, numeric everything else)."""
 
 
-try:
-    # Check if the output directory exists, if not, create it
+def read_header(path: str) -> list:
+    """The CSV's column names, read without scanning the file."""
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        columns = next(csv.reader(f), [])
+    if "Date" not in columns:
+        raise DatasetFormatError(f"{path} has no 'Date' column (columns: {', '.join(columns) or 'none'}).")
+    return columns
+
+
+def column_dtypes(columns: list) -> dict:
+    """The fixed pandas dtype of every data column (Date and the partition columns excluded)."""
+    return {col: "Int64" if col in INTEGER_COLS else "float64"
+            for col in columns if col != "Date" and col not in PARTITION_COLS}
+
+
+def _arrow_type(dtype: str) -> "pa.DataType":
+    return pa.int64() if dtype == "Int64" else pa.float64()
+
+
+def parquet_schema(columns: list) -> "pa.Schema":
+    """The Parquet schema for a file with these columns, declared before any data is read."""
+    fields = [pa.field("Date", pa.timestamp("ns"))]
+    fields += [pa.field(col, _arrow_type(dtype)) for col, dtype in column_dtypes(columns).items()]
+    return pa.schema(fields)
+
+
+def _format_error(path: str, error: Exception) -> DatasetFormatError:
+    return DatasetFormatError(
+        f"{path}: {error}. Every column except Date must be numeric "
+        f"({', '.join(sorted(INTEGER_COLS))} whole numbers, the rest decimals); empty cells are allowed."
+    )
+
+
+def iter_chunks(path: str, block_mb: int, dtypes: dict):
+    """
+    Yields the raw file as pandas DataFrames of roughly `block_mb` megabytes each. Every column is read
+    with its fixed type, so a block whose values look different (integer prices early on) never gets
+    a type of its own.
+    """
+    if pa is not None:
+        # Dates are parsed per chunk with pandas, matching what the app always did.
+        column_types = {"Date": pa.string(), **{col: _arrow_type(dtype) for col, dtype in dtypes.items()}}
+        try:
+            reader = pacsv.open_csv(
+                path,
+                read_options=pacsv.ReadOptions(block_size=block_mb * 1024 * 1024),
+                convert_options=pacsv.ConvertOptions(column_types=column_types),
+            )
+            for batch in reader:
+                yield batch.to_pandas().astype(
+                    {col: dtype for col, dtype in dtypes.items() if col in batch.schema.names})
+        except pa.ArrowInvalid as e:
+            raise _format_error(path, e) from e
+    else:
+        # ~100 bytes per row is a fair guess for OHLCV CSVs.
+        try:
+            for chunk in pd.read_csv(path, chunksize=max(1, block_mb * 1024 * 1024 // 100), dtype=dtypes):
+                yield chunk
+        except (ValueError, TypeError) as e:
+            raise _format_error(path, e) from e
+
+
+def prepare_chunk(chunk: pd.DataFrame, since: pd.Timestamp, dtypes: dict) -> pd.DataFrame:
+    """Date filter, Year/Month derivation and the fixed column dtypes for one chunk."""
+    dates = pd.to_datetime(chunk["Date"])
+    if getattr(dates.dt, "tz", None) is not None:
+        dates = dates.dt.tz_localize(None)
+    keep = (dates > since).to_numpy()
+    if not keep.any():
+        return chunk.iloc[0:0]
+    chunk = chunk.loc[keep].copy()
+    chunk["Date"] = dates[keep]
+    chunk["Year"] = chunk["Date"].dt.year.astype(np.int16)
+    chunk["Month"] = chunk["Date"].dt.month.astype(np.int8)
+    # Fixed dtypes (not per-chunk inference or downcasts) so every chunk shares one schema.
+    return chunk.astype({col: dtype for col, dtype in dtypes.items() if col in chunk.columns})
+
+
+class PartitionedParquetWriter:
+    def __init__(self, root: str, schema: "pa.Schema", compression: str = "zstd", max_open: int = MAX_OPEN_WRITERS):
+        """
+        Appends chunks to Parquet files per Year/Month partition (hive layout: Year=2020/Month=1/).
+        At most `max_open` files are open; a partition seen again after its writer was closed gets
+        another part file.
+        """
+        self.root = root
+        self.schema = schema
+        self.compression = compression
+        self.max_open = max(1, max_open)
+        self._writers = OrderedDict()
+        self.partitions = {}
+
+    def _writer(self, key: tuple) -> "pq.ParquetWriter":
+        writer = self._writers.get(key)
+        if writer is not None:
+            self._writers.move_to_end(key)
+            return writer
+        while len(self._writers) >= self.max_open:
+            _, oldest = self._writers.popitem(last=False)
+            oldest.close()
+        part_dir = os.path.join(self.root, f"Year={key[0]}", f"Month={key[1]}")
+        stats = self.partitions.get(key)
+        if stats is None:
+            os.makedirs(part_dir, exist_ok=True)
+            stats = self.partitions[key] = {"path": os.path.relpath(part_dir, self.root), "files": 0, "rows": 0,
+                                            "min_date": None, "max_date": None}
+        writer = pq.ParquetWriter(os.path.join(part_dir, f"part-{stats['files']}.parquet"), self.schema,
+                                  compression=self.compression)
+        stats["files"] += 1
+        self._writers[key] = writer
+        return writer
+
+    def write(self, chunk: pd.DataFrame):
+        for (year, month), part in chunk.groupby(PARTITION_COLS, sort=False):
+            table = pa.Table.from_pandas(part.drop(columns=PARTITION_COLS), schema=self.schema, preserve_index=False)
+            key = (int(year), int(month))
+            self._writer(key).write_table(table)
+            stats = self.partitions[key]
+            stats["rows"] += len(part)
+            lo, hi = part["Date"].min().isoformat(), part["Date"].max().isoformat()
+            stats["min_date"] = lo if stats["min_date"] is None else min(stats["min_date"], lo)
+            stats["max_date"] = hi if stats["max_date"] is None else max(stats["max_date"], hi)
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+
+
+class ColumnStats:
+    def __init__(self):
+        """Running min/max/null counts per column, updated chunk by chunk."""
+        self.columns = {}
+
+    def update(self, chunk: pd.DataFrame):
+        for col in chunk.columns:
+            series = chunk[col]
+            stats = self.columns.setdefault(col, {"dtype": str(series.dtype), "min": None, "max": None, "nulls": 0})
+            stats["nulls"] += int(series.isna().sum())
+            if series.notna().any():
+                lo, hi = series.min(), series.max()
+                stats["min"] = lo if stats["min"] is None else min(stats["min"], lo)
+                stats["max"] = hi if stats["max"] is None else max(stats["max"], hi)
+
+    def as_json(self) -> dict:
+        def _plain(v):
+            if isinstance(v, pd.Timestamp):
+                return v.isoformat()
+            return v.item() if hasattr(v, "item") else v
+        return {col: {k: _plain(v) for k, v in s.items()} for col, s in self.columns.items()}
+
+
+class DailyAggregate:
+    def __init__(self):
+        """Running last Close and total Volume per day, so tick-level inputs never pile up in memory."""
+        self.days = {}
+
+    def update(self, chunk: pd.DataFrame):
+        day = chunk["Date"].dt.normalize()
+        daily = chunk.assign(Date=day).groupby("Date", sort=False).agg(Close=("Close", "last"), Volume=("Volume", "sum"))
+        for date, close, volume in zip(daily.index, daily["Close"].to_numpy(), daily["Volume"].to_numpy()):
+            seen = self.days.get(date)
+            # Chunks arrive in file order, so a later chunk's close for the same day is the later one.
+            self.days[date] = (close, volume if seen is None else seen[1] + volume)
+
+    def frame(self) -> pd.DataFrame:
+        dates = sorted(self.days)
+        return pd.DataFrame({"Date": dates, "Close": [self.days[d][0] for d in dates],
+                             "Volume": [self.days[d][1] for d in dates]})
+
+
+def process(raw_path: str, output_path: str, parquet_dir: str, since: str, block_mb: int,
+            write_csv: bool = True, compression: str = "zstd") -> dict:
+    since_ts = pd.Timestamp(since)
+    columns = read_header(raw_path)
+    dtypes = column_dtypes(columns)
     output_dir = os.path.dirname(output_path)
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
         print(f"Created directory: {output_dir}")
 
-    # Read the raw data
-    df = pd.read_csv(raw_data_path)
-
-    # --- Data Cleaning and Preparation ---
-    df['Date'] = pd.to_datetime(df['Date'])
-    df_recent = df[df['Date'] > '2020-01-01'].copy()
-    df_recent['Year'] = df_recent['Date'].dt.year
-    df_recent['Month'] = df_recent['Date'].dt.month
-    df_recent.to_csv(output_path, index=False)
-
-    print(f"\nProcessing complete!")
-    print(f"Saved {len(df_recent)} recent stock records to: {os.path.abspath(output_path)}")
-
-except FileNotFoundError:
-    print(f"\nFATAL ERROR: The raw data file was not found.")
-    print("Please double-check two things:")
-    print("1. You have a folder named 'data' in your main 'wise-adk-hackathon' directory.")
-    print("2. Inside that 'data' folder, the file 'WMT_1970-10-01_2025-01-31.csv' exists.")
-    
-except Exception as e:
-    print(f"\nAn unexpected error occurred: {e}")
\ No newline at end of file
+    parquet_writer = None
+    if pa is not None and parquet_dir:
+        if os.path.exists(parquet_dir):
+            shutil.rmtree(parquet_dir)
+        parquet_writer = PartitionedParquetWriter(parquet_dir, parquet_schema(columns), compression=compression)
+    elif parquet_dir:
+        print("pyarrow is not installed - skipping the Parquet output.")
+
+    column_stats = ColumnStats()
+    daily = DailyAggregate() if {"Close", "Volume"} <= set(columns) else None
+    rows_scanned = rows_written = 0
+    csv_header = True
+    started = time.perf_counter()
+    try:
+        for chunk_no, raw_chunk in enumerate(iter_chunks(raw_path, block_mb, dtypes), 1):
+            rows_scanned += len(raw_chunk)
+            chunk = prepare_chunk(raw_chunk, since_ts, dtypes)
+            del raw_chunk
+            if chunk.empty:
+                continue
+            rows_written += len(chunk)
+            column_stats.update(chunk)
+            if parquet_writer is not None:
+                parquet_writer.write(chunk)
+            if write_csv:
+                chunk.to_csv(output_path, index=False, mode="w" if csv_header else "a", header=csv_header,
+                             date_format=CSV_DATE_FORMAT)
+                csv_header = False
+            if daily is not None:
+                daily.update(chunk)
+            print(f"  chunk {chunk_no}: scanned {rows_scanned:,} rows, kept {rows_written:,}")
+    finally:
+        if parquet_writer is not None:
+            parquet_writer.close()
+
+    elapsed = time.perf_counter() - started
+    manifest = {
+        "source": os.path.abspath(raw_path),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "filter": {"column": "Date", "greater_than": since_ts.isoformat()},
+        "rows_scanned": rows_scanned,
+        "rows_written": rows_written,
+        "seconds": round(elapsed, 2),
+        "partition_by": PARTITION_COLS,
+        "schema": ([{"name": f.name, "type": str(f.type)} for f in parquet_writer.schema]
+                   if parquet_writer is not None else None),
+        "columns": column_stats.as_json(),
+        "partitions": ([{"Year": y, "Month": m, **s} for (y, m), s in sorted(parquet_writer.partitions.items())]
+                       if parquet_writer is not None else []),
+    }
+    if parquet_writer is not None:
+        # No partition directory exists when nothing matched the filter; the manifest still records the run.
+        os.makedirs(parquet_dir, exist_ok=True)
+        with open(os.path.join(parquet_dir, "_manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+    # --- Precompute the insight index the DaydreamAgent samples from ---
+    if daily is not None and daily.days:
+        index_path = write_insight_index(daily.frame(), output_path)
+        print(f"Saved insight index to: {os.path.abspath(index_path)}")
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream the raw WMT CSV into the app's processed formats.")
+    parser.add_argument("--input", default=DEFAULT_RAW_PATH)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_PATH, help="Processed CSV the app reads.")
+    parser.add_argument("--parquet-dir", default=None,
+                        help="Partitioned Parquet output (default: <output name>_parquet next to the CSV).")
+    parser.add_argument("--since", default="2020-01-01", help="Keep rows strictly after this date.")
+    parser.add_argument("--block-mb", type=int, default=16, help="Approximate chunk size in MB.")
+    parser.add_argument("--compression", default="zstd")
+    parser.add_argument("--no-csv", action="store_true", help="Only write Parquet.")
+    args = parser.parse_args()
+    parquet_dir = args.parquet_dir or f"{os.path.splitext(args.output)[0]}_parquet"
+
+    print("Starting dataset processing for Wise...")
+    # Use os.path.abspath to show the full, unambiguous path for debugging
+    print(f"Attempting to read raw data from absolute path: {os.path.abspath(args.input)}")
+
+    try:
+        manifest = process(args.input, args.output, parquet_dir, args.since, args.block_mb,
+                           write_csv=not args.no_csv, compression=args.compression)
+        print(f"\nProcessing complete in {manifest['seconds']}s!")
+        if not manifest["rows_written"]:
+            print(f"No rows are dated after {args.since} (of {manifest['rows_scanned']} scanned) - nothing to write.")
+            sys.exit(0)
+        print(f"Saved {manifest['rows_written']} recent stock records (of {manifest['rows_scanned']} scanned).")
+        if not args.no_csv:
+            print(f"CSV: {os.path.abspath(args.output)}")
+        if manifest["partitions"]:
+            print(f"Parquet ({len(manifest['partitions'])} Year/Month partitions): {os.path.abspath(parquet_dir)}")
+
+    except DatasetFormatError as e:
+        print(f"\nFATAL ERROR: {e}")
+        sys.exit(1)
+
+    except FileNotFoundError:
+        print(f"\nFATAL ERROR: The raw data file was not found.")
+        print("Please double-check two things:")
+        print("1. You have a folder named 'data' in your main 'wise-adk-hackathon' directory.")
+        print("2. Inside that 'data' folder, the file 'WMT_1970-10-01_2025-01-31.csv' exists.")
+
+    except Exception as e:
+        print(f"\nAn unexpected error occurred: {e}")
@@ -0,0 +1,393 @@
+# scripts/upload_to_bigquery.py
+#
+# Resumable bulk loader for the processed dataset. Reads the Year/Month
+# partitioned Parquet written by process_dataset.py in batches and pushes each
+# partition through a sink - SQLite (built in) or DuckDB for local testing,
+# BigQuery for production. Every partition load replaces that partition in the
+# target, so re-running is idempotent, and a checkpoint file records finished
+# partitions so a crashed load resumes where it stopped.
+#
+#   python scripts/upload_to_bigquery.py --sink sqlite --target data/warehouse.db
+#   python scripts/upload_to_bigquery.py --sink bigquery --target my-project.wise --workers 4
+#   python scripts/upload_to_bigquery.py --sink duckdb --target data/warehouse.duckdb --force
+
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SOURCE = os.path.join(script_dir, '..', 'app', 'data', 'wmt_stock_data_parquet')
+DEFAULT_TABLE = "wmt_stock_data"
+
+
+# --- Source: the partitions written by process_dataset.py ---
+
+def discover_partitions(source: str) -> list:
+    """
+    Lists the Year/Month partitions under `source` as dicts with id, Year, Month, files and a
+    fingerprint that changes whenever the partition's files do.
+    """
+    partitions = []
+    for part_dir in sorted(glob.glob(os.path.join(source, "Year=*", "Month=*"))):
+        files = sorted(glob.glob(os.path.join(part_dir, "*.parquet")))
+        if not files:
+            continue
+        year = int(os.path.basename(os.path.dirname(part_dir)).split("=", 1)[1])
+        month = int(os.path.basename(part_dir).split("=", 1)[1])
+        fingerprint = ";".join(f"{os.path.basename(p)}:{os.stat(p).st_size}:{os.stat(p).st_mtime_ns}" for p in files)
+        partitions.append({"id": f"{year:04d}-{month:02d}", "Year": year, "Month": month,
+                           "files": files, "fingerprint": fingerprint})
+    return partitions
+
+
+def iter_partition_batches(partition: dict, batch_size: int):
+    """Yields one partition as pandas DataFrames of at most `batch_size` rows, with Year/Month restored."""
+    for path in partition["files"]:
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            df = batch.to_pandas()
+            df["Year"] = partition["Year"]
+            df["Month"] = partition["Month"]
+            yield df
+
+
+# --- Sinks ---
+
+class Sink(ABC):
+    """
+    A load target. load_partition must replace everything previously loaded for that
+    partition id, so a partition can be loaded any number of times with the same result.
+    """
+    name = "sink"
+
+    @abstractmethod
+    def load_partition(self, partition_id: str, batches) -> int:
+        """Replaces the partition with the rows in `batches` and returns the number of rows written."""
+
+    def close(self):
+        pass
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _rows(df: pd.DataFrame) -> list:
+    # Plain Python values - sqlite3 cannot bind numpy scalars.
+    columns = []
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            series = series.dt.strftime("%Y-%m-%d %H:%M:%S")
+        columns.append(series.astype(object).where(series.notna(), None).tolist())
+    return list(zip(*columns))
+
+
+class SQLiteSink(Sink):
+    name = "sqlite"
+    _SQL_TYPES = {"i": "INTEGER", "u": "INTEGER", "f": "REAL", "b": "INTEGER"}
+
+    def __init__(self, path: str, table: str):
+        """
+        Loads into `table` in the SQLite file at `path`. Rows carry a _partition column; each
+        partition is swapped in with one DELETE + INSERT transaction.
+        """
+        self.path = path
+        self.table = table
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._created = False
+        self._conns = []
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._schema_lock:
+                self._conns.append(conn)
+        return conn
+
+    def _ensure_table(self, conn, df: pd.DataFrame):
+        if self._created:
+            return
+        with self._schema_lock:
+            if self._created:
+                return
+            columns = ", ".join(f"{_quote(col)} {self._SQL_TYPES.get(df[col].dtype.kind, 'TEXT')}" for col in df.columns)
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {_quote(self.table)} ({columns}, _partition TEXT NOT NULL)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {_quote(self.table + '_partition')} "
+                         f"ON {_quote(self.table)} (_partition)")
+            self._created = True
+
+    def load_partition(self, partition_id: str, batches) -> int:
+        conn = self._conn()
+        rows = 0
+        in_transaction = False
+        try:
+            for df in batches:
+                self._ensure_table(conn, df)
+                if not in_transaction:
+                    conn.execute("BEGIN IMMEDIATE")
+                    in_transaction = True
+                    conn.execute(f"DELETE FROM {_quote(self.table)} WHERE _partition = ?", (partition_id,))
+                placeholders = ", ".join("?" for _ in range(len(df.columns) + 1))
+                columns = ", ".join(_quote(col) for col in df.columns)
+                conn.executemany(
+                    f"INSERT INTO {_quote(self.table)} ({columns}, _partition) VALUES ({placeholders})",
+                    [row + (partition_id,) for row in _rows(df)],
+                )
+                rows += len(df)
+            if in_transaction:
+                conn.execute("COMMIT")
+        except BaseException:
+            if in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def close(self):
+        # One connection per loader thread; the threads are done by now.
+        with self._schema_lock:
+            for conn in self._conns:
+                conn.close()
+            self._conns.clear()
+
+
+class DuckDBSink(Sink):
+    name = "duckdb"
+
+    def __init__(self, path: str, table: str):
+        """
+        Loads into `table` in the DuckDB file at `path`. Same replace-by-_partition contract as SQLite.
+        """
+        import duckdb  # Optional dependency: pip install duckdb
+        self.table = table
+        self._db = duckdb.connect(path)
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._created = False
+        self._cursors = []
+
+    def _cursor(self):
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            cursor = self._db.cursor()
+            self._local.cursor = cursor
+            with self._schema_lock:
+                self._cursors.append(cursor)
+        return cursor
+
+    def _ensure_table(self, cursor):
+        # Created and committed outside any load transaction, so every worker's transaction sees it.
+        if self._created:
+            return
+        with self._schema_lock:
+            if self._created:
+                return
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {_quote(self.table)} AS SELECT * FROM wise_batch LIMIT 0")
+            self._created = True
+
+    def load_partition(self, partition_id: str, batches) -> int:
+        cursor = self._cursor()
+        rows = 0
+        in_transaction = False
+        try:
+            for df in batches:
+                df = df.assign(_partition=partition_id)
+                cursor.register("wise_batch", df)
+                self._ensure_table(cursor)
+                if not in_transaction:
+                    cursor.execute("BEGIN TRANSACTION")
+                    in_transaction = True
+                    cursor.execute(f"DELETE FROM {_quote(self.table)} WHERE _partition = ?", [partition_id])
+                cursor.execute(f"INSERT INTO {_quote(self.table)} SELECT * FROM wise_batch")
+                cursor.unregister("wise_batch")
+                rows += len(df)
+            if in_transaction:
+                cursor.execute("COMMIT")
+        except BaseException:
+            if in_transaction:
+                cursor.execute("ROLLBACK")
+            raise
+        return rows
+
+    def close(self):
+        with self._schema_lock:
+            for cursor in self._cursors:
+                cursor.close()
+            self._cursors.clear()
+        self._db.close()
+
+
+class BigQuerySink(Sink):
+    name = "bigquery"
+
+    def __init__(self, target: str, table: str):
+        """
+        Loads into `<project>.<dataset>.<table>` (target is "project.dataset"). The table is
+        month-partitioned on Date, and each partition is written through its `$YYYYMM` decorator:
+        the first batch truncates it, later batches append.
+        """
+        from google.cloud import bigquery  # Optional dependency: pip install google-cloud-bigquery
+        self._bq = bigquery
+        project, dataset = target.split(".", 1)
+        self.client = bigquery.Client(project=project)
+        self.table_id = f"{project}.{dataset}.{table}"
+
+    def load_partition(self, partition_id: str, batches) -> int:
+        bigquery = self._bq
+        decorator = f"{self.table_id}${partition_id.replace('-', '')}"
+        rows = 0
+        for df in batches:
+            # Column names with spaces ("Adj Close") are not valid BigQuery identifiers.
+            df = df.rename(columns=lambda c: c.replace(" ", "_"))
+            job_config = bigquery.LoadJobConfig(
+                write_disposition="WRITE_TRUNCATE" if rows == 0 else "WRITE_APPEND",
+                time_partitioning=bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.MONTH, field="Date"),
+            )
+            self.client.load_table_from_dataframe(df, decorator, job_config=job_config).result()
+            rows += len(df)
+        return rows
+
+
+def make_sink(kind: str, target: str, table: str) -> Sink:
+    if kind == "sqlite":
+        return SQLiteSink(target, table)
+    if kind == "duckdb":
+        return DuckDBSink(target, table)
+    if kind == "bigquery":
+        return BigQuerySink(target, table)
+    raise ValueError(f"Unknown sink: {kind}")
+
+
+# --- Checkpoint ---
+
+class Checkpoint:
+    def __init__(self, path: str, load_key: str):
+        """
+        Remembers which partitions (and which version of each) reached the sink. A checkpoint
+        written for a different source/sink/table is ignored.
+        """
+        self.path = path
+        self.load_key = load_key
+        self._lock = threading.Lock()
+        self.done = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    state = json.load(f)
+                if state.get("load_key") == load_key:
+                    self.done = state.get("partitions", {})
+            except (OSError, json.JSONDecodeError):
+                print(f"⚠️ Checkpoint {path} is unreadable - starting a fresh load.")
+
+    def is_done(self, partition: dict) -> bool:
+        entry = self.done.get(partition["id"])
+        return entry is not None and entry.get("fingerprint") == partition["fingerprint"]
+
+    def mark_done(self, partition: dict, rows: int):
+        with self._lock:
+            self.done[partition["id"]] = {"fingerprint": partition["fingerprint"], "rows": rows,
+                                          "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"load_key": self.load_key, "partitions": self.done}, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+# --- Loader ---
+
+def load(source: str, sink: Sink, checkpoint: Checkpoint, batch_size: int = 50000, workers: int = 2) -> dict:
+    partitions = discover_partitions(source)
+    todo = [p for p in partitions if not checkpoint.is_done(p)]
+    print(f"{len(partitions)} partitions found, {len(partitions) - len(todo)} already loaded, {len(todo)} to load.")
+
+    started = time.perf_counter()
+    total_rows = 0
+    failed = []
+
+    def _load_one(partition):
+        part_started = time.perf_counter()
+        rows = sink.load_partition(partition["id"], iter_partition_batches(partition, batch_size))
+        checkpoint.mark_done(partition, rows)
+        return rows, time.perf_counter() - part_started
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="wise-loader") as pool:
+        futures = {pool.submit(_load_one, p): p for p in todo}
+        for future in as_completed(futures):
+            partition = futures[future]
+            try:
+                rows, seconds = future.result()
+            except Exception as e:
+                failed.append(partition["id"])
+                print(f"  ✗ {partition['id']}: {type(e).__name__}: {e}")
+                continue
+            total_rows += rows
+            elapsed = time.perf_counter() - started
+            print(f"  ✓ {partition['id']}: {rows:,} rows in {seconds:.2f}s "
+                  f"({total_rows / elapsed if elapsed else 0:,.0f} rows/s overall)")
+
+    elapsed = time.perf_counter() - started
+    return {
+        "partitions": len(partitions),
+        "skipped": len(partitions) - len(todo),
+        "loaded": len(todo) - len(failed),
+        "failed": failed,
+        "rows": total_rows,
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round(total_rows / elapsed, 1) if elapsed and total_rows else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resumable, partition-idempotent bulk load of the processed dataset.")
+    parser.add_argument("--source", default=DEFAULT_SOURCE, help="Partitioned Parquet written by process_dataset.py.")
+    parser.add_argument("--sink", choices=["sqlite", "duckdb", "bigquery"], default="sqlite")
+    parser.add_argument("--target", default=os.path.join(script_dir, '..', 'data', 'warehouse.db'),
+                        help="Database file for sqlite/duckdb, 'project.dataset' for bigquery.")
+    parser.add_argument("--table", default=DEFAULT_TABLE)
+    parser.add_argument("--batch-size", type=int, default=50000, help="Rows per batch read from Parquet.")
+    parser.add_argument("--workers", type=int, default=2, help="Partitions loaded in parallel.")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: <source>/_load_<sink>_<table>.json).")
+    parser.add_argument("--force", action="store_true", help="Ignore the checkpoint and reload every partition.")
+    args = parser.parse_args()
+
+    if pq is None:
+        raise SystemExit("pyarrow is required to read the Parquet partitions (pip install pyarrow).")
+    if not os.path.isdir(args.source):
+        raise SystemExit(f"Source not found: {os.path.abspath(args.source)} - run scripts/process_dataset.py first.")
+
+    checkpoint_path = args.checkpoint or os.path.join(args.source, f"_load_{args.sink}_{args.table}.json")
+    if args.force and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    load_key = f"{os.path.abspath(args.source)}|{args.sink}|{args.target}|{args.table}"
+
+    sink = make_sink(args.sink, args.target, args.table)
+    try:
+        summary = load(args.source, sink, Checkpoint(checkpoint_path, load_key),
+                       batch_size=args.batch_size, workers=args.workers)
+    finally:
+        sink.close()
+
+    print(f"\nLoaded {summary['rows']:,} rows from {summary['loaded']} partitions in {summary['seconds']}s "
+          f"({summary['rows_per_second']:,} rows/s); {summary['skipped']} skipped as already loaded.")
+    if summary["failed"]:
+        print(f"{len(summary['failed'])} partitions failed and will be retried on the next run: {', '.join(summary['failed'])}")
+        raise SystemExit(1)
@@ -0,0 +1,48 @@
+import pytest
+
+from agents.chart_intent import cache_key_text, parse_chart_intent
+
+COLUMNS = ["Date", "Open", "High", "Low", "Close", "Adj Close", "Volume", "Year", "Month"]
+
+
+@pytest.mark.parametrize("message", [
+    "plot the close in 2023",
+    "plot close 2020",
+    "plot volume since 2022",
+    "chart the high and low",
+    "plot price vs volume",
+    "plot open in 2021 by month",
+    "returns in 2022",
+    "plot close where volume > 10000000",
+])
+def test_qualifiers_the_parser_does_not_understand_go_to_the_llm(message):
+    assert parse_chart_intent(message, COLUMNS) is None
+
+
+@pytest.mark.parametrize("message, chart, y, resample", [
+    ("plot the closing price over time", "line", ["Close"], None),
+    ("Plot the closing price.", "line", ["Close"], None),
+    ("Can you graph the adjusted close?", "line", ["Adj Close"], None),
+    ("volume by year", "bar", ["Volume"], "Y"),
+    ("show me the trading volume by month", "bar", ["Volume"], "M"),
+    ("histogram of volume", "histogram", ["Volume"], None),
+    ("distribution of daily returns", "histogram", ["Close"], None),
+])
+def test_common_phrasings_are_parsed(message, chart, y, resample):
+    spec = parse_chart_intent(message, COLUMNS)
+    assert (spec["chart"], spec["y"], spec.get("resample")) == (chart, y, resample)
+
+
+@pytest.mark.parametrize("first, second", [
+    ("plot close where volume > 10000000", "plot close where volume < 10000000"),
+    ("plot close where volume = 5", "plot close where volume != 5"),
+    ("plot close for 2023-2024", "plot close for 2023 2024"),
+    ("plot returns above 1.5", "plot returns above 15"),
+    ("plot returns below -2", "plot returns below 2"),
+])
+def test_cache_keys_keep_operators_and_numbers(first, second):
+    assert cache_key_text(first) != cache_key_text(second)
+
+
+def test_cache_keys_fold_case_and_whitespace():
+    assert cache_key_text("  Plot the   CLOSE where volume > 5?") == cache_key_text("plot the close where volume > 5")
@@ -0,0 +1,22 @@
+from agents.context_window import ConversationContext, estimate_tokens
+
+
+def _tokens(block: str) -> int:
+    return sum(estimate_tokens(line) for line in block.splitlines())
+
+
+def test_single_oversized_message_is_truncated_to_the_budget():
+    context = ConversationContext(token_budget=100)
+    block = context.format([{"role": "user", "content": "x" * 4000}])
+    assert block.startswith("User: xxx")
+    assert block.rstrip().endswith("...")
+    assert _tokens(block) <= 100
+
+
+def test_oversized_latest_message_fits_beside_earlier_ones():
+    context = ConversationContext(token_budget=100)
+    history = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+    context.format(history)
+    block = context.format(history + [{"role": "user", "content": "x" * 4000}])
+    assert "User: hi" in block
+    assert _tokens(block) <= 100
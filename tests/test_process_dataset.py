@@ -0,0 +1,59 @@
+import json
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+import process_dataset  # noqa: E402
+
+
+def _write_csv(path, rows):
+    with open(path, "w") as f:
+        f.write("Date,Open,Close,Volume\n")
+        for row in rows:
+            f.write(",".join(str(v) for v in row) + "\n")
+
+
+def test_column_types_stay_fixed_across_blocks(tmp_path):
+    raw = tmp_path / "raw.csv"
+    dates = pd.date_range("2021-01-01", periods=60000, freq="h").strftime("%Y-%m-%d %H:%M:%S")
+    # Integer-looking prices and volumes fill the first 1 MB block; decimals and gaps come later.
+    rows = [(d, 100, 101, 5000) for d in dates[:40000]]
+    rows += [(d, 100.5, 101.25, "" if i % 7 == 0 else 5000) for i, d in enumerate(dates[40000:])]
+    _write_csv(raw, rows)
+
+    manifest = process_dataset.process(str(raw), str(tmp_path / "out.csv"), str(tmp_path / "parquet"),
+                                       "2020-01-01", block_mb=1)
+
+    assert manifest["rows_written"] == 60000
+    types = {f["name"]: f["type"] for f in manifest["schema"]}
+    assert types == {"Date": "timestamp[ns]", "Open": "double", "Close": "double", "Volume": "int64"}
+    out = pd.read_csv(tmp_path / "out.csv")
+    assert out["Open"].iloc[-1] == 100.5
+    assert out["Volume"].isna().sum() == manifest["columns"]["Volume"]["nulls"] > 0
+
+
+def test_no_matching_rows_still_writes_the_manifest(tmp_path):
+    raw = tmp_path / "raw.csv"
+    _write_csv(raw, [("2019-01-02", 1.0, 1.5, 10)])
+
+    manifest = process_dataset.process(str(raw), str(tmp_path / "out.csv"), str(tmp_path / "parquet"),
+                                       "2020-01-01", block_mb=1)
+
+    assert manifest["rows_written"] == 0
+    with open(tmp_path / "parquet" / "_manifest.json") as f:
+        assert json.load(f)["rows_scanned"] == 1
+
+
+def test_non_numeric_columns_are_reported(tmp_path):
+    raw = tmp_path / "raw.csv"
+    with open(raw, "w") as f:
+        f.write("Date,Close,Volume,Ticker\n2021-01-04,1.0,10,WMT\n")
+
+    with pytest.raises(process_dataset.DatasetFormatError, match="must be numeric"):
+        process_dataset.process(str(raw), str(tmp_path / "out.csv"), str(tmp_path / "parquet"),
+                                "2020-01-01", block_mb=1)
@@ -0,0 +1,36 @@
+import asyncio
+
+from agents.rate_limiter import RateLimiter
+
+
+def test_cancelled_async_calls_release_their_slot():
+    limiter = RateLimiter(limits={"m": (6000, 10_000_000)})
+
+    async def hang(timeout_s):
+        await asyncio.sleep(60)
+
+    async def main():
+        tasks = [asyncio.ensure_future(limiter.acall("m", 10, hang, deadline_s=60)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        assert limiter.model("m").in_flight == 3
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run(main())
+    stats = limiter.model("m").stats()
+    assert stats["in_flight"] == 0
+    assert stats["cancelled"] == 3
+
+
+def test_interrupted_sync_call_releases_its_slot():
+    limiter = RateLimiter(limits={"m": (6000, 10_000_000)})
+
+    def interrupted(timeout_s):
+        raise KeyboardInterrupt
+
+    try:
+        limiter.call("m", 10, interrupted, deadline_s=5)
+    except KeyboardInterrupt:
+        pass
+    assert limiter.model("m").in_flight == 0
@@ -0,0 +1,27 @@
+from agents.session_store import HISTORY_LIMIT, SessionStore
+
+
+def _log_rows(store, session_id):
+    return store._conn().execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()[0]
+
+
+def test_compaction_counts_appends_per_session(tmp_path):
+    store = SessionStore(str(tmp_path / "chat.db"), compact_every=10)
+    for i in range(HISTORY_LIMIT + 9):
+        store.append("u", "busy", f"busy {i}")
+        store.append("u", "quiet", f"quiet {i}")
+    # Interleaved sessions: neither has reached its own threshold yet.
+    assert _log_rows(store, "busy") == HISTORY_LIMIT + 9
+    store.append("u", "busy", "one more")
+    assert _log_rows(store, "busy") == HISTORY_LIMIT
+    assert _log_rows(store, "quiet") == HISTORY_LIMIT + 9
+
+
+def test_history_and_recent_span_the_archive(tmp_path):
+    store = SessionStore(str(tmp_path / "chat.db"), compact_every=5)
+    messages = [f"m{i}" for i in range(HISTORY_LIMIT * 3)]
+    for m in messages:
+        store.append("u", "s", m)
+    assert store.history("u", "s") == messages
+    assert store.recent("u", "s", HISTORY_LIMIT + 20) == messages[-(HISTORY_LIMIT + 20):]
+    assert store.recent("u", "s", 3) == messages[-3:]
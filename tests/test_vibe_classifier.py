@@ -0,0 +1,39 @@
+import pytest
+
+from agents.vibe_classifier import DEFAULT_THRESHOLD as THRESHOLD, VibeClassifier, classify_vibe, load_corpus
+
+
+@pytest.mark.parametrize("message", [
+    "xyzzy plugh",
+    "write code to sort a list",
+    "quantum",
+])
+def test_unfamiliar_messages_go_to_gemini(message):
+    _, confidence = classify_vibe(message)
+    assert confidence < THRESHOLD
+
+
+def test_all_unknown_words_have_zero_confidence():
+    assert classify_vibe("xyzzy plugh")[1] == 0.0
+
+
+@pytest.mark.parametrize("message, label", [
+    ("Write a poem about the ocean.", "creative"),
+    ("How does photosynthesis work?", "scientific"),
+])
+def test_clear_messages_stay_local(message, label):
+    assert classify_vibe(message)[0] == label
+    assert classify_vibe(message)[1] >= THRESHOLD
+
+
+def test_held_out_confident_predictions_are_accurate():
+    rows = load_corpus()
+    confident = correct = 0
+    for fold in range(5):
+        model = VibeClassifier().fit([r for i, r in enumerate(rows) if i % 5 != fold])
+        for text, label in rows[fold::5]:
+            local, confidence = model.predict(text)
+            if confidence >= THRESHOLD:
+                confident += 1
+                correct += local == label
+    assert confident and correct / confident >= 0.95